@@ -1,247 +1,219 @@
 from dataclasses import fields
 
+import numpy as np
+
 from openpyxl.worksheet.hyperlink import Hyperlink
 
 from constraints.field_name_mapper import BOX_CODE_FIELD_NAME, CABLE_SKIP_COUNT_FIELD_NAME, CABLE_PORT_START_FIELD_NAME, \
     CABLE_PORT_END_FIELD_NAME, CABLE_CODE_FIELD_NAME, CABLE_TYPE_FIELD_NAME, CABLE_SECTION_FIELD_NAME, \
-    BOX_IN_START_FIELD_NAME, BOX_IN_END_FIELD_NAME, BOX_TYPE_FIELD_NAME, CABLE_LEVEL_FIELD_NAME, \
-    CABLE_EXTREMITY_FIELD_NAME
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment, NamedStyle
-
-from data_service import data_service_cable, data_service_box
-from utils import excel_utils
-
-FONT_NAME = '宋体'
+    BOX_IN_START_FIELD_NAME, BOX_IN_END_FIELD_NAME, BOX_TYPE_FIELD_NAME, CABLE_LEVEL_FIELD_NAME
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fills import DEFAULT_EMPTY_FILL
+from openpyxl.styles.fonts import DEFAULT_FONT
+
+from topology import topo_graph
+from topology.topo_graph import NO_POSITION
+from utils import excel_utils, traversal, xlsx_renderer
+from utils.sheet_grid import SheetGrid
+from utils.style_registry import STYLES, CellStyle, TABLE_FONT_NAME, TABLE_CENTER_STYLE, TABLE_LINK_STYLE, \
+    fiber_style_id
+
+FONT_NAME = TABLE_FONT_NAME
+
+
+def box_sheet_name(topo_box_col, box_data):
+    """拓扑总览中该列的箱体对应的子sheet名（A列SRO、G列PBO），其余列的箱体没有子sheet"""
+    if topo_box_col in ('A', 'G'):
+        return box_data[BOX_CODE_FIELD_NAME]
+    return None
 
 
-def create_box_sheet(ws, topo_box_col, box_data, sro_sheet_name):
-    if topo_box_col == 'A':
-        return _create_sro_sheet(ws, box_data)
-    elif topo_box_col == 'G':
-        return _create_pbo_sheet(ws, box_data, sro_sheet_name)
-    return None
+def create_box_sheets(wb, sheet_topo_title, box_sheets, sro_sheet_name, splice_formulas=False):
+    """
+    按描绘顺序创建箱体子sheet：纤芯分配表只构建一次，SRO子sheet输出整张表，PBO子sheet输出其中该PBO的行
+    （不从工作表读回）；write-only工作簿中表头写完后数据区逐行追加
+    :param wb: 工作簿（拓扑总览已写入）
+    :param sheet_topo_title: 拓扑总览sheet名（返回按钮的链接目标）
+    :param box_sheets: 按描绘顺序的[(箱体所在列, 箱体数据)]
+    :param sro_sheet_name: SRO子sheet名
+    :param splice_formulas: 熔接状态是否写为IF公式（带预先算出的缓存值），默认写为值
+    :return: 创建的子sheet名集合
+    """
+    start_col = BOX_SHEET_TABLE_START_COL
+    table, pbo_rows = None, {}
+    created = set()  # 已创建的子sheet（不必每次从wb.sheetnames重建列表）
+    for topo_box_col, box_data in box_sheets:
+        sheet_name = box_sheet_name(topo_box_col, box_data)
+        if sheet_name is None or sheet_name in created:
+            continue
+        if topo_box_col == 'A':
+            ws_sro, data_1st_row, next_row = _create_sheet_with_header(wb, sheet_topo_title, sheet_name, start_col)
+            table, pbo_rows = build_fiber_table(data_1st_row, start_col, splice_formulas)
+            _write_table(ws_sro, table, next_row)
+        else:
+            if sro_sheet_name not in created:
+                raise ValueError(f"工作表 '{sro_sheet_name}' 不存在于workbook对象中")
+            pbo_code = box_data[BOX_CODE_FIELD_NAME]
+            if pbo_code not in pbo_rows:
+                raise ValueError(f"纤芯分配表中没有PBO '{pbo_code}' 的纤芯")
+            row_begin, row_end = pbo_rows[pbo_code]
+            ws_box, data_1st_row, next_row = _create_sheet_with_header(wb, sheet_topo_title, sheet_name, start_col)
+            _write_table(ws_box, build_pbo_table(table, row_begin, row_end, data_1st_row), next_row)
+        created.add(sheet_name)
+    return created
+
+
+def _create_sheet_with_header(wb, sheet_topo_title, title, start_col):
+    """
+    新建子sheet，写入返回按钮、标题与表头并冻结表头（write-only工作表中先缓冲表头，设好冻结窗格后按行输出）
+    :return: (工作表, 数据区第一行, 下一个要写的行号)
+    """
+    ws = wb.create_sheet(title=title)
+    ws.sheet_view.zoomScale = SHEET_ZOOM_SCALE
+    header = xlsx_renderer.RowBuffer(ws) if wb.write_only else ws
+    create_return_topo_cell(header, sheet_topo_title)
+    draw_box_sheet_title(header, title, start_col)
+    data_1st_row = draw_box_sheet_header(header, start_col)
+    ws.freeze_panes = f"{excel_utils.num_to_col(start_col)}{data_1st_row}"
+    next_row = header.flush() if wb.write_only else data_1st_row
+    return ws, data_1st_row, next_row
+
+
+def _write_table(ws, table, next_row):
+    """数据区写入工作表（write-only工作表从next_row开始按行追加），并登记公式的缓存值"""
+    if ws.parent.write_only:
+        xlsx_renderer.append_rows(ws, next_row, table.rows(), table.styles, table.links)
+    else:
+        xlsx_renderer.render_grid(table, ws)
+    xlsx_renderer.cache_formula_results(ws, table.formula_results)
+
+
+def build_pbo_table(table, row_begin, row_end, data_1st_row) -> SheetGrid:
+    """
+    PBO子sheet的数据区：纤芯分配表[row_begin, row_end]行的A列到AE列，样式按pbo_cell_style转换
+    （每格都写样式，超链接不复制；公式引用的是SRO sheet中的行，写为其算出的结果）
+    :param table: 纤芯分配表
+    :param row_begin: 起始行
+    :param row_end: 结束行
+    :param data_1st_row: PBO子sheet数据区第一行
+    :return: 数据区网格
+    """
+    pbo_table = SheetGrid(data_1st_row, table.n_cols, capacity=row_end - row_begin + 1)
+    results = table.formula_results
+    for row, values, style_ids in table.rows(row_begin, row_end):
+        target_row = data_1st_row + row - row_begin
+        for col in range(1, table.n_cols + 1):
+            drop_link = target_row == data_1st_row and col == table.n_cols
+            value = results.get((row, col), values[col - 1]) if results else values[col - 1]
+            pbo_table.put(target_row, col, value, pbo_style_id(int(style_ids[col - 1]), drop_link))
+    return pbo_table
+
+
+def pbo_style_id(style_id, drop_link=False) -> int:
+    """纤芯分配表的样式复制到PBO子sheet后的样式id（每种样式只转换一次）"""
+    key = (style_id, drop_link)
+    pbo_id = _PBO_STYLE_IDS.get(key)
+    if pbo_id is None:
+        pbo_id = _PBO_STYLE_IDS[key] = STYLES.register(pbo_cell_style(STYLES.styles[style_id], drop_link))
+    return pbo_id
+
+
+def pbo_cell_style(style, drop_link=False) -> CellStyle:
+    """
+    纤芯分配表的单元格样式在PBO子sheet中的样式：未设置的部分取工作簿默认样式，字体换成宋体，各部分按值重建
+    :param style: 源单元格的CellStyle（None表示未设置样式）
+    :param drop_link: 是否去掉链接的字体颜色与下划线
+    """
+    style = style or CellStyle()
+    font = style.font if style.font is not None else DEFAULT_FONT
+    fill = style.fill if style.fill is not None else DEFAULT_EMPTY_FILL
+    border = style.border if style.border is not None else DEFAULT_BORDER
+    alignment = style.alignment if style.alignment is not None else Alignment()
+    return CellStyle(
+        font=Font(name=FONT_NAME, size=font.size, bold=font.bold, italic=font.italic,
+                  color=None if drop_link else font.color, underline=None if drop_link else font.underline),
+        fill=PatternFill(fill_type=fill.fill_type, start_color=fill.start_color, end_color=fill.end_color),
+        border=Border(**{side: Side(border_style=getattr(border, side).border_style,
+                                    color=getattr(border, side).color)
+                         for side in ("left", "right", "top", "bottom")}),
+        alignment=Alignment(horizontal=alignment.horizontal, vertical=alignment.vertical,
+                            text_rotation=alignment.text_rotation, wrap_text=alignment.wrap_text,
+                            shrink_to_fit=alignment.shrink_to_fit, indent=alignment.indent))
+
+
+def build_fiber_table(data_1st_row, start_col, splice_formulas=False):
+    """
+    纤芯分配表的数据区（A列到AE列）：依次填充D1、D2、D3，再写入熔接状态
+    SRO sheet与PBO子sheet都由它输出，不再从工作表读回
+    :param data_1st_row: 数据区第一行（表头之下）
+    :param start_col: 表格起始列
+    :param splice_formulas: 熔接状态是否写为IF公式（带预先算出的缓存值），默认写为值
+    :return: (数据区网格, PBO编码 -> 该PBO纤芯所在的(起始行, 结束行))
+    """
+    table = SheetGrid(data_1st_row, start_col + FIBER_TABLE_LAST_COL_OFFSET)
+    pbo_rows = {}
+    fill_d1_data(table, data_1st_row, start_col)
+    fill_d2_data(table, data_1st_row, start_col + COL_LOOP + 5)
+    fill_d3_data(table, data_1st_row, start_col + COL_LOOP * 2, pbo_rows)
+    _change_splice_state(table, data_1st_row, start_col, splice_formulas)
+    return table, pbo_rows
 
 
-def _create_pbo_sheet(ws, box_data, sro_sheet_name):
-    pbo_code = box_data[BOX_CODE_FIELD_NAME]
-    pbo_sheet_name = pbo_code
-    wb = ws.parent
-    if pbo_sheet_name not in wb.sheetnames:
-        ws_box = wb.create_sheet(title=pbo_sheet_name)
-        ws_box.sheet_view.zoomScale = SHEET_ZOOM_SCALE
-        ws_box.append([])
-        # 定义默认字体（例如：微软雅黑，11号，非粗体）
-        default_font = Font(name=FONT_NAME, size=11)
-
-        # 创建默认样式并关联字体
-        default_style = NamedStyle(name="default_style", font=default_font)
-
-        # 将默认样式应用到整个工作表（A1到XFD1048576，即所有单元格）
-        ws_box.style = default_style
-        start_col = BOX_SHEET_TABLE_START_COL
-        # 绘制返回按钮
-        create_return_topo_cell(ws_box, ws.title)
-        # 绘制表头
-        draw_box_sheet_title(ws_box, box_data[BOX_CODE_FIELD_NAME], start_col)
-        data_1st_row = draw_box_sheet_header(ws_box, start_col)
-        if sro_sheet_name not in wb.sheetnames:
-            raise ValueError(f"工作表 '{sro_sheet_name}' 不存在于workbook对象中")
-        ws_sro = wb[sro_sheet_name]
-        # 在AE列中查找以"PBO_NAME"开头的连续单元格区间
-        row_begin = None
-        row_end = None
-        ae_col = start_col + excel_utils.col_to_num('AD')  # AE列对应的数字（A=1, B=2, ..., AE=31）
-        # current_row = start_row_no
-        row_count = ws_sro.max_row
-
-        # 遍历AE列，找到起始行
-        for current_row in range(data_1st_row, data_1st_row + row_count):
-            cell_value = ws_sro.cell(row=current_row, column=ae_col).value
-            if cell_value and str(cell_value).startswith(pbo_code):
-                row_begin = current_row
-                break
-
-        # 找到连续区间的结束行
-        for current_row in range(row_begin, row_begin + row_count):
-            cell_value = ws_sro.cell(row=current_row, column=ae_col).value
-            if not (cell_value and str(cell_value).startswith(pbo_code)):
-                row_end = current_row - 1
-                break
-
-        # 复制A列到AE列（1到31列）的指定区间到目标工作簿
-        copy_cells_with_style(
-            source_ws=ws_sro,
-            target_ws=ws_box,
-            source_start_row=row_begin,
-            source_end_row=row_end,
-            source_start_col=1,  # A列
-            source_end_col=ae_col,  # AE列
-            target_start_row=data_1st_row,  # 目标开始行
-            target_start_col=1  # 目标开始列（A列）
-        )
+def _change_splice_state(table, data_1st_row, start_col, formulas=False):
+    """
+    熔接状态（R：保留，S：熔接），从数据区第一行到第2组熔接列的第一个空格之前：
+    - 第2组熔接列：该行D2、D3都没有线缆时为R，否则为S
+    - 第3组熔接列（有值的行）：该行D3没有线缆时为R，否则为S
+    整列按掩码一次算出并写为值；formulas为True时改写等价的IF公式，算出的结果作为公式的缓存值
+    """
+    _2nd_splice_col = start_col + COL_LOOP + 3
+    _3rd_splice_col = _2nd_splice_col + COL_LOOP
+    d2_section_col = _2nd_splice_col + 2
+    d3_section_col = _3rd_splice_col + 2
+    spliced = ~_blank(table.values(_2nd_splice_col))
+    n_rows = len(spliced) if spliced.all() else int(np.argmin(spliced))
+    if not n_rows:
+        return
+    d3_blank = _blank(table.values(d3_section_col)[:n_rows])
+    d2_d3_blank = _blank(table.values(d2_section_col)[:n_rows]) & d3_blank
+    has_3rd_splice = ~_blank(table.values(_3rd_splice_col)[:n_rows])
+    _2nd_state = np.where(d2_d3_blank, "R", "S").astype(object)
+    _3rd_state = np.where(d3_blank, "R", "S").astype(object)
+
+    if not formulas:
+        table.put_values(data_1st_row, _2nd_splice_col, _2nd_state)
+        _3rd_values = table.values(_3rd_splice_col)[:n_rows]
+        table.put_values(data_1st_row, _3rd_splice_col, np.where(has_3rd_splice, _3rd_state, _3rd_values))
+        return
 
-        ws_box.freeze_panes = f"{excel_utils.num_to_col(BOX_SHEET_TABLE_START_COL)}4"
-        return pbo_sheet_name
+    d2_col = excel_utils.num_to_col(d2_section_col)
+    d3_col = excel_utils.num_to_col(d3_section_col)
+    for offset in range(n_rows):
+        row = data_1st_row + offset
+        table.put(row, _2nd_splice_col, f'=IF(AND(ISBLANK({d2_col}{row}),ISBLANK({d3_col}{row})),"R","S")')
+        table.formula_results[(row, _2nd_splice_col)] = _2nd_state[offset]
+        if has_3rd_splice[offset]:
+            table.put(row, _3rd_splice_col, f'=IF(ISBLANK({d3_col}{row}),"R","S")')
+            table.formula_results[(row, _3rd_splice_col)] = _3rd_state[offset]
 
-    return None
 
+def _blank(values) -> np.ndarray:
+    """空单元格掩码（None或空字符串，与Excel的ISBLANK一致）"""
+    return np.equal(values, None) | np.equal(values, "")
 
-def copy_cells_with_style(source_ws, target_ws, source_start_row, source_end_row,
-                          source_start_col, source_end_col, target_start_row, target_start_col):
-    """
-    复制源工作表指定区域到目标工作表，包含值和所有样式
-    """
-    for row in range(source_start_row, source_end_row + 1):
-        for col in range(source_start_col, source_end_col + 1):
-            # 源单元格
-            source_cell = source_ws.cell(row=row, column=col)
-
-            # 计算目标单元格位置
-            target_row = target_start_row + (row - source_start_row)
-            target_col = target_start_col + (col - source_start_col)
-            target_cell = target_ws.cell(row=target_row, column=target_col)
-
-            # 复制值
-            target_cell.value = source_cell.value
-
-            # 复制字体样式
-            if source_cell.font:
-                target_cell.font = Font(
-                    name=FONT_NAME,
-                    size=source_cell.font.size,
-                    bold=source_cell.font.bold,
-                    italic=source_cell.font.italic,
-                    color=None if target_row == 4 and target_col ==31 else source_cell.font.color,
-                    underline=None if target_row == 4 and target_col ==31 else source_cell.font.underline
-                )
-
-            # 复制填充样式
-            if source_cell.fill:
-                target_cell.fill = PatternFill(
-                    fill_type=source_cell.fill.fill_type,
-                    start_color=source_cell.fill.start_color,
-                    end_color=source_cell.fill.end_color
-                )
-
-            # 复制边框样式
-            if source_cell.border:
-                target_cell.border = Border(
-                    left=Side(
-                        border_style=source_cell.border.left.border_style,
-                        color=source_cell.border.left.color
-                    ),
-                    right=Side(
-                        border_style=source_cell.border.right.border_style,
-                        color=source_cell.border.right.color
-                    ),
-                    top=Side(
-                        border_style=source_cell.border.top.border_style,
-                        color=source_cell.border.top.color
-                    ),
-                    bottom=Side(
-                        border_style=source_cell.border.bottom.border_style,
-                        color=source_cell.border.bottom.color
-                    )
-                )
-
-            # 复制对齐方式
-            if source_cell.alignment:
-                target_cell.alignment = Alignment(
-                    horizontal=source_cell.alignment.horizontal,
-                    vertical=source_cell.alignment.vertical,
-                    text_rotation=source_cell.alignment.text_rotation,
-                    wrap_text=source_cell.alignment.wrap_text,
-                    shrink_to_fit=source_cell.alignment.shrink_to_fit,
-                    indent=source_cell.alignment.indent
-                )
-
-
-def _create_sro_sheet(ws, sro_data):
-    wb = ws.parent
-    sheet_name = sro_data[BOX_CODE_FIELD_NAME]
-    # 获取工作簿对象（从当前工作表反向获取）
-
-    # 检查子sheet是否已存在，不存在则创建
-    if sheet_name not in wb.sheetnames:
-        ws_sro = wb.create_sheet(title=sheet_name)
-        ws_sro.sheet_view.zoomScale = SHEET_ZOOM_SCALE
-        ws_sro.append([])
-        # 定义默认字体（例如：微软雅黑，11号，非粗体）
-        default_font = Font(name=FONT_NAME, size=11)
-
-        # 创建默认样式并关联字体
-        default_style = NamedStyle(name="default_style", font=default_font)
-
-        # 将默认样式应用到整个工作表（A1到XFD1048576，即所有单元格）
-        ws_sro.style = default_style
-        start_col = BOX_SHEET_TABLE_START_COL
-        # 绘制返回按钮
-        create_return_topo_cell(ws_sro, ws.title)
-        # 绘制表头
-        draw_box_sheet_title(ws_sro, sro_data[BOX_CODE_FIELD_NAME], start_col)
-        data_1st_row = draw_box_sheet_header(ws_sro, start_col)
-        fill_d1_data(ws_sro, data_1st_row, start_col)
-        fill_d2_data(ws_sro, data_1st_row, start_col + COL_LOOP + 5)
-        fill_d3_data(ws_sro, data_1st_row, start_col + COL_LOOP * 2)
-        _change_splice_state(ws_sro,data_1st_row, start_col)
-        ws_sro.freeze_panes = f"{excel_utils.num_to_col(start_col)}{data_1st_row}"
-        return sheet_name
-    return None
 
-def _change_splice_state(ws_sro, data_1st_row, start_col):
-    _2nd_splice_col = start_col + COL_LOOP +3
-    _3rd_splice_col = _2nd_splice_col + COL_LOOP
-    d2_start_row = _2nd_splice_col + 2
-    d3_start_row = _3rd_splice_col +2
-    current_row = data_1st_row
-    while True:
-        _2nd_splice_cell = ws_sro.cell(row=current_row, column=_2nd_splice_col)
-        if not _2nd_splice_cell.value:
-            break
-        ws_sro[f"{excel_utils.num_to_col(_2nd_splice_col)}{current_row}"] = f'=IF(AND(ISBLANK({excel_utils.num_to_col(d2_start_row)}{current_row}),ISBLANK({excel_utils.num_to_col(d3_start_row)}{current_row})),"R","S")'
-
-        _3rd_splice_cell = ws_sro.cell(row=current_row, column=_3rd_splice_col)
-        if _3rd_splice_cell.value:
-            ws_sro[f"{excel_utils.num_to_col(_3rd_splice_col)}{current_row}"] = f'=IF(ISBLANK({excel_utils.num_to_col(d3_start_row)}{current_row}),"R","S")'
-        current_row += 1
-
-def change_splice_state(ws_sro, data_1st_row, start_col):
-    _2nd_splice_col = start_col + 3 + COL_LOOP
-    _3rd_splice_col = _2nd_splice_col+ COL_LOOP
-    current_row = data_1st_row - 1
-    while True:
-        current_row += 1
-        _2nd_splice_cell = ws_sro.cell(row=current_row, column=_2nd_splice_col)
-        d2_empty = True
-        d3_empty = True
-        if not _2nd_splice_cell.value:
-            break
-        for i in range(_2nd_splice_col+1, _2nd_splice_col+6):
-            if ws_sro.cell(row=current_row, column=start_col+i).value:
-                d2_empty = False
-                break
-
-
-        for i in range(_3rd_splice_col + 1, _3rd_splice_col + 6):
-            if ws_sro.cell(row=current_row, column=i).value:
-                d3_empty = False
-                break
-        if d2_empty and d3_empty:
-            ws_sro[f"{excel_utils.num_to_col(_2nd_splice_col)}{current_row}"] = "R"
-
-        _3rd_splice_cell = ws_sro.cell(row=current_row, column=_3rd_splice_col)
-        if _3rd_splice_cell.value and d3_empty:
-            ws_sro[f"{excel_utils.num_to_col(_3rd_splice_col)}{current_row}"] = "R"
-
-
-def fill_d1_data(ws_sro, data_1st_row, start_col):
-    _1st_segments = data_service_cable.get_all_1st_segments_on_d1_section_order_by_skip_count_asc()
+def fill_d1_data(table, data_1st_row, start_col):
+    graph = topo_graph.load_graph()
+    _1st_segments = graph.first_segments_on_level(1, sort_by=[CABLE_SKIP_COUNT_FIELD_NAME])
+    center = TABLE_CENTER_STYLE
     # 初始化数据
-    if _1st_segments is not None and not _1st_segments.empty:
+    if len(_1st_segments):
         sro_port_idx = 1
         odf_code_idx = 1
         odf_port_idx = 1
-        for _idx, _1st_segment in _1st_segments.iterrows():
+        for _1st_segment_pos in _1st_segments:
+            _1st_segment = graph.segment(_1st_segment_pos)
             skip_count = int(_1st_segment[CABLE_SKIP_COUNT_FIELD_NAME])
             section = _1st_segment[CABLE_SECTION_FIELD_NAME]
             port_start = int(_1st_segment[CABLE_PORT_START_FIELD_NAME])
@@ -251,75 +223,42 @@ def fill_d1_data(ws_sro, data_1st_row, start_col):
             for i in range(0, fiber_to_fill_amt):
                 row_no = data_1st_row + skip_count + i
                 #sro_port
-                cell = ws_sro.cell(row=row_no, column=start_col)
-                cell.value = sro_port_idx
-                cell.alignment = CENTER_ALIGN
-
+                table.put(row_no, start_col, sro_port_idx, center)
                 # odf_code_
-                cell = ws_sro.cell(row=row_no, column=start_col + 1)
-                cell.value = f"ODF{'%02d' % odf_code_idx}"
-                cell.alignment = CENTER_ALIGN
-
+                table.put(row_no, start_col + 1, f"ODF{'%02d' % odf_code_idx}", center)
                 # odf_port_
-                cell = ws_sro.cell(row=row_no, column=start_col + 2)
-                cell.value = odf_port_idx
-                cell.alignment = CENTER_ALIGN
-
+                table.put(row_no, start_col + 2, odf_port_idx, center)
                 # splice
-                cell = ws_sro.cell(row=row_no, column=start_col + 3)
-                cell.value = 'S'
-                cell.alignment = CENTER_ALIGN
-
+                table.put(row_no, start_col + 3, 'S', center)
                 # cable_code_
-                cell = ws_sro.cell(row=row_no, column=start_col + 5)
-                cell.value = section
-                cell.alignment = CENTER_ALIGN
-
+                table.put(row_no, start_col + 5, section, center)
                 # cable_type_
-                cell = ws_sro.cell(row=row_no, column=start_col + 6)
-                cell.value = _1st_segment[CABLE_TYPE_FIELD_NAME]
-                cell.alignment = CENTER_ALIGN
-
+                table.put(row_no, start_col + 6, _1st_segment[CABLE_TYPE_FIELD_NAME], center)
                 # cable_no_
-                cell = ws_sro.cell(row=row_no, column=start_col + 7)
-                cell.value = i + 1
-                cell.alignment = CENTER_ALIGN
-
+                table.put(row_no, start_col + 7, i + 1, center)
                 # cable_t_
-                cell = ws_sro.cell(row=row_no, column=start_col + 8)
                 t = int(i / 12) + 1
-                cell.value = t
-                cell.font = Font(color=get_fiber_font_color(t - 1), bold=True)
-                bg_color = get_fiber_bg_color(t - 1)
-                if bg_color:
-                   cell.fill = PatternFill(fill_type="solid", start_color=bg_color)
-                cell.alignment = CENTER_ALIGN
-
+                table.put(row_no, start_col + 8, t, fiber_style_id(t - 1, bold=True))
                 # cable_f_
-                cell = ws_sro.cell(row=row_no, column=start_col + 9)
                 f = i % 12 + 1
-                cell.value = f
-                cell.font = Font(color=get_fiber_font_color(f - 1))
-                bg_color = get_fiber_bg_color(f - 1)
-                if bg_color:
-                    cell.fill = PatternFill(fill_type="solid", start_color=bg_color)
-                cell.alignment = CENTER_ALIGN
+                table.put(row_no, start_col + 9, f, fiber_style_id(f - 1))
 
                 sro_port_idx += 1
                 odf_code_idx = odf_code_idx if odf_port_idx < ODF_MAX_PORT_NO else odf_code_idx + 1
                 odf_port_idx = odf_port_idx + 1 if odf_port_idx < ODF_MAX_PORT_NO else 1
 
-            boxs_on_section = data_service_box.get_all_boxs_on_section_by_orders(section=section,
-                                                                                 sort_by=[BOX_IN_START_FIELD_NAME])
-            if boxs_on_section is not None and not boxs_on_section.empty:
-                for _box_idx, _box in boxs_on_section.iterrows():
-                    fill_closure_port_on_section(ws_sro, data_1st_row, start_col + COL_LOOP, _box)
+            boxs_on_section = graph.sorted_boxes(graph.boxes_on_section(section), sort_by=[BOX_IN_START_FIELD_NAME])
+            for _box_pos in boxs_on_section:
+                fill_closure_port_on_section(table, data_1st_row, start_col + COL_LOOP, graph.box(_box_pos))
 
 
-def fill_d2_data(ws_sro, data_1st_row, start_col):
-    _1st_segments_on_d2_section = data_service_cable.get_all_1st_segments_on_d2_section_order_by_skip_count_asc()
-    if _1st_segments_on_d2_section is not None and not _1st_segments_on_d2_section.empty:
-        for _idx, _1st_segment in _1st_segments_on_d2_section.iterrows():
+def fill_d2_data(table, data_1st_row, start_col):
+    graph = topo_graph.load_graph()
+    _1st_segments_on_d2_section = graph.first_segments_on_level(2, sort_by=[CABLE_SKIP_COUNT_FIELD_NAME])
+    center = TABLE_CENTER_STYLE
+    if len(_1st_segments_on_d2_section):
+        for _1st_segment_pos in _1st_segments_on_d2_section:
+            _1st_segment = graph.segment(_1st_segment_pos)
             skip_count = int(_1st_segment[CABLE_SKIP_COUNT_FIELD_NAME])
             section = _1st_segment[CABLE_SECTION_FIELD_NAME]
             port_start = int(_1st_segment[CABLE_PORT_START_FIELD_NAME])
@@ -328,50 +267,28 @@ def fill_d2_data(ws_sro, data_1st_row, start_col):
             for i in range(0, fiber_to_fill_amt):
                 no = i + 1
                 row_no = data_1st_row + skip_count + i
-                cell = ws_sro.cell(row=row_no, column=start_col)
-                cell.value = section
-                cell.alignment = CENTER_ALIGN
-
-                cell = ws_sro.cell(row=row_no, column=start_col + 1)
-                cell.value = _1st_segment[CABLE_TYPE_FIELD_NAME]
-                cell.alignment = CENTER_ALIGN
-
-                cell = ws_sro.cell(row=row_no, column=start_col + 2)
-                cell.value = no
-                cell.alignment = CENTER_ALIGN
+                table.put(row_no, start_col, section, center)
+                table.put(row_no, start_col + 1, _1st_segment[CABLE_TYPE_FIELD_NAME], center)
+                table.put(row_no, start_col + 2, no, center)
 
                 t = int(i / 12) + 1
-                cell = ws_sro.cell(row=row_no, column=start_col + 3)
-                cell.value = t
-                cell.font = Font(color=get_fiber_font_color(t - 1),bold=True)
-                bg_color = get_fiber_bg_color(t - 1)
-                if bg_color:
-                    cell.fill = PatternFill(fill_type="solid", start_color=bg_color)
-                cell.alignment = CENTER_ALIGN
+                table.put(row_no, start_col + 3, t, fiber_style_id(t - 1, bold=True))
 
                 f = i % 12 + 1
-                cell = ws_sro.cell(row=row_no, column=start_col + 4)
-                cell.value = f
-                cell.font = Font(color=get_fiber_font_color(f - 1))
-                bg_color = get_fiber_bg_color(f - 1)
-                if bg_color:
-                    cell.fill = PatternFill(fill_type="solid", start_color=bg_color)
-                cell.alignment = CENTER_ALIGN
-
-            boxs_on_section = data_service_box.get_all_boxs_on_section_by_orders(section=section,
-                                                                                 sort_by=[BOX_IN_START_FIELD_NAME])
-            if boxs_on_section is not None and not boxs_on_section.empty:
-                for _box_idx, _box in boxs_on_section.iterrows():
-                    fill_closure_port_on_section(ws_sro, data_1st_row, start_col + 5, _box)
-
-
-def fill_d3_data(ws_sro, data_1st_row, start_col):
-    _1st_segments_on_d3_cables = data_service_cable.get_all_1st_segments_on_d3_cable_order_by_skip_count()
-    if _1st_segments_on_d3_cables is not None and not _1st_segments_on_d3_cables.empty:
-        for _d3_idx, _1st_segment in _1st_segments_on_d3_cables.iterrows():
-            skip_count = int(_1st_segment[CABLE_SKIP_COUNT_FIELD_NAME])
-            start_row_no = data_1st_row + skip_count
-            fill_segment_and_next_segment_on_d3(ws_sro, start_row_no, start_col + 5, _1st_segment)
+                table.put(row_no, start_col + 4, f, fiber_style_id(f - 1))
+
+            boxs_on_section = graph.sorted_boxes(graph.boxes_on_section(section), sort_by=[BOX_IN_START_FIELD_NAME])
+            for _box_pos in boxs_on_section:
+                fill_closure_port_on_section(table, data_1st_row, start_col + 5, graph.box(_box_pos))
+
+
+def fill_d3_data(table, data_1st_row, start_col, pbo_rows=None):
+    graph = topo_graph.load_graph()
+    _1st_segments_on_d3_cables = graph.first_segments_on_level(3, sort_by=[CABLE_PORT_START_FIELD_NAME])
+    for _1st_segment_pos in _1st_segments_on_d3_cables:
+        skip_count = int(graph.segment(_1st_segment_pos)[CABLE_SKIP_COUNT_FIELD_NAME])
+        start_row_no = data_1st_row + skip_count
+        fill_segment_and_next_segment_on_d3(table, start_row_no, start_col + 5, _1st_segment_pos, graph, pbo_rows)
     # boxs_on_section = data_service_box.get_all_boxs_on_section_by_orders(section=section,
     #                                                                      sort_by=[BOX_IN_START_FIELD_NAME])
     # if boxs_on_section is not None and not boxs_on_section.empty:
@@ -379,42 +296,48 @@ def fill_d3_data(ws_sro, data_1st_row, start_col):
     #         fill_closure_port_on_section(ws_sro, data_1st_row, start_col + 5, _box)
 
 
-def fill_closure_port_on_section(ws_sro, data_1st_row, start_col, box_data):
+def fill_closure_port_on_section(table, data_1st_row, start_col, box_data):
     in_start = box_data[BOX_IN_START_FIELD_NAME]
     in_end = box_data[BOX_IN_END_FIELD_NAME]
     skip_count = int(box_data[CABLE_SKIP_COUNT_FIELD_NAME])
+    center = TABLE_CENTER_STYLE
     port_to_fill_amt = in_end - in_start + 1
     for i in range(0, port_to_fill_amt):
         no = i + 1
         row_no = data_1st_row + skip_count + i
-        cell = ws_sro.cell(row=row_no, column=start_col)
-        cell.value = box_data[BOX_CODE_FIELD_NAME]
-        cell.alignment = CENTER_ALIGN
-
-        cell = ws_sro.cell(row=row_no, column=start_col + 1)
-        cell.value = box_data[BOX_TYPE_FIELD_NAME]
-        cell.alignment = CENTER_ALIGN
+        table.put(row_no, start_col, box_data[BOX_CODE_FIELD_NAME], center)
+        table.put(row_no, start_col + 1, box_data[BOX_TYPE_FIELD_NAME], center)
+        table.put(row_no, start_col + 2, no, center)
+        table.put(row_no, start_col + 3, 'S', center)
 
-        cell = ws_sro.cell(row=row_no, column=start_col + 2)
-        cell.value = no
-        cell.alignment = CENTER_ALIGN
 
-        cell = ws_sro.cell(row=row_no, column=start_col + 3)
-        cell.value = 'S'
-        cell.alignment = CENTER_ALIGN
+def fill_segment_and_next_segment_on_d3(table, start_row_no, start_col, segment_pos, graph, pbo_rows=None):
+    """
+    填充d3线缆的当前段，并沿拓扑图上的下一段指针继续填充下一段（由显式栈遍历驱动，链再长也不会递归溢出）
+    :param segment_pos: 当前段在拓扑图中的位置（NO_POSITION表示线缆已结束）
+    :param graph: 拓扑图
+    :param pbo_rows: 记录每段终点PBO的纤芯所在的(起始行, 结束行)（None表示不记录）
+    """
+    traversal.walk([(start_row_no, segment_pos)],
+                   expand=lambda node: _fill_segment_on_d3(table, node[0], start_col, node[1], graph, pbo_rows))
 
 
-def fill_segment_and_next_segment_on_d3(ws_sro, start_row_no, start_col, segment):
-    if segment is None or segment.empty:
-        return
+def _fill_segment_on_d3(table, start_row_no, start_col, segment_pos, graph, pbo_rows=None):
+    """填充d3线缆的一段，返回下一段（下一段的起始行, 下一段位置）作为子节点"""
+    if segment_pos == NO_POSITION:
+        return None
+    segment = graph.segment(segment_pos)
     section = segment[CABLE_SECTION_FIELD_NAME]
     _type = segment[CABLE_TYPE_FIELD_NAME]
     # skip_count = int(segment[CABLE_SKIP_COUNT_FIELD_NAME])
     # port_start = int(segment[CABLE_PORT_START_FIELD_NAME])
     # port_end = int(segment[CABLE_PORT_END_FIELD_NAME])
-    extremity_box = data_service_box.get_box_by_code(segment[CABLE_EXTREMITY_FIELD_NAME])
+    extremity_box_pos = graph.extremity_box[segment_pos]
+    extremity_box = graph.box(extremity_box_pos) if extremity_box_pos != NO_POSITION else None
     in_start = extremity_box[BOX_IN_START_FIELD_NAME]
     in_end = extremity_box[BOX_IN_END_FIELD_NAME]
+    center = TABLE_CENTER_STYLE
+    link = TABLE_LINK_STYLE
 
     fiber_to_fill_amt = in_end - in_start + 1
     row_no = start_row_no
@@ -422,45 +345,26 @@ def fill_segment_and_next_segment_on_d3(ws_sro, start_row_no, start_col, segment
     for i in range(0, fiber_to_fill_amt):
         row_no = start_row_no + i
         no = in_start + i
-        cell = ws_sro.cell(row=row_no, column=start_col)
-        cell.value = section
-        cell.alignment = CENTER_ALIGN
-
-        cell = ws_sro.cell(row=row_no, column=start_col + 1)
-        cell.value = _type
-        cell.alignment = CENTER_ALIGN
-
-        cell = ws_sro.cell(row=row_no, column=start_col + 2)
-        cell.value = no
-        cell.alignment = CENTER_ALIGN
+        table.put(row_no, start_col, section, center)
+        table.put(row_no, start_col + 1, _type, center)
+        table.put(row_no, start_col + 2, no, center)
 
         t = int((no - 1) / 12) + 1
-        cell = ws_sro.cell(row=row_no, column=start_col + 3)
-        cell.value = t
-        cell.alignment = CENTER_ALIGN
-        cell.font = Font(color=get_fiber_font_color(t - 1), bold=True)
-        bg_color = get_fiber_bg_color(t - 1)
-        if bg_color:
-            cell.fill = PatternFill(fill_type="solid", start_color=bg_color)
+        table.put(row_no, start_col + 3, t, fiber_style_id(t - 1, bold=True))
 
         f = (no - 1) % 12 + 1
-        cell = ws_sro.cell(row=row_no, column=start_col + 4)
-        cell.value = f
-        cell.alignment = CENTER_ALIGN
-        cell.font = Font(color=get_fiber_font_color(f - 1))
-        bg_color = get_fiber_bg_color(f - 1)
-        if bg_color:
-            cell.fill = PatternFill(fill_type="solid", start_color=bg_color)
-
-        cell = ws_sro.cell(row=row_no, column=start_col + 5)
-        cell.value = f"{extremity_box[BOX_CODE_FIELD_NAME]}-{'%02d' % (i+1)}"
-        cell.alignment = CENTER_ALIGN
+        table.put(row_no, start_col + 4, f, fiber_style_id(f - 1))
+
+        # 每段第一行的PBO标签链接到该PBO的子sheet
+        label = f"{extremity_box[BOX_CODE_FIELD_NAME]}-{'%02d' % (i+1)}"
         if not i:
-            cell.hyperlink = Hyperlink(ref=f'{excel_utils.num_to_col(start_col+5)}{row_no}', location=f"#'{extremity_box[BOX_CODE_FIELD_NAME]}'!A1")
-            cell.font = Font(name=FONT_NAME, color="0000FF", size=11, underline="single")
+            table.put(row_no, start_col + 5, label, link, link=f"#'{extremity_box[BOX_CODE_FIELD_NAME]}'!A1")
+        else:
+            table.put(row_no, start_col + 5, label, center)
 
-    next_segment = data_service_cable.get_next_segment(segment=segment)
-    fill_segment_and_next_segment_on_d3(ws_sro, row_no + 1, start_col, next_segment)
+    if pbo_rows is not None and fiber_to_fill_amt > 0:
+        pbo_rows.setdefault(extremity_box[BOX_CODE_FIELD_NAME], (start_row_no, row_no))
+    return [(row_no + 1, graph.next_segment[segment_pos])]
 
 
 def create_return_topo_cell(ws_sro, sheet_topo_title):
@@ -724,14 +628,15 @@ def set_merged_border(ws, start_row, start_col, end_row, end_col):
 
 
 COL_LOOP = 10
+FIBER_TABLE_LAST_COL_OFFSET = 30  # 数据区最后一列（PBO标签列）相对起始列的偏移
 ODF_MAX_PORT_NO = 144
 TARGET_ROW = 480
-CENTER_ALIGN = Alignment(horizontal='center', vertical='center', wrap_text=True)
 # 对齐方式配置（水平居中+垂直居中，第二组额外加自动换行）
 TITLE_BASE_ALIGN = Alignment(horizontal="center", vertical="center")  # 基础对齐（无自动换行）
 TITLE_WRAP_ALIGN = Alignment(horizontal="center", vertical="center", wrap_text=True)  # 带自动换行的对齐
 
 BOX_SHEET_TABLE_START_COL = 1
+_PBO_STYLE_IDS = {}  # (纤芯分配表样式id, 是否去掉链接样式) -> PBO子sheet样式id
 # 边框样式（统一黑色细边框）
 BORDER_SIDE = Side(style="thin", color="000000")
 CELL_BORDER = Border(
@@ -746,26 +651,3 @@ TITLE_BOX_BG_COLOR = "00B050"  # 第一组绿色背景
 TITLE_SPLICE_BG_COLOR = "FFFF00"  # 第二组黄色背景
 TITLE_BLANK_BG_COLOR = "FFFFFF"  # 第三组蓝色背景
 TITLE_SECTION_BG_COLOR = "00B0F0"  # 第三组蓝色背景
-
-FIBER_COLOR = {
-    0: {"bgc": "FF0000", "fc": "FFFFFF"},  # idx=1 红
-    1: {"bgc": "0066FF", "fc": "FFFFFF"},  # idx=2 蓝
-    2: {"bgc": "00B050", "fc": "FFFFFF"},  # idx=3 绿
-    3: {"bgc": "FFFF00", "fc": "000000"},  # idx=4 黄
-    4: {"bgc": "7030A0", "fc": "FFFFFF"},  # idx=5 紫
-    5: {"bgc": None, "fc": "000000"},  # idx=6 白
-    6: {"bgc": "FFCC00", "fc": "000000"},  # idx=7 金
-    7: {"bgc": "D9D9D9", "fc": "000000"},  # idx=8 灰
-    8: {"bgc": "963634", "fc": "FFFFFF"},  # idx=9 赭
-    9: {"bgc": "FDE9D9", "fc": "000000"},  # idx=10 米
-    10: {"bgc": "66FFFF", "fc": "000000"},  # idx=11 青
-    11: {"bgc": "FFCCFF", "fc": "000000"}  # idx=12 粉
-}
-
-
-def get_fiber_bg_color(no: int):
-    return FIBER_COLOR[no % 12]['bgc']
-
-
-def get_fiber_font_color(no: int):
-    return FIBER_COLOR[no % 12]['fc']
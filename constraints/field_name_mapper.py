@@ -6,6 +6,9 @@ BOX_CABLE_IN_FIELD_NAME = 'cable_in'
 BOX_SKIP_COUNT_FIELD_NAME = 'skip_count'
 BOX_IN_START_FIELD_NAME = 'in_start'
 BOX_IN_END_FIELD_NAME = 'in_end'
+"""BOX 图层（含SRO图层）需要加载的字段"""
+BOX_FIELD_NAMES = [BOX_CLASS_FIELD_NAME, BOX_CODE_FIELD_NAME, BOX_TYPE_FIELD_NAME, BOX_CABLE_IN_FIELD_NAME,
+                   BOX_SKIP_COUNT_FIELD_NAME, BOX_IN_START_FIELD_NAME, BOX_IN_END_FIELD_NAME]
 
 """CABLE 字段名"""
 CABLE_CLASS_FIELD_NAME = 'class'
@@ -20,4 +23,8 @@ CABLE_ORIGIN_BOX_FIELD_NAME = 'origin_box'
 CABLE_SKIP_COUNT_FIELD_NAME = 'skip_count'
 CABLE_PORT_START_FIELD_NAME = 'port_start'
 CABLE_PORT_END_FIELD_NAME = 'port_end'
-
+"""CABLE 图层需要加载的字段"""
+CABLE_FIELD_NAMES = [CABLE_CLASS_FIELD_NAME, CABLE_CODE_FIELD_NAME, CABLE_TYPE_FIELD_NAME, CABLE_LEVEL_FIELD_NAME,
+                     CABLE_ORIGIN_FIELD_NAME, CABLE_EXTREMITY_FIELD_NAME, CABLE_SECTION_FIELD_NAME,
+                     CABLE_LENGTH_FIELD_NAME, CABLE_ORIGIN_BOX_FIELD_NAME, CABLE_SKIP_COUNT_FIELD_NAME,
+                     CABLE_PORT_START_FIELD_NAME, CABLE_PORT_END_FIELD_NAME]
@@ -4,28 +4,66 @@ from typing import Optional
 import pandas as pd
 
 from constraints.field_name_mapper import BOX_CODE_FIELD_NAME, BOX_CABLE_IN_FIELD_NAME, BOX_SKIP_COUNT_FIELD_NAME, \
-    BOX_IN_START_FIELD_NAME
+    BOX_IN_START_FIELD_NAME, BOX_FIELD_NAMES, BOX_CLASS_FIELD_NAME
 from data_service import data_service_cable
 from utils import gpkg_utils
 from utils.gda_utils import LayerDGA
+from utils.query_expr import eq
 
 
 def _gda():
     gpkg_cable_path = gpkg_utils.get_gpkg_path("BOX.gpkg")
     layer_name = "elj_qae_boite_optique"
     nap_gda = LayerDGA(gpkg_cable_path, layer_name)
+    # 拓扑与纤芯分配表只用到映射字段，不读取几何（空间方法或保存时再按需补齐）
+    nap_gda.set_attribute_only(BOX_FIELD_NAMES)
+    # 按编码、所在线缆的等值查询走哈希索引
+    nap_gda.create_index(BOX_CODE_FIELD_NAME)
+    nap_gda.create_index(BOX_CABLE_IN_FIELD_NAME)
     return nap_gda
 
 
 __gda = _gda()
 
 
+def warm_up():
+    """
+    预热BOX图层：立即加载图层并构建索引（图层默认在首次查询时才读取文件）
+    :return: 加载成功返回True
+    """
+    return __gda.warm_up()
+
+
+def batch():
+    """
+    BOX图层批量写入：with块内的更新只在内存中进行，退出时统一写一次文件
+    :return: 上下文管理器
+    """
+    return __gda.batch()
+
+
+def get_generation():
+    """
+    BOX图层的数据版本号（每次加载或修改都会递增），用于判断基于该图层构建的结构是否过期
+    :return: 版本号
+    """
+    return __gda.generation
+
+
+def get_all_boxs():
+    """
+    获取BOX图层全部要素（图层原有顺序，只读）
+    :return: 全部箱体
+    """
+    return __gda.get_features_by_condition(copy=False)
+
+
 def get_all_extremities():
     """
     获取所有终点类型的节点
     :return: 终点类型的节点列表
     """
-    return __gda.get_features_by_attribute('pass_seq', '==', 100)
+    return __gda.get_features_by_attribute('pass_seq', '==', 100, copy=False)
 
 
 def boxs_amt_on_cable(cable_box):
@@ -39,17 +77,27 @@ def get_all_sro_points_by_orders(sort_by=None, ascending=True):
     :param ascending: 是否升序 默认true
     :return: 所有SRO节点列表
     """
-    return __gda.get_features_by_attribute(field='class', op='==', value='SRO', sort_by=sort_by, ascending=ascending)
+    return __gda.get_features_by_attribute(field='class', op='==', value='SRO', sort_by=sort_by, ascending=ascending,
+                                           copy=False)
 
 
 def get_box_by_code(box_code):
-    boxes = __gda.get_features_by_attribute(field=BOX_CODE_FIELD_NAME, op='==', value=box_code)
+    boxes = __gda.get_features_by_attribute(field=BOX_CODE_FIELD_NAME, op='==', value=box_code, copy=False)
     if boxes.empty:
         return None
     else:
         return boxes.iloc[0]
 
 
+def get_boxes_by_codes(box_codes) -> dict:
+    """
+    按编码批量获取箱体（一次筛选代替逐个get_box_by_code）
+    :param box_codes: 箱体编码集合
+    :return: {箱体编码: 箱体}，不存在的编码不出现在结果中
+    """
+    return __gda.get_first_by_keys(BOX_CODE_FIELD_NAME, box_codes)
+
+
 def get_all_sro_points_by_order_code_asc():
     """
     获取所有SRO节点，根据code升序
@@ -76,7 +124,7 @@ def get_all_points_on_cable_by_orders(cable_code: str, sort_by: Optional[list[st
     :return: 所有掏芯节点列表
     """
     return __gda.get_features_by_attribute(field='cable_in', op='==', value=cable_code, sort_by=sort_by,
-                                           ascending=ascending)
+                                           ascending=ascending, copy=False)
 
 
 def get_all_boxs_on_section_by_orders(section: int, sort_by: Optional[list[str]] = None,
@@ -89,7 +137,20 @@ def get_all_boxs_on_section_by_orders(section: int, sort_by: Optional[list[str]]
     :return: 所有掏芯节点列表
     """
     return __gda.get_features_by_attribute(field=BOX_CABLE_IN_FIELD_NAME, op='==', value=section, sort_by=sort_by,
-                                           ascending=ascending)
+                                           ascending=ascending, copy=False)
+
+
+def get_boxs_grouped_by_section(sections, sort_by: Optional[list[str]] = None,
+                                ascending: bool | list[bool] = True) -> dict:
+    """
+    批量获取多个section上的所有掏芯节点，按section分组（一次筛选代替逐个get_all_boxs_on_section_by_orders）
+    :param sections: section集合
+    :param sort_by: 组内排序字段
+    :param ascending: 是否升序 默认true
+    :return: {section: 掏芯节点列表}，没有掏芯节点的section不出现在结果中
+    """
+    return __gda.get_features_grouped_by_keys(BOX_CABLE_IN_FIELD_NAME, sections, sort_by=sort_by,
+                                              ascending=ascending, copy=False)
 
 
 def get_all_points_on_cable_by_order_in_start_asc(cable_code: str):
@@ -124,10 +185,7 @@ def init_data_of_all_sro_points():
     初始化所有sro节点的skip_count值为0
     """
 
-    def custom_condition(gdf):
-        return gdf["class"] == 'SRO'
-
-    update_success = __gda.update_attributes(condition=custom_condition, field_values={'skip_count': 0})
+    update_success = __gda.update_attributes(condition=eq(BOX_CLASS_FIELD_NAME, 'SRO'), field_values={'skip_count': 0})
     if update_success:
         __gda.save_changes(overwrite=True)
 
@@ -140,10 +198,7 @@ def update_skip_count_of_points_on_cable(cable_code: str, cable_skip_count: int)
     """
     print(f"cable_code: {cable_code}, skip count: {cable_skip_count}")
 
-    def custom_condition(gdf):
-        return gdf["cable_in"] == cable_code
-
-    __gda.update_attributes(condition=custom_condition,
+    __gda.update_attributes(condition=eq(BOX_CABLE_IN_FIELD_NAME, cable_code),
                             field_values={"skip_count": __gda.gdf['in_start'] + cable_skip_count - 1})
     __gda.save_changes(overwrite=True)
 
@@ -156,9 +211,16 @@ def update_skip_count_of_boxs_on_section(section: int, section_skip_count: int):
     """
     print(f"section: {section}, skip count: {section_skip_count}")
 
-    def custom_condition(gdf):
-        return gdf[BOX_CABLE_IN_FIELD_NAME] == section
-
-    __gda.update_attributes(condition=custom_condition, field_values={
+    __gda.update_attributes(condition=eq(BOX_CABLE_IN_FIELD_NAME, section), field_values={
         BOX_SKIP_COUNT_FIELD_NAME: __gda.gdf[BOX_IN_START_FIELD_NAME] + section_skip_count - 1})
     __gda.save_changes(overwrite=True)
+
+
+def update_skip_counts_by_fids(skip_counts: pd.Series):
+    """
+    按fid一次性写入多个箱体的skip_count（全网向量化计算的结果，整层只更新一次）
+    :param skip_counts: fid -> skip_count
+    """
+    if __gda.update_values_by_fids(BOX_SKIP_COUNT_FIELD_NAME, skip_counts):
+        __gda.save_changes(overwrite=True)
+
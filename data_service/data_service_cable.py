@@ -2,30 +2,67 @@ from typing import Optional
 
 from constraints.field_name_mapper import CABLE_ORIGIN_FIELD_NAME, CABLE_CODE_FIELD_NAME, CABLE_EXTREMITY_FIELD_NAME, \
     CABLE_SECTION_FIELD_NAME, CABLE_ORIGIN_BOX_FIELD_NAME, CABLE_SKIP_COUNT_FIELD_NAME, CABLE_PORT_START_FIELD_NAME, \
-    CABLE_LEVEL_FIELD_NAME
+    CABLE_LEVEL_FIELD_NAME, CABLE_FIELD_NAMES
 from utils import gpkg_utils
 from utils.gda_utils import LayerDGA
+from utils.query_expr import eq, ne, is_in, col_eq
+
+
+SECTION_ORIGIN_INDEX = (CABLE_SECTION_FIELD_NAME, CABLE_ORIGIN_FIELD_NAME)
 
 
 def _gda():
     gpkg_cable_path = gpkg_utils.get_gpkg_path("CABLE.gpkg")
     layer_name = "elj_qae_cable_optique"
     cable_dga = LayerDGA(gpkg_cable_path, layer_name)
+    # 拓扑与纤芯分配表只用到映射字段，不读取几何（空间方法或保存时再按需补齐）
+    cable_dga.set_attribute_only(CABLE_FIELD_NAMES)
+    # 线段链路查询涉及的字段均建立哈希索引
+    for field in (CABLE_CODE_FIELD_NAME, CABLE_SECTION_FIELD_NAME, CABLE_ORIGIN_FIELD_NAME,
+                  CABLE_EXTREMITY_FIELD_NAME, CABLE_ORIGIN_BOX_FIELD_NAME, CABLE_LEVEL_FIELD_NAME):
+        cable_dga.create_index(field)
+    # 复合索引：(SECTION, ORIGINE) -> 同一线缆上从该点出发的下一段，逐段追踪线缆时每跳一次字典命中
+    cable_dga.create_index(SECTION_ORIGIN_INDEX)
     return cable_dga
 
 
 __gda = _gda()
 
 
-def get_next_segment_by_origin_code(section_value, box_code):
-    def custom_condition(gdf):
-        return (gdf[CABLE_SECTION_FIELD_NAME] == section_value) & (
-                gdf[CABLE_ORIGIN_FIELD_NAME] == box_code)
+def warm_up():
+    """
+    预热CABLE图层：立即加载图层并构建索引（图层默认在首次查询时才读取文件）
+    :return: 加载成功返回True
+    """
+    return __gda.warm_up()
+
 
-    next_section = __gda.get_features_by_condition(custom_condition)
-    if next_section is None or next_section.empty:
-        return None
-    return next_section.iloc[0]
+def batch():
+    """
+    CABLE图层批量写入：with块内的更新只在内存中进行，退出时统一写一次文件
+    :return: 上下文管理器
+    """
+    return __gda.batch()
+
+
+def get_generation():
+    """
+    CABLE图层的数据版本号（每次加载或修改都会递增），用于判断基于该图层构建的结构是否过期
+    :return: 版本号
+    """
+    return __gda.generation
+
+
+def get_all_segments():
+    """
+    获取CABLE图层全部线段（图层原有顺序，只读）
+    :return: 全部线段
+    """
+    return __gda.get_features_by_condition(copy=False)
+
+
+def get_next_segment_by_origin_code(section_value, box_code):
+    return __gda.get_first_by_index(SECTION_ORIGIN_INDEX, (section_value, box_code))
 
 
 def get_next_segment(segment):
@@ -35,25 +72,18 @@ def get_next_segment(segment):
 
 
 def get_all_1st_segments_on_d1_section_order_by_skip_count_asc():
-    def custom_condition(gdf):
-        return (gdf[CABLE_LEVEL_FIELD_NAME] == 1) & (gdf[CABLE_ORIGIN_FIELD_NAME] == gdf[CABLE_ORIGIN_BOX_FIELD_NAME])
-
-    return __gda.get_features_by_condition(custom_condition, sort_by=[CABLE_SKIP_COUNT_FIELD_NAME])
+    expr = eq(CABLE_LEVEL_FIELD_NAME, 1) & col_eq(CABLE_ORIGIN_FIELD_NAME, CABLE_ORIGIN_BOX_FIELD_NAME)
+    return __gda.get_features_by_expr(expr, sort_by=[CABLE_SKIP_COUNT_FIELD_NAME], copy=False)
 
 
 def get_all_1st_segments_on_d2_section_order_by_skip_count_asc():
-    def custom_condition(gdf):
-        return (gdf[CABLE_LEVEL_FIELD_NAME] == 2) & (gdf[CABLE_ORIGIN_FIELD_NAME] == gdf[CABLE_ORIGIN_BOX_FIELD_NAME])
-
-    return __gda.get_features_by_condition(custom_condition, sort_by=[CABLE_SKIP_COUNT_FIELD_NAME])
+    expr = eq(CABLE_LEVEL_FIELD_NAME, 2) & col_eq(CABLE_ORIGIN_FIELD_NAME, CABLE_ORIGIN_BOX_FIELD_NAME)
+    return __gda.get_features_by_expr(expr, sort_by=[CABLE_SKIP_COUNT_FIELD_NAME], copy=False)
 
 
 def get_all_1st_segments_start_with_box_order_by_code_asc(box_code: str, upper_section: str):
-    def custom_condition(gdf):
-        return ((gdf[CABLE_ORIGIN_FIELD_NAME] == box_code)
-                & (gdf[CABLE_SECTION_FIELD_NAME] != upper_section))
-
-    return __gda.get_features_by_condition(custom_condition, sort_by=[CABLE_CODE_FIELD_NAME])
+    expr = eq(CABLE_ORIGIN_FIELD_NAME, box_code) & ne(CABLE_SECTION_FIELD_NAME, upper_section)
+    return __gda.get_features_by_expr(expr, sort_by=[CABLE_CODE_FIELD_NAME], copy=False)
 
 
 def has_at_least_2_segments_on_cable(first_segment_data) -> bool:
@@ -64,12 +94,9 @@ def has_at_least_2_segments_on_cable(first_segment_data) -> bool:
     :param first_segment_data: cable上的第一个section
     :return: 线缆列表
     """
-
-    def custom_condition(gdf):
-        return (gdf[CABLE_ORIGIN_FIELD_NAME] == first_segment_data[CABLE_EXTREMITY_FIELD_NAME]) & (
-                gdf[CABLE_SECTION_FIELD_NAME] == first_segment_data[CABLE_SECTION_FIELD_NAME])
-
-    return __gda.get_count_by_condition(custom_condition) > 0
+    expr = eq(CABLE_SECTION_FIELD_NAME, first_segment_data[CABLE_SECTION_FIELD_NAME]) & eq(
+        CABLE_ORIGIN_FIELD_NAME, first_segment_data[CABLE_EXTREMITY_FIELD_NAME])
+    return __gda.get_count_by_expr(expr) > 0
 
 
 def get_all_cables_start_with_one_point_by_orders(nap_code, sort_by: Optional[list[str]] = None,
@@ -81,11 +108,8 @@ def get_all_cables_start_with_one_point_by_orders(nap_code, sort_by: Optional[li
     :param ascending: 是否升序，默认True
     :return: 线缆列表
     """
-
-    def custom_condition(gdf):
-        return gdf["origin_box"] == nap_code
-
-    return __gda.get_features_by_condition(condition=custom_condition, sort_by=sort_by, ascending=ascending)
+    return __gda.get_features_by_expr(eq(CABLE_ORIGIN_BOX_FIELD_NAME, nap_code), sort_by=sort_by, ascending=ascending,
+                                      copy=False)
 
 
 def get_all_1st_segments_start_with_one_point_by_orders(box_code, sort_by: Optional[list[str]] = None,
@@ -97,11 +121,8 @@ def get_all_1st_segments_start_with_one_point_by_orders(box_code, sort_by: Optio
     :param ascending: 是否升序，默认True
     :return: 线缆列表
     """
-
-    def custom_condition(gdf):
-        return (gdf[CABLE_ORIGIN_BOX_FIELD_NAME] == box_code) & (gdf[CABLE_ORIGIN_FIELD_NAME] == box_code)
-
-    return __gda.get_features_by_condition(condition=custom_condition, sort_by=sort_by, ascending=ascending)
+    expr = eq(CABLE_ORIGIN_BOX_FIELD_NAME, box_code) & eq(CABLE_ORIGIN_FIELD_NAME, box_code)
+    return __gda.get_features_by_expr(expr, sort_by=sort_by, ascending=ascending, copy=False)
 
 
 def get_all_cables_start_with_one_point_order_by_code_asc(nap_code):
@@ -127,12 +148,8 @@ def get_all_d2_cables_order_by_skip_count():
     获取指定点位为起点的所有线缆
     :return: 线缆列表
     """
-
-    def custom_condition(gdf):
-        return gdf[CABLE_LEVEL_FIELD_NAME] == 2
-
-    return __gda.get_features_by_condition(condition=custom_condition, sort_by=[CABLE_PORT_START_FIELD_NAME],
-                                           ascending=True)
+    return __gda.get_features_by_expr(eq(CABLE_LEVEL_FIELD_NAME, 2),
+                                      sort_by=[CABLE_PORT_START_FIELD_NAME], ascending=True, copy=False)
 
 
 def get_all_1st_segments_on_d3_cable_order_by_skip_count():
@@ -140,12 +157,8 @@ def get_all_1st_segments_on_d3_cable_order_by_skip_count():
     获取指定点位为起点的所有线缆
     :return: 线缆列表
     """
-
-    def custom_condition(gdf):
-        return (gdf[CABLE_LEVEL_FIELD_NAME] == 3) & (gdf[CABLE_ORIGIN_BOX_FIELD_NAME] == gdf[CABLE_ORIGIN_FIELD_NAME])
-
-    return __gda.get_features_by_condition(condition=custom_condition, sort_by=[CABLE_PORT_START_FIELD_NAME],
-                                           ascending=True)
+    expr = eq(CABLE_LEVEL_FIELD_NAME, 3) & col_eq(CABLE_ORIGIN_BOX_FIELD_NAME, CABLE_ORIGIN_FIELD_NAME)
+    return __gda.get_features_by_expr(expr, sort_by=[CABLE_PORT_START_FIELD_NAME], ascending=True, copy=False)
 
 
 def get_all_d3_cables_order_by_skip_count():
@@ -153,12 +166,8 @@ def get_all_d3_cables_order_by_skip_count():
     获取指定点位为起点的所有线缆
     :return: 线缆列表
     """
-
-    def custom_condition(gdf):
-        return gdf[CABLE_LEVEL_FIELD_NAME] == 3
-
-    return __gda.get_features_by_condition(condition=custom_condition, sort_by=[CABLE_PORT_START_FIELD_NAME],
-                                           ascending=True)
+    return __gda.get_features_by_expr(eq(CABLE_LEVEL_FIELD_NAME, 3),
+                                      sort_by=[CABLE_PORT_START_FIELD_NAME], ascending=True, copy=False)
 
 
 def get_all_d2_d3_cables_order_by_skip_count():
@@ -166,13 +175,9 @@ def get_all_d2_d3_cables_order_by_skip_count():
     获取指定点位为起点的所有线缆
     :return: 线缆列表
     """
-
-    def custom_condition(gdf):
-        return (gdf[CABLE_LEVEL_FIELD_NAME] == 2) | (gdf[CABLE_LEVEL_FIELD_NAME] == 3)
-
-    return __gda.get_features_by_condition(condition=custom_condition,
-                                           sort_by=[CABLE_LEVEL_FIELD_NAME, CABLE_PORT_START_FIELD_NAME],
-                                           ascending=True)
+    return __gda.get_features_by_expr(is_in(CABLE_LEVEL_FIELD_NAME, (2, 3)),
+                                      sort_by=[CABLE_LEVEL_FIELD_NAME, CABLE_PORT_START_FIELD_NAME],
+                                      ascending=True, copy=False)
 
 
 def get_all_1st_segments_start_with_one_point(nap_code):
@@ -194,7 +199,7 @@ def set_extremity_by_cable_codes(code_extremity_dict):
 
 
 def get_sub_cables_amt(nap_code):
-    return __gda.get_count_by_attribute("origin_box", "==", nap_code)
+    return __gda.get_count_by_expr(eq(CABLE_ORIGIN_BOX_FIELD_NAME, nap_code))
 
 
 def init_data_of_all_distribution01():
@@ -234,16 +239,22 @@ def update_skip_count_of_1st_segment_of_section_start_with_point(start_point_cod
     :param start_point_skip_count: nap上的skip_count
     """
 
-    def custom_condition(gdf):
-        return (gdf[CABLE_ORIGIN_BOX_FIELD_NAME] == start_point_code) & (
-                gdf[CABLE_ORIGIN_FIELD_NAME] == start_point_code)
-
-    update_success = __gda.update_attributes(condition=custom_condition, field_values={
+    expr = eq(CABLE_ORIGIN_BOX_FIELD_NAME, start_point_code) & eq(CABLE_ORIGIN_FIELD_NAME, start_point_code)
+    update_success = __gda.update_attributes(condition=expr, field_values={
         CABLE_SKIP_COUNT_FIELD_NAME: __gda.gdf[CABLE_PORT_START_FIELD_NAME] + start_point_skip_count - 1})
     if update_success:
         __gda.save_changes(overwrite=True)
 
 
+def update_skip_counts_by_fids(skip_counts):
+    """
+    按fid一次性写入多条线段的skip_count（全网向量化计算的结果，整层只更新一次）
+    :param skip_counts: fid -> skip_count
+    """
+    if __gda.update_values_by_fids(CABLE_SKIP_COUNT_FIELD_NAME, skip_counts):
+        __gda.save_changes(overwrite=True)
+
+
 if __name__ == '__main__':
     gpkg_cable_path = "../gpkg/cable.gpkg"
     gda = LayerDGA(gpkg_cable_path, "cable")
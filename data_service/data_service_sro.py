@@ -3,7 +3,7 @@ from typing import Optional
 
 import pandas as pd
 
-from constraints.field_name_mapper import BOX_CODE_FIELD_NAME
+from constraints.field_name_mapper import BOX_CODE_FIELD_NAME, BOX_FIELD_NAMES
 from data_service import data_service_cable
 from utils import gpkg_utils
 from utils.gda_utils import LayerDGA
@@ -13,18 +13,45 @@ def _gda():
     gpkg_cable_path = gpkg_utils.get_gpkg_path("SRO.gpkg")
     layer_name = "elj_qae_sro"
     nap_gda = LayerDGA(gpkg_cable_path, layer_name)
+    # 拓扑与纤芯分配表只用到映射字段，不读取几何（空间方法或保存时再按需补齐）
+    nap_gda.set_attribute_only(BOX_FIELD_NAMES)
+    nap_gda.create_index(BOX_CODE_FIELD_NAME)
     return nap_gda
 
 
 __gda = _gda()
 
 
+def warm_up():
+    """
+    预热SRO图层：立即加载图层并构建索引（图层默认在首次查询时才读取文件）
+    :return: 加载成功返回True
+    """
+    return __gda.warm_up()
+
+
+def batch():
+    """
+    SRO图层批量写入：with块内的更新只在内存中进行，退出时统一写一次文件
+    :return: 上下文管理器
+    """
+    return __gda.batch()
+
+
+def get_generation():
+    """
+    SRO图层的数据版本号（每次加载或修改都会递增），用于判断基于该图层构建的结构是否过期
+    :return: 版本号
+    """
+    return __gda.generation
+
+
 def get_all_sro_order_by_code_asc():
-    return __gda.get_features_by_condition(sort_by=[BOX_CODE_FIELD_NAME])
+    return __gda.get_features_by_condition(sort_by=[BOX_CODE_FIELD_NAME], copy=False)
 
 
 def get_sro_by_code(code):
-    return __gda.get_features_by_attribute(field='CODE', op="==", value=code)
+    return __gda.get_features_by_attribute(field=BOX_CODE_FIELD_NAME, op="==", value=code, copy=False)
 
 
 def init_data_of_all_sro_points():
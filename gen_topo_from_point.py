@@ -1,17 +1,21 @@
+import json
 import os
-from datetime import datetime
 
 import openpyxl
 import pandas as pd
-from openpyxl.styles import Border, Side, Font, Alignment, PatternFill
-from openpyxl.worksheet.hyperlink import Hyperlink
 
 import init_data
-from box_sheet_creator import create_box_sheet
+from box_sheet_creator import create_box_sheets, box_sheet_name
 from constraints.field_name_mapper import *
 from data_service import data_service_box, data_service_cable, data_service_sro
-from data_service.data_service_cable import get_next_segment_by_origin_code
-from utils import excel_utils
+from topology import content_hash, topo_graph, validator
+from topology.topo_graph import NO_POSITION
+from utils import excel_utils, traversal, xlsx_renderer
+from utils.sheet_layout import SheetLayout
+from utils.style_registry import NO_BORDER, TOPO_FONT, NO_ALIGN, BLANK_STYLE, CENTER_STYLE, BOX_TITLE_STYLE, \
+    BOX_MIDDLE_STYLE, BOX_MIDDLE_LINK_STYLE, BOX_MIDDLE_BLANK_STYLE, BOX_LAST_STYLE, BOX_LAST_BLANK_STYLE, \
+    CABLE_TITLE_STYLE, CABLE_FIRST_ROW_STYLE, ROUTE_STYLE, ROUTE_CENTER_STYLE, SEGMENT_TITLE_STYLE, SEGMENT_STYLE, \
+    BRANCH_SEGMENT_TITLE_STYLE, BRANCH_SEGMENT_STYLE
 
 # 全局配置
 COLUMN_WIDTHS = {
@@ -31,30 +35,88 @@ LEVEL_TO_COLUMN = {
 GROUP_ROWS = 10  # 每组占用8行
 SHEET_ZOOM_SCALE = 70
 sheet_topo_title = "TOPO_OVERVIEW"
+TOPO_CACHE_FILE = "topo_cache.json"  # 输出目录中记录各SRO上次输出的内容哈希
+TOPO_CACHE_VERSION = "2"  # 拓扑图版式或生成逻辑变化时递增，使已有的输出全部重新生成
 
-def gen_topo_files(output_dir):
+def gen_topo_files(output_dir, validate=True, use_cache=True, write_only=False, splice_formulas=False):
+    """
+    为每个SRO生成一个拓扑图工作簿（文件名固定为“SRO编码-TOPO.xlsx”，内容不含生成时间）
+    :param output_dir: 输出目录
+    :param validate: 生成前是否校验拓扑数据（有致命错误时拒绝生成，避免中途失败留下残缺的工作簿）
+    :param use_cache: 是否跳过内容哈希与上次输出相同、且文件仍在的SRO
+    :param write_only: 是否以write-only工作簿按行流式输出（纤芯多的SRO内存占用不随行数增长）
+    :param splice_formulas: 熔接状态是否写为IF公式（带预先算出的缓存值），默认直接写R/S
+    :return: 本次生成的文件路径列表
+    """
     files = []
     if not os.path.exists(output_dir):
         raise FileNotFoundError(f"File {output_dir} not found.")
-
-    # 1. 获取所有SRO节点（根节点），按code升序
-    sro_boxes = data_service_sro.get_all_sro_order_by_code_asc()
+    # 批量生成会访问全部图层，开始前一次性加载
+    data_service_sro.warm_up()
+    data_service_box.warm_up()
+    data_service_cable.warm_up()
+
+    # 1. 获取所有SRO节点（根节点），按code升序；整个网络的邻接结构只构建一次
+    graph = topo_graph.load_graph()
+    if validate:
+        report = validator.validate(graph)
+        if validator.has_fatal(report):
+            report_path = os.path.join(output_dir, "validate_report.json")
+            validator.write_report(report, report_path)
+            raise Exception(f"拓扑数据存在致命错误，已停止生成，详见：{report_path}")
+    sro_boxes = graph.sros
     if sro_boxes is None or sro_boxes.empty:
         raise Exception("No sro boxes found.")
 
+    # 不同输出方式保存出的文件不同，切换时重新生成
+    salt = f"{TOPO_CACHE_VERSION}{'-write-only' if write_only else ''}{'-splice-formulas' if splice_formulas else ''}"
+    hashes = content_hash.sro_hashes(graph, salt=salt)
+    cache_path = os.path.join(output_dir, TOPO_CACHE_FILE)
+    cache = load_topo_cache(cache_path) if use_cache else {}
+    skipped = []
     for _, sro in sro_boxes.iterrows():
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        output_path = os.path.join(output_dir,f"{sro[BOX_CODE_FIELD_NAME]}-TOPO_{timestamp}.xlsx")
-        generate_sro_topo_wb(output_path, sro)
+        sro_code = sro[BOX_CODE_FIELD_NAME]
+        output_path = os.path.join(output_dir, f"{sro_code}-TOPO.xlsx")
+        if cache.get(str(sro_code)) == hashes[sro_code] and os.path.exists(output_path):
+            skipped.append(sro_code)
+            continue
+        generate_sro_topo_wb(output_path, sro, write_only, splice_formulas)
         files.append(output_path)
+        # 每生成一个就记录，中途失败时已生成的下次仍可跳过
+        cache[str(sro_code)] = hashes[sro_code]
+        save_topo_cache(cache_path, cache)
+    if skipped:
+        print(f"内容未变化，跳过 {len(skipped)} 个SRO：{', '.join(str(code) for code in skipped)}")
+    print(f"拓扑图生成完成：生成 {len(files)} 个，跳过 {len(skipped)} 个")
     return files
 
-def init_workbook():
-    """初始化Excel工作簿，设置列宽和样式基础"""
-    wb = openpyxl.Workbook()
-    ws_topo = wb.active
 
-    ws_topo.title = sheet_topo_title
+def load_topo_cache(cache_path):
+    """读取各SRO上次输出的内容哈希（文件不存在或损坏时视为空）"""
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"拓扑图缓存读取失败，将全部重新生成：{str(e)}")
+        return {}
+
+
+def save_topo_cache(cache_path, cache):
+    """保存各SRO输出的内容哈希"""
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+def init_workbook(write_only=False):
+    """初始化Excel工作簿，设置列宽和样式基础（write_only时工作簿没有默认sheet，拓扑总览需新建）"""
+    if write_only:
+        wb = openpyxl.Workbook(write_only=True)
+        ws_topo = wb.create_sheet(sheet_topo_title)
+    else:
+        wb = openpyxl.Workbook()
+        ws_topo = wb.active
+        ws_topo.title = sheet_topo_title
     ws_topo.sheet_view.zoomScale = SHEET_ZOOM_SCALE
 
     # 设置列宽
@@ -64,44 +126,90 @@ def init_workbook():
     return wb, ws_topo
 
 
-def generate_sro_topo_wb(output_path, sro):
-    """生成拓扑Excel的主函数"""
-    wb, ws_topo = init_workbook()
+class TopoLayout(SheetLayout):
+    """拓扑总览的布局：除单元格外，按描绘顺序登记需要创建子sheet的箱体（工作簿中sheet的顺序即描绘顺序）"""
+
+    def __init__(self):
+        super().__init__()
+        self.box_sheets = []  # [(箱体所在列, 箱体数据)]
+        self._sheet_names = {sheet_topo_title}
+
+    def add_box_sheet(self, col, box_data):
+        """登记箱体的子sheet，返回sheet名（该列的箱体没有子sheet或同名sheet已登记时返回None）"""
+        sheet_name = box_sheet_name(col, box_data)
+        if sheet_name is None or sheet_name in self._sheet_names:
+            return None
+        self._sheet_names.add(sheet_name)
+        self.box_sheets.append((col, box_data))
+        return sheet_name
+
+
+def layout_sro_topo(sro) -> TopoLayout:
+    """拓扑总览的布局阶段：只计算单元格与子sheet，不接触工作簿"""
+    layout = TopoLayout()
     current_row = 2  # 起始行
 
-    sro_sheet_name = sro[BOX_CODE_FIELD_NAME]
-    current_row = draw_point_and_resources(ws=ws_topo, current_row=current_row, box_data=sro, upper_cable_level=0,
-                                           upper_section_value="N/A", sro_sheet_name=sro_sheet_name)
-    sub_cable_amt = data_service_cable.get_all_1st_segments_start_with_box_order_by_code_asc(
-        sro[BOX_CODE_FIELD_NAME], "N/A")
-    if sub_cable_amt.empty:
+    current_row = draw_point_and_resources(layout=layout, current_row=current_row, box_data=sro, upper_cable_level=0,
+                                           upper_section_value="N/A", sro_sheet_name=sro[BOX_CODE_FIELD_NAME])
+    sub_segments = topo_graph.load_graph().sub_segments(sro[BOX_CODE_FIELD_NAME], "N/A")
+    if len(sub_segments) == 0:
         current_row += GROUP_ROWS
+    return layout
+
 
-    # 保存文件
-    wb.save(output_path)
+def generate_sro_topo_wb(output_path, sro, write_only=False, splice_formulas=False):
+    """
+    生成拓扑Excel的主函数：先布局，再渲染拓扑总览，最后按描绘顺序创建箱体子sheet
+    :param write_only: 是否以write-only工作簿按行流式输出
+    :param splice_formulas: 熔接状态是否写为IF公式（带预先算出的缓存值）
+    """
+    wb, ws_topo = init_workbook(write_only)
+    sro_sheet_name = sro[BOX_CODE_FIELD_NAME]
+    layout = layout_sro_topo(sro)
+    if write_only:
+        xlsx_renderer.stream(layout, ws_topo)
+    else:
+        xlsx_renderer.render(layout, ws_topo)
+    create_box_sheets(wb, sheet_topo_title, layout.box_sheets, sro_sheet_name, splice_formulas)
+
+    # 保存文件（不带当前时间，内容相同时文件逐字节相同）
+    xlsx_renderer.save_workbook(wb, output_path)
     print(f"拓扑图已生成：{output_path}")
 
 
-def draw_point_and_resources(ws, current_row, box_data, upper_cable_level, upper_section_value, sro_sheet_name):
+def draw_point_and_resources(layout, current_row, box_data, upper_cable_level, upper_section_value, sro_sheet_name):
+    """
+    描绘点及其下游的全部线缆与掏芯点（由显式栈遍历驱动，网络再深也不会递归溢出），返回描绘后的行号
+    同一个点经同一SECTION在路径上再次出现即拓扑成环，抛出traversal.CycleError，不再无限描绘下去
+    """
+    root = dict(layout=layout, current_row=current_row, box_data=box_data, upper_cable_level=upper_cable_level,
+                upper_section_value=upper_section_value, sro_sheet_name=sro_sheet_name)
+    return traversal.walk([root], expand=lambda node: _draw_point_and_resources_steps(**node),
+                          key=lambda node: (node["box_data"][BOX_CODE_FIELD_NAME], node["upper_section_value"]))[0]
+
+
+def _draw_point_and_resources_steps(layout, current_row, box_data, upper_cable_level, upper_section_value,
+                                    sro_sheet_name):
+    """描绘单个点的步骤（生成器）：每yield一个掏芯点，遍历引擎先描绘完该点的整棵子树，再把其后的行号送回"""
+    graph = topo_graph.load_graph()
     """判断点是否需要描绘分支线，至少两个子线缆时，初始化点的分支线的描绘开关、起止点行数"""
     (need_to_draw_box_vertical_branch_line,
      box_vertical_branch_line_start_row) = does_need_to_draw_box_vertical_branch_line(
-        current_row, box_data)
+        current_row, box_data, graph)
 
     """==================BOX描绘开始=================="""
     """描绘BOX点"""
-    current_row = draw_box_node_and_next_segment_in_same_section(ws, current_row, box_data, upper_cable_level,
+    current_row = draw_box_node_and_next_segment_in_same_section(layout, current_row, box_data, upper_cable_level,
                                                                  upper_section_value,
                                                                  need_to_draw_box_vertical_branch_line, sro_sheet_name)
 
     """查询以该BOX为起点, 但section!=box的section的所有第一段segments,"""
-    first_segments_list = data_service_cable.get_all_1st_segments_start_with_box_order_by_code_asc(
-        box_data[BOX_CODE_FIELD_NAME], upper_section_value)
+    first_segments_list = graph.sub_segments(box_data[BOX_CODE_FIELD_NAME], upper_section_value)
 
     # """查询BOX上的子线缆列表"""
     # first_section_list = data_service_cable.get_all_cables_start_with_one_point_order_by_code_asc(box_data['code'])
 
-    if first_segments_list is None or first_segments_list.empty:
+    if len(first_segments_list) == 0:
         """如果当前点没有子线缆，行号直接下移一个描绘空间
         用于描绘同级下一个点的行定位
         或者描绘循环中最后一个点的上一级线缆的同级下一个线缆的行定位"""
@@ -110,25 +218,27 @@ def draw_point_and_resources(ws, current_row, box_data, upper_cable_level, upper
         """==================子线缆描绘开始=================="""
         sub_cables_amt = len(first_segments_list)
         sub_cable_idx = 0
-        for _, _1st_segment in first_segments_list.iterrows():
+        for _1st_segment_pos in first_segments_list:
+            _1st_segment = graph.segment(_1st_segment_pos)
             sub_cable_idx += 1
             if need_to_draw_box_vertical_branch_line and sub_cable_idx == sub_cables_amt:
                 """当需要画竖向分支线，且即将开始画最后一条线缆前：画竖向分支线"""
-                draw_box_vertical_branch_line(ws=ws, upper_cable_level=upper_cable_level,
+                draw_box_vertical_branch_line(layout=layout, upper_cable_level=upper_cable_level,
                                               start_row=box_vertical_branch_line_start_row,
                                               end_row=current_row + 1)
             """判断点是否需要描绘线缆的竖向路径，至少两个pass点时，初始化点的线缆竖向线条的描绘开关，与起止点行数"""
             (need_to_draw_cable_vertical_route_line,
-             cable_vertical_route_start_row) = does_need_to_draw_cable_vertical_right_line(current_row, _1st_segment)
+             cable_vertical_route_start_row) = does_need_to_draw_cable_vertical_right_line(
+                current_row, _1st_segment_pos, graph)
             """开始描绘线缆第一个section横向部分(和自身描绘空间的右侧边框 bool参数)"""
-            current_row = draw_1st_segment(ws, current_row, _1st_segment, upper_cable_level,
+            current_row = draw_1st_segment(layout, current_row, _1st_segment, upper_cable_level,
                                            need_to_draw_cable_vertical_route_line)
 
             """==================子线缆描绘完成=================="""
 
             """==================子线缆掏芯点开始=================="""
             """查询线缆上的掏芯点列表"""
-            sub_boxes_on_complete_cable = get_sub_boxes_on_one_complete_cable_start_with_1st_section(_1st_segment, [])
+            sub_boxes_on_complete_cable = get_sub_boxes_on_one_complete_cable_start_with_1st_section(_1st_segment)
 
             sub_boxes_amt = len(sub_boxes_on_complete_cable)
             if sub_boxes_on_complete_cable is None or not sub_boxes_on_complete_cable:
@@ -145,47 +255,40 @@ def draw_point_and_resources(ws, current_row, box_data, upper_cable_level, upper
                 sub_box_idx += 1
                 if need_to_draw_cable_vertical_route_line and sub_box_idx == sub_boxes_amt:
                     """当需要画竖向路由线，即将画最后一个掏芯点前：开始画竖向路由线"""
-                    draw_cable_vertical_route_line(ws=ws, cable=_1st_segment, start_row=cable_vertical_route_start_row,
-                                                   end_row=current_row)
-                """||||||||||继续调用递归函数描绘点||||||||||"""
-                current_row = draw_point_and_resources(ws=ws, current_row=current_row, box_data=box_on_cable,
-                                                       upper_cable_level=_1st_segment[CABLE_LEVEL_FIELD_NAME],
-                                                       upper_section_value=_1st_segment[CABLE_SECTION_FIELD_NAME],
-                                                       sro_sheet_name=sro_sheet_name)
+                    draw_cable_vertical_route_line(layout=layout, cable=_1st_segment,
+                                                   start_row=cable_vertical_route_start_row, end_row=current_row)
+                """||||||||||继续描绘子节点（交给遍历引擎，描绘完后送回行号）||||||||||"""
+                current_row = yield dict(layout=layout, current_row=current_row, box_data=box_on_cable,
+                                         upper_cable_level=_1st_segment[CABLE_LEVEL_FIELD_NAME],
+                                         upper_section_value=_1st_segment[CABLE_SECTION_FIELD_NAME],
+                                         sro_sheet_name=sro_sheet_name)
 
             """==================子线缆掏芯点结束=================="""
     return current_row
 
 
-def get_sub_boxes_on_one_complete_cable_start_with_1st_section(segment, sub_boxes_list: list):
-    if segment is not None and not segment.empty:
-        section = segment[CABLE_SECTION_FIELD_NAME]
-        box = data_service_box.get_box_by_code(segment[CABLE_EXTREMITY_FIELD_NAME])
-        if not box.empty:
-            sub_boxes_list.append(box)
-            next_segment = data_service_cable.get_next_segment_by_origin_code(section, box[BOX_CODE_FIELD_NAME])
-            return get_sub_boxes_on_one_complete_cable_start_with_1st_section(next_segment, sub_boxes_list)
-        else:
-            return sub_boxes_list
-    else:
-        return sub_boxes_list
+def get_sub_boxes_on_one_complete_cable_start_with_1st_section(segment) -> list:
+    # 线缆上的掏芯点直接取自预先排好的SECTION箱体链（从该段开始往后），不再逐段查询
+    graph = topo_graph.load_graph()
+    return [graph.box(box_pos) for box_pos in graph.boxes_along(graph.segment_position(segment))]
 
 
-def draw_box_node_and_next_segment_in_same_section(ws_topo, start_row, box_data, upper_cable_level,
+def draw_box_node_and_next_segment_in_same_section(layout, start_row, box_data, upper_cable_level,
                                                    upper_section, need_to_draw_box_vertical_branch_line,
                                                    sro_sheet_name):
     col = "A" if upper_cable_level == 0 else excel_utils.get_right_col_letter(
         LEVEL_TO_COLUMN[upper_cable_level])
-    sheet_name = create_box_sheet(ws_topo, col, box_data, sro_sheet_name)
-    # 子sheet内容暂时留空（无需额外操作）
-    current_row = draw_box_node(ws_topo, start_row, col, box_data, sheet_name, need_to_draw_box_vertical_branch_line)
-    next_segment = get_next_segment_by_origin_code(upper_section, box_data[BOX_CODE_FIELD_NAME])
-    if next_segment is not None and not next_segment.empty:
-        draw_vertical_segment(ws_topo, current_row, col, next_segment)
+    sheet_name = layout.add_box_sheet(col, box_data)
+    current_row = draw_box_node(layout, start_row, col, box_data, sheet_name, need_to_draw_box_vertical_branch_line)
+    graph = topo_graph.load_graph()
+    next_segment_pos = graph.next_segment_from(upper_section, box_data[BOX_CODE_FIELD_NAME])
+    if next_segment_pos != NO_POSITION:
+        draw_vertical_segment(layout, current_row, col, graph.segment(next_segment_pos),
+                              need_to_draw_box_vertical_branch_line)
     return current_row
 
 
-def draw_box_node(ws, start_row, col, box_data, sheet_name, need_to_draw_box_vertical_branch_line):
+def draw_box_node(layout, start_row, col, box_data, sheet_name, need_to_draw_box_vertical_branch_line):
     # if box_data['class'] == 'SRO':
     #     return draw_sro_node_(ws, start_row, box_data, need_to_draw_box_vertical_branch_line)
     # else:
@@ -198,130 +301,114 @@ def draw_box_node(ws, start_row, col, box_data, sheet_name, need_to_draw_box_ver
         # 第1行：nap.class（加粗居中）
         if row == start_row:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col=col,
                 value=f"TYPE:{box_data[BOX_CLASS_FIELD_NAME]}",
-                border=BOX_1ST_ROW_BORDER,
-                font=BOLD_FONT,
-                align=CENTER_ALIGN
+                style=BOX_TITLE_STYLE
             )
 
         # 第2行：nap.code + "    " + nap.type（居中）
         elif row == start_row + 1:
+            # 有子sheet时链接到子sheet
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col=col,
                 value=f"{box_data[BOX_CODE_FIELD_NAME]}",
-                border=BOX_MIDDLE_ROW_BORDER,
-                align=CENTER_ALIGN
+                style=BOX_MIDDLE_LINK_STYLE if sheet_name else BOX_MIDDLE_STYLE,
+                link=f"#'{sheet_name}'!A1" if sheet_name else None
             )
             print(f"{row} , {col} , {box_data[BOX_CLASS_FIELD_NAME]}")
-            if sheet_name:
-                cell = ws.cell(row=row, column=excel_utils.col_to_num(col))
-                cell.hyperlink = f"#'{sheet_name}'!A1"
-                cell.hyperlink = Hyperlink(ref=f'{col}{row}',
-                                           location=f"#'{sheet_name}'!A1")
-
-                cell.font = Font(name=FONT_NAME, color="0000FF", underline="single")
         # 第3行：留空
         elif row == start_row + 2:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col=col,
                 value=f"{box_data[BOX_TYPE_FIELD_NAME]}" if col != "A" else None,
-                border=BOX_MIDDLE_ROW_BORDER,
-                align=CENTER_ALIGN
+                style=BOX_MIDDLE_STYLE
             )
         # 第4行：nap.in_start + "-" + nap.in_end（居中）
         elif row == start_row + 3:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col=col,
                 value=None,
-                border=BOX_LAST_ROW_BORDER,
-                align=CENTER_ALIGN
+                style=BOX_LAST_STYLE
             )
     # 第5-8行：留空（无边框）
     for row in range(start_row + 4, start_row + GROUP_ROWS):
-        set_cell(ws, row=row, col=col, value=None,
-                 border=CABLE_ROUTE_BORDER if need_to_draw_box_vertical_branch_line else Border())
+        set_cell(layout, row=row, col=col, value=None,
+                 style=ROUTE_STYLE if need_to_draw_box_vertical_branch_line else BLANK_STYLE)
     return start_row  # 移动到下一组
 
 
-def draw_sro_node(ws, start_row, sro_data, need_to_draw_box_vertical_branch_line):
+def draw_sro_node(layout, start_row, sro_data, need_to_draw_box_vertical_branch_line):
     """绘制A列的SRO节点（8行一组，不合并单元格）"""
     # 第1-4行：粗外侧线框（模拟盒子）
     for row in range(start_row, start_row + 4):  # 行索引：start_row到start_row+3
         # 第1行：nap.class（加粗居中）
         if row == start_row:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col='A',
                 value=sro_data['class'],
-                border=BOX_1ST_ROW_BORDER,
-                font=BOLD_FONT,
-                align=CENTER_ALIGN
+                style=BOX_TITLE_STYLE
             )
         # 第2行：nap.code（居中）
         elif row == start_row + 1:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col='A',
                 value=sro_data['code'],
-                border=BOX_MIDDLE_ROW_BORDER,
-                align=CENTER_ALIGN
+                style=BOX_MIDDLE_STYLE
             )
         elif row == start_row + 2:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col='A',
                 value=None,
-                border=BOX_MIDDLE_ROW_BORDER
+                style=BOX_MIDDLE_BLANK_STYLE
             )
         # 第3-4行：留空（保持边框）
         else:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col='A',
                 value=None,
-                border=BOX_LAST_ROW_BORDER
+                style=BOX_LAST_BLANK_STYLE
             )
     # 第5-8行：留空（无边框）
     for row in range(start_row + 4, start_row + GROUP_ROWS):
-        set_cell(ws, row=row, col='A', value=None,
-                 border=CABLE_ROUTE_BORDER if need_to_draw_box_vertical_branch_line else Border())
+        set_cell(layout, row=row, col='A', value=None,
+                 style=ROUTE_STYLE if need_to_draw_box_vertical_branch_line else BLANK_STYLE)
     return start_row  # 移动到下一组
 
 
-def draw_vertical_segment(ws, start_row, col, segment):
+def draw_vertical_segment(layout, start_row, col, segment, need_to_draw_box_vertical_branch_line):
     section = segment[CABLE_SECTION_FIELD_NAME]
     code = segment[CABLE_CODE_FIELD_NAME]
     type = segment[CABLE_TYPE_FIELD_NAME]
     length = segment[CABLE_LENGTH_FIELD_NAME]
-    line_5_right_border = get_cell_right_boarder(ws, start_row + 5, col)
-    if line_5_right_border:
-        border = Border(
-            right=Side(style=THICKER_WIDTH),
-            left=Side(style=THICKER_WIDTH)
-        )
+    # 点描绘空间第6行的右边框即点的竖向分支线（draw_box_node刚按同一开关写过），无需从表中读回
+    if need_to_draw_box_vertical_branch_line:
+        title_style, segment_style = BRANCH_SEGMENT_TITLE_STYLE, BRANCH_SEGMENT_STYLE
     else:
-        border = Border()
+        title_style, segment_style = SEGMENT_TITLE_STYLE, SEGMENT_STYLE
 
-    set_cell(ws, row=start_row + 6, col=col, value=f"{section} / {code}",
-             border=border, align=LEFT_ALIGN, font=BOLD_FONT)
-    set_cell(ws, row=start_row + 7, col=col, value=f"{type} {length}",
-             border=border, align=LEFT_ALIGN)
+    set_cell(layout, row=start_row + 6, col=col, value=f"{section} / {code}",
+             style=title_style)
+    set_cell(layout, row=start_row + 7, col=col, value=f"{type} {length}",
+             style=segment_style)
 
 
-def draw_closure_pbo_node(ws, start_row, box_data, upper_cable_level, need_to_draw_box_vertical_branch_line):
+def draw_closure_pbo_node(layout, start_row, box_data, upper_cable_level, need_to_draw_box_vertical_branch_line):
     # 3. 确定下一级节点的列（线缆列的右侧列：B→C，D→E，F→G）
     current_box_col = excel_utils.get_right_col_letter(LEVEL_TO_COLUMN[upper_cable_level])
     """绘制C/E/G列的Closure/PBO节点（8行一组，不合并单元格）"""
@@ -330,52 +417,47 @@ def draw_closure_pbo_node(ws, start_row, box_data, upper_cable_level, need_to_dr
         # 第1行：nap.class（加粗居中）
         if row == start_row:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col=current_box_col,
                 value=box_data['class'],
-                border=BOX_1ST_ROW_BORDER,
-                font=BOLD_FONT,
-                align=CENTER_ALIGN
+                style=BOX_TITLE_STYLE
             )
         # 第2行：nap.code + "    " + nap.type（居中）
         elif row == start_row + 1:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col=current_box_col,
                 value=f"{box_data['code']}    {box_data['type']}",
-                border=BOX_MIDDLE_ROW_BORDER,
-                align=CENTER_ALIGN
+                style=BOX_MIDDLE_STYLE
             )
         # 第3行：留空
         elif row == start_row + 2:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col=current_box_col,
                 value=f"On:{box_data['cable_in']}",
-                border=BOX_MIDDLE_ROW_BORDER,
-                align=CENTER_ALIGN
+                style=BOX_MIDDLE_STYLE
             )
         # 第4行：nap.in_start + "-" + nap.in_end（居中）
         elif row == start_row + 3:
             set_cell(
-                ws,
+                layout,
                 row=row,
                 col=current_box_col,
                 value=f"InRange:{int(box_data['in_start'])}-{int(box_data['in_end'])}",
-                border=BOX_LAST_ROW_BORDER,
-                align=CENTER_ALIGN
+                style=BOX_LAST_STYLE
             )
     # 第5-8行：留空（无边框）
     for row in range(start_row + 4, start_row + GROUP_ROWS):
-        set_cell(ws, row=row, col=current_box_col, value=None,
-                 border=CABLE_ROUTE_BORDER if need_to_draw_box_vertical_branch_line else Border())
+        set_cell(layout, row=row, col=current_box_col, value=None,
+                 style=ROUTE_STYLE if need_to_draw_box_vertical_branch_line else BLANK_STYLE)
     return start_row  # 移动到下一组
 
 
-def draw_cable(ws, start_row, cable_data, upper_cable_level, need_to_draw_cable_vertical_right_line):
+def draw_cable(layout, start_row, cable_data, upper_cable_level, need_to_draw_cable_vertical_right_line):
     """绘制B/D/F列的线缆（8行一组，不合并单元格）"""
     # 根据level确定列（B=1, D=2, F=3）
     current_level = cable_data['level']
@@ -385,67 +467,62 @@ def draw_cable(ws, start_row, cable_data, upper_cable_level, need_to_draw_cable_
 
     if current_level - upper_cable_level > 1:
         set_cell(
-            ws,
+            layout,
             row=start_row,
             col=excel_utils.get_left_col_letter(col),
             value="",
-            border=CABLE_FIRST_ROW_BORDER
+            style=CABLE_FIRST_ROW_STYLE
         )
         set_cell(
-            ws,
+            layout,
             row=start_row,
             col=excel_utils.get_left_col_letter(col, 2),
             value="",
-            border=CABLE_FIRST_ROW_BORDER
+            style=CABLE_FIRST_ROW_STYLE
         )
-    route_border = Border()
+    route_style, route_center_style = BLANK_STYLE, CENTER_STYLE
     if need_to_draw_cable_vertical_right_line:
-        route_border = CABLE_ROUTE_BORDER
+        route_style, route_center_style = ROUTE_STYLE, ROUTE_CENTER_STYLE
 
     # 第1行：level文本（下边框加粗）
     set_cell(
-        ws,
+        layout,
         row=start_row,
         col=col,
         value=level_text,
-        border=CABLE_FIRST_ROW_BORDER,
-        font=BOLD_FONT,
-        align=CENTER_ALIGN
+        style=CABLE_TITLE_STYLE
     )
     # 第2行：cable.code + "    " + cable.type
     set_cell(
-        ws,
+        layout,
         row=start_row + 1,
         col=col,
         value=f"{cable_data['code']}    {cable_data['type']}",
-        align=CENTER_ALIGN,
-        border=route_border
+        style=route_center_style
     )
     # 第3行：cable.r_nodes
     set_cell(
-        ws,
+        layout,
         row=start_row + 2,
         col=col,
         value=f"From: {cable_data['origin_box']}    RNodes:{cable_data['r_nodes']}",
-        align=CENTER_ALIGN,
-        border=route_border
+        style=route_center_style
     )
     # 第4行：cable.port_start + "-" + cable.port_end
     set_cell(
-        ws,
+        layout,
         row=start_row + 3,
         col=col,
         value=f"PortRange:{int(cable_data['port_start'])}-{int(cable_data['port_end'])}",
-        align=CENTER_ALIGN,
-        border=route_border
+        style=route_center_style
     )
     # 第5-8行：留空
     for row in range(start_row + 4, start_row + GROUP_ROWS):
-        set_cell(ws, row=row, col=col, value=None, border=route_border)
+        set_cell(layout, row=row, col=col, value=None, style=route_style)
     return start_row  # 移动到下一组
 
 
-def draw_1st_segment(ws, start_row, section_data, upper_cable_level, need_to_draw_cable_vertical_right_line) -> int:
+def draw_1st_segment(layout, start_row, section_data, upper_cable_level, need_to_draw_cable_vertical_right_line) -> int:
     current_level = section_data[CABLE_LEVEL_FIELD_NAME]
     level_text = {1: "Distribution 01", 2: "Distribution 02", 3: "Distribution 03"}[current_level]
 
@@ -456,45 +533,42 @@ def draw_1st_segment(ws, start_row, section_data, upper_cable_level, need_to_dra
     length = section_data[CABLE_LENGTH_FIELD_NAME]
     if current_level - upper_cable_level > 1:
         set_cell(
-            ws,
+            layout,
             row=start_row,
             col=excel_utils.get_left_col_letter(col),
             value="",
-            border=CABLE_FIRST_ROW_BORDER
+            style=CABLE_FIRST_ROW_STYLE
         )
         set_cell(
-            ws,
+            layout,
             row=start_row,
             col=excel_utils.get_left_col_letter(col, 2),
             value="",
-            border=CABLE_FIRST_ROW_BORDER
+            style=CABLE_FIRST_ROW_STYLE
         )
-    route_border = Border()
+    route_style, route_center_style = BLANK_STYLE, CENTER_STYLE
     if need_to_draw_cable_vertical_right_line:
-        route_border = CABLE_ROUTE_BORDER
+        route_style, route_center_style = ROUTE_STYLE, ROUTE_CENTER_STYLE
 
     # 第1行：level文本（下边框加粗）
     set_cell(
-        ws,
+        layout,
         row=start_row,
         col=col,
         value=f"{section} / {code}",
-        border=CABLE_FIRST_ROW_BORDER,
-        font=BOLD_FONT,
-        align=CENTER_ALIGN
+        style=CABLE_TITLE_STYLE
     )
     # 第2行：cable.code + "    " + cable.type
     set_cell(
-        ws,
+        layout,
         row=start_row + 1,
         col=col,
         value=f"{type}    {length}",
-        align=CENTER_ALIGN,
-        border=route_border
+        style=route_center_style
     )
     # # 第3行：cable.r_nodes
     # set_cell(
-    #     ws,
+    #     layout,
     #     row=start_row + 2,
     #     col=col,
     #     value=f"From: {section_data['origin_box']}    RNodes:{section_data['r_nodes']}",
@@ -503,7 +577,7 @@ def draw_1st_segment(ws, start_row, section_data, upper_cable_level, need_to_dra
     # )
     # # 第4行：cable.port_start + "-" + cable.port_end
     # set_cell(
-    #     ws,
+    #     layout,
     #     row=start_row + 3,
     #     col=col,
     #     value=f"PortRange:{int(section_data['port_start'])}-{int(section_data['port_end'])}",
@@ -512,11 +586,11 @@ def draw_1st_segment(ws, start_row, section_data, upper_cable_level, need_to_dra
     # )
     # 第3-8行：留空
     for row in range(start_row + 2, start_row + GROUP_ROWS):
-        set_cell(ws, row=row, col=col, value=None, border=route_border)
+        set_cell(layout, row=row, col=col, value=None, style=route_style)
     return start_row  # 移动到下一组
 
 
-def draw_section(ws, start_row, section_data, is_first_section, upper_cable_level,
+def draw_section(layout, start_row, section_data, is_first_section, upper_cable_level,
                  need_to_draw_cable_vertical_right_line):
     """绘制B/D/F列的线缆（8行一组，不合并单元格）"""
     # 根据level确定列（B=1, D=2, F=3）
@@ -527,67 +601,62 @@ def draw_section(ws, start_row, section_data, is_first_section, upper_cable_leve
 
     if current_level - upper_cable_level > 1:
         set_cell(
-            ws,
+            layout,
             row=start_row,
             col=excel_utils.get_left_col_letter(col),
             value="",
-            border=CABLE_FIRST_ROW_BORDER
+            style=CABLE_FIRST_ROW_STYLE
         )
         set_cell(
-            ws,
+            layout,
             row=start_row,
             col=excel_utils.get_left_col_letter(col, 2),
             value="",
-            border=CABLE_FIRST_ROW_BORDER
+            style=CABLE_FIRST_ROW_STYLE
         )
-    route_border = Border()
+    route_style, route_center_style = BLANK_STYLE, CENTER_STYLE
     if need_to_draw_cable_vertical_right_line:
-        route_border = CABLE_ROUTE_BORDER
+        route_style, route_center_style = ROUTE_STYLE, ROUTE_CENTER_STYLE
 
     # 第1行：level文本（下边框加粗）
     set_cell(
-        ws,
+        layout,
         row=start_row,
         col=col,
         value=level_text,
-        border=CABLE_FIRST_ROW_BORDER,
-        font=BOLD_FONT,
-        align=CENTER_ALIGN
+        style=CABLE_TITLE_STYLE
     )
     # 第2行：cable.code + "    " + cable.type
     set_cell(
-        ws,
+        layout,
         row=start_row + 1,
         col=col,
         value=f"{section_data['code']}    {section_data['type']}",
-        align=CENTER_ALIGN,
-        border=route_border
+        style=route_center_style
     )
     # 第3行：cable.r_nodes
     set_cell(
-        ws,
+        layout,
         row=start_row + 2,
         col=col,
         value=f"From: {section_data['origin_box']}    RNodes:{section_data['r_nodes']}",
-        align=CENTER_ALIGN,
-        border=route_border
+        style=route_center_style
     )
     # 第4行：cable.port_start + "-" + cable.port_end
     set_cell(
-        ws,
+        layout,
         row=start_row + 3,
         col=col,
         value=f"PortRange:{int(section_data['port_start'])}-{int(section_data['port_end'])}",
-        align=CENTER_ALIGN,
-        border=route_border
+        style=route_center_style
     )
     # 第5-8行：留空
     for row in range(start_row + 4, start_row + GROUP_ROWS):
-        set_cell(ws, row=row, col=col, value=None, border=route_border)
+        set_cell(layout, row=row, col=col, value=None, style=route_style)
     return start_row  # 移动到下一组
 
 
-def draw_box_vertical_branch_line(ws, upper_cable_level, start_row, end_row):
+def draw_box_vertical_branch_line(layout, upper_cable_level, start_row, end_row):
     if upper_cable_level == 0:
         col = 'A'
     else:
@@ -595,87 +664,44 @@ def draw_box_vertical_branch_line(ws, upper_cable_level, start_row, end_row):
 
     for row in range(start_row, end_row):
         set_cell(
-            ws,
+            layout,
             row=row,
             col=col,
             value="",
-            border=CABLE_ROUTE_BORDER
+            style=ROUTE_STYLE
         )
 
 
-def draw_cable_vertical_route_line(ws, cable, start_row, end_row):
+def draw_cable_vertical_route_line(layout, cable, start_row, end_row):
     col = LEVEL_TO_COLUMN[cable[CABLE_LEVEL_FIELD_NAME]]
     for row in range(start_row, end_row):
         set_cell(
-            ws,
+            layout,
             row=row,
             col=col,
             value="",
-            border=CABLE_ROUTE_BORDER
+            style=ROUTE_STYLE
         )
 
 
-def does_need_to_draw_box_vertical_branch_line(current_row, box_data):
-    sub_cables_amt = data_service_cable.get_sub_cables_amt(box_data[BOX_CODE_FIELD_NAME])
+def does_need_to_draw_box_vertical_branch_line(current_row, box_data, graph):
+    # 以该点为origin_box的线段数（拓扑图构建时已按点计好）
+    sub_cables_amt = graph.sub_segment_count.get(box_data[BOX_CODE_FIELD_NAME], 0)
     if sub_cables_amt >= 2:
         return True, current_row + GROUP_ROWS
     else:
         return False, None
 
 
-def does_need_to_draw_cable_vertical_right_line(current_row, _1st_segment_data):
-    has_at_least_2_sections = data_service_cable.has_at_least_2_segments_on_cable(_1st_segment_data)
+def does_need_to_draw_cable_vertical_right_line(current_row, _1st_segment_pos, graph):
+    # 第一段之后同一SECTION上还有下一段，即线缆至少有2段
+    has_at_least_2_sections = graph.has_next_segment[_1st_segment_pos]
     if has_at_least_2_sections:
         return True, current_row + GROUP_ROWS
     else:
         return False, None
 
 
-THIN_WIDTH = 'thin'
-THICKER_WIDTH = 'medium'
-
-# 样式定义调整：为独立单元格设置完整边框
-BOX_1ST_ROW_BORDER = Border(
-    left=Side(style=THICKER_WIDTH),
-    right=Side(style=THICKER_WIDTH),
-    top=Side(style=THICKER_WIDTH),
-    bottom=Side(style=THIN_WIDTH)
-)
-
-BOX_MIDDLE_ROW_BORDER = Border(
-    left=Side(style=THICKER_WIDTH),
-    right=Side(style=THICKER_WIDTH),
-)
-
-BOX_LAST_ROW_BORDER = Border(
-    left=Side(style=THICKER_WIDTH),
-    right=Side(style=THICKER_WIDTH),
-    bottom=Side(style=THICKER_WIDTH)
-)
-
-# 线缆第一行下边框加粗（其他边框默认）
-CABLE_FIRST_ROW_BORDER = Border(
-    bottom=Side(style=THICKER_WIDTH)
-)
-
-CABLE_ROUTE_BORDER = Border(
-    right=Side(style=THICKER_WIDTH)
-)
-
-POINT_BRANCHES_BORDER = Border(
-    right=Side(style=THICKER_WIDTH)
-)
-
-FONT_NAME = 'Calibri'
-
-BOLD_FONT = Font(name=FONT_NAME, bold=True)
-BOLD_LINK_FONT = Font(name=FONT_NAME, bold=True, italic=True, color="0000FF", underline="single")
-CENTER_ALIGN = Alignment(horizontal='center', vertical='center', wrap_text=True)
-LEFT_ALIGN = Alignment(horizontal='left', vertical='center', wrap_text=True)
-
-
-
-
 def merge_cells(ws, start_row, end_row, col, value, border=None, font=None, align=None):
     """
     合并单元格并设置内容和样式
@@ -692,25 +718,14 @@ def merge_cells(ws, start_row, end_row, col, value, border=None, font=None, alig
     # ws.merge_cells(cell_range)
     cell = ws[f"{col}{start_row}"]
     cell.value = value
-    cell.border = border or Border()
-    cell.font = font or Font(name=FONT_NAME)
-    cell.alignment = align or Alignment()
+    cell.border = border or NO_BORDER
+    cell.font = font or TOPO_FONT
+    cell.alignment = align or NO_ALIGN
 
 
-def get_cell_right_boarder(ws, row, col):
-    cell = ws[f"{col}{row}"]
-
-    # 获取单元格的边框对象
-    return cell.border.right
-
-
-def set_cell(ws, row, col, value, border=None, font=None, align=None):
-    """设置单个单元格内容和样式"""
-    cell = ws[f"{col}{row}"]
-    cell.value = value
-    cell.border = border or Border()
-    cell.font = font or Font(name=FONT_NAME)
-    cell.alignment = align or Alignment()
+def set_cell(layout, row, col, value, style=BLANK_STYLE, link=None):
+    """在布局中设置单个单元格内容和样式（style为样式登记表中的样式id，link为单元格的链接目标）"""
+    layout.put(row, excel_utils.col_to_num(col), value, style, link)
 
 
 # def get_str_value(value):
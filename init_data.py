@@ -1,8 +1,24 @@
 # 获取所有distribution1
-from constraints.field_name_mapper import CABLE_CODE_FIELD_NAME, CABLE_SKIP_COUNT_FIELD_NAME, CABLE_SECTION_FIELD_NAME, \
-    BOX_CODE_FIELD_NAME, BOX_SKIP_COUNT_FIELD_NAME
+import sys
+
+import numpy as np
+import pandas as pd
+
+from constraints.field_name_mapper import CABLE_SECTION_FIELD_NAME, CABLE_PORT_START_FIELD_NAME, \
+    BOX_CODE_FIELD_NAME, BOX_SKIP_COUNT_FIELD_NAME, BOX_IN_START_FIELD_NAME, CABLE_CODE_FIELD_NAME, \
+    CABLE_SKIP_COUNT_FIELD_NAME
 from data_service import data_service_cable, data_service_sro
 from data_service import data_service_box
+from topology import topo_graph, skip_count
+from utils import traversal
+
+# skip_count的初始化方式
+MODE_RECURSIVE = "recursive"  # 从每个SRO逐点递归、逐点更新图层（原有方式）
+MODE_VECTORIZED = "vectorized"  # 按拓扑层级整层计算，每个图层只更新一次
+MODE_COMPARE = "compare"  # 两种方式都执行，逐行比对结果（图层最终写入的是逐点递归的结果）
+# 与上次计算后的快照比对，只重算并写回受影响的子树（没有快照时整层计算）
+# 快照只由vectorized、compare、incremental三种方式记录；其间用recursive改写过的skip_count与快照不同，会被当作变化重算
+MODE_INCREMENTAL = "incremental"
 
 def fill_extremity_of_all_cables():
     extremities = data_service_box.get_all_extremities()
@@ -24,40 +40,145 @@ def init_metadata():
 
     # fill_extremity_of_all_cables()
 
-def update_skip_count_start_with_one_point(box_code, nap_skip_count):
+def update_skip_count_start_with_one_point(box_code, nap_skip_count, graph):
+    # 从单个点开始逐层向下更新skip count（由显式栈遍历驱动，不受递归深度限制；点在路径上重复出现即成环，抛出CycleError）
+    traversal.walk([(box_code, nap_skip_count)],
+                   expand=lambda node: _update_skip_count_steps(node[0], node[1], graph),
+                   key=lambda node: node[0])
+
+
+def _update_skip_count_steps(box_code, nap_skip_count, graph):
     # 更新从单个点（起点、掏芯点、终点）上分离出去的所有子线缆上的skip count
     data_service_cable.update_skip_count_of_1st_segment_of_section_start_with_point(box_code, nap_skip_count)
-    # 获取单个点（起点、掏芯点、终点）上分离出去的所有子线缆
-    _1st_segment_list = data_service_cable.get_all_1st_segments_start_with_one_point(box_code)
-    if _1st_segment_list is not None and not _1st_segment_list.empty:
-        for _segment_idx, _1st_segment in _1st_segment_list.iterrows():
-            _cable_code = _1st_segment[CABLE_CODE_FIELD_NAME]
-            _section = _1st_segment[CABLE_SECTION_FIELD_NAME]
-            _cable_skip_count = _1st_segment[CABLE_SKIP_COUNT_FIELD_NAME]
-            # 更在单个SECTION（d1,d2,d3）上掏芯的所有点（closure,终点）的skip count
-            data_service_box.update_skip_count_of_boxs_on_section(_section, _cable_skip_count)
-            # 获取在单个SECTION（d1,d2,d3）上掏芯的所有点（closure,终点）
-            box_list = data_service_box.get_all_boxs_on_section(_section)
-            if box_list is not None and not box_list.empty:
-                for _box_idx, _box in box_list.iterrows():
-                    _box_code = _box[BOX_CODE_FIELD_NAME]
-                    _box_skip_count = _box[BOX_SKIP_COUNT_FIELD_NAME]
-                    update_skip_count_start_with_one_point(_box_code, _box_skip_count)
+    # 从拓扑图获取单个点（起点、掏芯点、终点）上分离出去的所有子线缆
+    # （拓扑结构与port_start/in_start在遍历中不变，更新后的skip count按同样的公式直接算出，无需回查图层）
+    for _segment_pos in graph.section_heads_from_point(box_code):
+        _1st_segment = graph.segment(_segment_pos)
+        _section = _1st_segment[CABLE_SECTION_FIELD_NAME]
+        _cable_skip_count = _1st_segment[CABLE_PORT_START_FIELD_NAME] + nap_skip_count - 1
+        # 更在单个SECTION（d1,d2,d3）上掏芯的所有点（closure,终点）的skip count
+        data_service_box.update_skip_count_of_boxs_on_section(_section, _cable_skip_count)
+        # 获取在单个SECTION（d1,d2,d3）上掏芯的所有点（closure,终点）
+        for _box_pos in graph.boxes_on_section(_section):
+            _box = graph.box(_box_pos)
+            _box_skip_count = _box[BOX_IN_START_FIELD_NAME] + _cable_skip_count - 1
+            yield _box[BOX_CODE_FIELD_NAME], _box_skip_count
 
 
 def update_skip_count():
+    # 拓扑结构在整个计算过程中不变，只构建一次
+    graph = topo_graph.load_graph()
     all_sro_point = data_service_sro.get_all_sro_order_by_code_asc()
     if all_sro_point is not None and not all_sro_point.empty:
         for _sro_idx, _sro in all_sro_point.iterrows():
             _nap_code = _sro[BOX_CODE_FIELD_NAME]
             _nap_skip_count = _sro[BOX_SKIP_COUNT_FIELD_NAME]
-            update_skip_count_start_with_one_point(_nap_code, _nap_skip_count)
-"""==================主流程=================="""
+            try:
+                update_skip_count_start_with_one_point(_nap_code, _nap_skip_count, graph)
+            except traversal.CycleError as e:
+                # 与整层计算一致：报告成环并中止该SRO的遍历（已更新的点保留），继续下一个SRO
+                print(f"拓扑成环，SRO {_nap_code} 的skip_count计算中止：{str(e)}")
+
+
+def compute_skip_count_vectorized(graph):
+    # 以SRO（按CODE升序，与逐点递归的遍历顺序一致）为起点，整层计算全网skip count，不写图层
+    sros = graph.sros
+    sro_skip_counts = dict(zip(sros[BOX_CODE_FIELD_NAME].tolist(), sros[BOX_SKIP_COUNT_FIELD_NAME].tolist()))
+    return skip_count.compute_skip_counts(graph, sro_skip_counts)
+
+
+def update_skip_count_vectorized():
+    # 整层计算全网skip count，BOX、CABLE图层各一次性写回；返回各箱体是否从SRO可达
+    graph = topo_graph.load_graph()
+    result = compute_skip_count_vectorized(graph)
+    write_skip_counts(graph, result)
+    return result.box_assigned
 
-def main():
-    init_metadata()
+
+def update_skip_count_incremental():
+    # 只重算自上次计算以来受影响的子树，只写回值有变化的行；返回各箱体是否从SRO可达
+    graph = topo_graph.load_graph()
+    snapshot = skip_count.load_snapshot()
+    if snapshot is None:
+        print("没有上次计算的skip_count快照，执行全网计算")
+        return update_skip_count_vectorized()
+    reached = snapshot["BOX"][skip_count.REACHED_COLUMN].reindex(graph.boxes.index, fill_value=False)
+    reached = reached.to_numpy(dtype=bool)
+    start_sros, start_sections = skip_count.find_seeds(graph, snapshot)
+    if not start_sros and not start_sections:
+        print("自上次计算以来没有影响skip_count的变化，无需重算")
+        return reached
+    result = skip_count.compute_skip_counts(graph, start_sros, start_sections)
+    write_skip_counts(graph, result)
+    return reached | result.box_assigned
+
+
+def write_skip_counts(graph, result):
+    # 只写回计算值与图层当前值不同的行（NaN与NaN视为相同）
+    for column, values, assigned, update in (
+            (graph.boxes[BOX_SKIP_COUNT_FIELD_NAME], result.box_skip, result.box_assigned,
+             data_service_box.update_skip_counts_by_fids),
+            (graph.segments[CABLE_SKIP_COUNT_FIELD_NAME], result.segment_skip, result.segment_assigned,
+             data_service_cable.update_skip_counts_by_fids)):
+        current = column.to_numpy(dtype=float, na_value=np.nan)
+        changed = assigned & (current != values) & ~(np.isnan(current) & np.isnan(values))
+        if changed.any():
+            update(pd.Series(values[changed], index=column.index[changed]))
+        print(f"skip_count写回：{column.name} 计算 {int(assigned.sum())} 行，其中有变化 {int(changed.sum())} 行")
+
+
+def compare_skip_count():
+    """
+    比对两种计算方式：先整层算出向量化结果（不写图层），再按原有方式逐点递归更新，最后逐行比对两者
+    :return: 各箱体是否从SRO可达
+    """
+    graph = topo_graph.load_graph()
+    result = compute_skip_count_vectorized(graph)
+    expected_boxes, expected_segments = skip_count.expected_columns(graph, result)
     update_skip_count()
+    mismatches = _compare_column("BOX", data_service_box.get_all_boxs(), BOX_CODE_FIELD_NAME,
+                                 BOX_SKIP_COUNT_FIELD_NAME, expected_boxes)
+    mismatches += _compare_column("CABLE", data_service_cable.get_all_segments(), CABLE_CODE_FIELD_NAME,
+                                  CABLE_SKIP_COUNT_FIELD_NAME, expected_segments)
+    if mismatches:
+        print(f"skip_count比对不一致：共 {mismatches} 行")
+    else:
+        print("skip_count比对一致：向量化结果与逐点递归结果完全相同")
+    return result.box_assigned
+
+
+def _compare_column(layer_name, features, code_field, skip_field, expected):
+    # 逐行比对（NaN与NaN视为相同），打印不一致的行
+    actual = features[skip_field].astype(float).reindex(expected.index)
+    same = (actual.to_numpy() == expected.to_numpy()) | (actual.isna().to_numpy() & expected.isna().to_numpy())
+    codes = features[code_field].reindex(expected.index)
+    for fid in expected.index[~same]:
+        print(f"{layer_name} fid={fid} CODE={codes[fid]}：逐点递归 {actual[fid]}，向量化 {expected[fid]}")
+    return int(np.count_nonzero(~same))
+"""==================主流程=================="""
+
+def main(mode=MODE_RECURSIVE):
+    # 批量初始化会访问全部图层，开始前一次性加载
+    data_service_sro.warm_up()
+    data_service_box.warm_up()
+    data_service_cable.warm_up()
+    # 逐点更新只修改内存，退出时每个图层只写一次文件
+    with data_service_sro.batch(), data_service_box.batch(), data_service_cable.batch():
+        init_metadata()
+        if mode == MODE_VECTORIZED:
+            reached = update_skip_count_vectorized()
+        elif mode == MODE_INCREMENTAL:
+            reached = update_skip_count_incremental()
+        elif mode == MODE_COMPARE:
+            reached = compare_skip_count()
+        else:
+            # 逐点递归不记录快照（不额外做整网计算，也不在图层旁生成快照文件）
+            update_skip_count()
+            return
+        # 记录本次计算后的字段快照，供下次增量计算比对
+        skip_count.save_snapshot(skip_count.take_snapshot(topo_graph.load_graph(), reached))
 
 # 更新所有distribution1线缆上的掏芯点上的skip_count值
+# 用法：python init_data.py [recursive|vectorized|incremental|compare]
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1] if len(sys.argv) > 1 else MODE_RECURSIVE)
@@ -0,0 +1,45 @@
+"""
+LayerDGA批量写入（batch）的回归测试：退出with块时按块内登记的保存要求写入文件
+"""
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from utils.gda_utils import LayerDGA
+
+
+@pytest.fixture
+def layer(tmp_path):
+    gdf = gpd.GeoDataFrame({"code": ["a", "b"], "n": [1, 2]},
+                           geometry=[Point(0, 0), Point(1, 0)], crs="EPSG:4326")
+    path = str(tmp_path / "layer.gpkg")
+    gdf.to_file(path, layer="layer", driver="GPKG")
+    return LayerDGA(path, "layer")
+
+
+def read_n(layer):
+    return gpd.read_file(layer.gpkg_path, layer=layer.layer_name)["n"].tolist()
+
+
+def test_full_rewrite_requested_inside_batch(layer):
+    with layer.batch():
+        # 直接修改gdf（未经update_attributes，不会登记为脏单元格）
+        layer.gdf.loc[layer.gdf.index[0], "n"] = 10
+        assert layer.save_changes(full_rewrite=True)
+        layer.save_changes()
+    assert read_n(layer) == [10, 2]
+
+
+def test_failed_flush_raises_and_can_retry(layer, monkeypatch):
+    write_layer = LayerDGA._write_layer
+    monkeypatch.setattr(LayerDGA, "_write_layer", lambda self, *args: False)
+    with pytest.raises(Exception, match="批量写入失败"):
+        with layer.batch():
+            layer.gdf.loc[layer.gdf.index[1], "n"] = 20
+            layer.save_changes(full_rewrite=True)
+    assert read_n(layer) == [1, 2]
+
+    # 写入恢复后，块外的save_changes按保留下来的整层重写要求重试
+    monkeypatch.setattr(LayerDGA, "_write_layer", write_layer)
+    assert layer.save_changes()
+    assert read_n(layer) == [1, 20]
@@ -0,0 +1,13 @@
+"""
+分组区间索引的回归测试
+"""
+from utils.interval_index import IntervalIndex
+
+
+def test_overlaps_with_out_of_range_end():
+    # 越界的端口值（end接近int64上限）不能影响其他分组的覆盖前沿
+    index = IntervalIndex(groups=["a", "a", "b", "b", "b"],
+                          starts=[1, 2, 1, 5, 11],
+                          ends=[4_000_000_000_000_000_000, 3, 10, 6, 12],
+                          ids=["a1", "a2", "b1", "b2", "b3"])
+    assert index.overlaps() == [("a", "a1", "a2"), ("b", "b1", "b2")]
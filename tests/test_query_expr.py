@@ -0,0 +1,42 @@
+"""
+查询表达式编译与执行的回归测试：索引探测的结果须与全表扫描一致
+"""
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+from utils.gda_utils import LayerDGA
+from utils.query_expr import In, compile_plan, eq, execute_plan, is_in
+
+
+@pytest.fixture
+def layer(tmp_path):
+    gdf = gpd.GeoDataFrame({"a": [1, 2, 2, 1], "b": ["x", "x", "y", "x"]},
+                           geometry=[Point(i, 0) for i in range(4)], crs="EPSG:4326")
+    path = str(tmp_path / "layer.gpkg")
+    gdf.to_file(path, layer="layer", driver="GPKG")
+    gda = LayerDGA(path, "layer")
+    gda.create_index("a")
+    gda.create_index(("a", "b"))
+    return gda
+
+
+def test_empty_in_on_indexed_field(layer):
+    plan = compile_plan(In("a", ()), layer._indexes.keys())
+    positions = execute_plan(plan, layer, {})
+    assert len(positions) == 0
+    assert layer.get_features_by_attribute("a", "in", []).empty
+    assert len(layer.get_positions_by_expr(is_in("a", []))) == 0
+
+
+def test_conflicting_eq_terms_skip_composite_probe(layer):
+    expr = eq("a", 1) & eq("a", 2) & eq("b", "x")
+    assert len(layer.get_positions_by_expr(expr)) == 0
+    assert np.array_equal(layer.get_positions_by_expr(expr), np.flatnonzero(expr.mask(layer.gdf)))
+
+
+def test_single_eq_terms_use_composite_probe(layer):
+    expr = eq("a", 1) & eq("b", "x")
+    assert compile_plan(expr, layer._indexes.keys()).index == ("a", "b")
+    assert layer.get_positions_by_expr(expr).tolist() == [0, 3]
@@ -0,0 +1,83 @@
+"""
+SRO工作簿的内容哈希：工作簿只由它读取的图层行（映射字段）决定，这些行不变时输出也不变，可以跳过重新生成
+- 拓扑总览：SRO本身、其下游（子孙）箱体，以及这些点分出的SECTION上的全部线段
+- 纤芯分配表：目前按level列出图层中全部D1/D2/D3线缆（不区分SRO），它读取的行计入每个SRO的哈希
+行按图层顺序参与哈希（描绘顺序与图层顺序有关），哈希值在不同进程、不同次运行之间稳定
+"""
+import hashlib
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from constraints.field_name_mapper import BOX_FIELD_NAMES, CABLE_FIELD_NAMES, BOX_CODE_FIELD_NAME, \
+    BOX_CABLE_IN_FIELD_NAME, CABLE_SECTION_FIELD_NAME, CABLE_LEVEL_FIELD_NAME, CABLE_ORIGIN_FIELD_NAME, \
+    CABLE_ORIGIN_BOX_FIELD_NAME
+from topology.topo_graph import TopoGraph, NO_POSITION
+
+
+def row_hashes(frame: pd.DataFrame, fields: List[str]) -> np.ndarray:
+    """每行映射字段的64位哈希（图层缺少的字段不参与）"""
+    columns = [field for field in fields if field in frame.columns]
+    if frame.empty or not columns:
+        return np.zeros(len(frame), dtype=np.uint64)
+    return pd.util.hash_pandas_object(frame[columns], index=False).to_numpy(dtype=np.uint64)
+
+
+def fiber_table_masks(graph: TopoGraph) -> tuple[np.ndarray, np.ndarray]:
+    """
+    纤芯分配表读取的行：D1/D2/D3各SECTION的第一段、D1/D2 SECTION上掏芯的箱体、D3 SECTION的全部线段及其终点箱体
+    :return: (箱体掩码, 线段掩码)
+    """
+    boxes, segments = graph.boxes, graph.segments
+    sections = segments[CABLE_SECTION_FIELD_NAME]
+    level = segments[CABLE_LEVEL_FIELD_NAME]
+    is_head = (segments[CABLE_ORIGIN_FIELD_NAME] == segments[CABLE_ORIGIN_BOX_FIELD_NAME]).to_numpy(
+        dtype=bool, na_value=False)
+    head_level = level.where(is_head)
+    d12_sections = sections[head_level.isin([1, 2]).to_numpy(dtype=bool)].unique()
+    d3_sections = sections[(head_level == 3).to_numpy(dtype=bool, na_value=False)].unique()
+
+    on_d3 = sections.isin(d3_sections).to_numpy(dtype=bool)
+    segment_mask = (is_head & level.isin([1, 2, 3]).to_numpy(dtype=bool)) | on_d3
+    box_mask = boxes[BOX_CABLE_IN_FIELD_NAME].isin(d12_sections).to_numpy(dtype=bool, copy=True)
+    extremities = graph.extremity_box[on_d3]
+    box_mask[extremities[extremities != NO_POSITION]] = True
+    return box_mask, segment_mask
+
+
+def _grouped_digests(roots: np.ndarray, hashes: np.ndarray, sro_codes: list) -> List[bytes]:
+    """按最上游点把行哈希分到各SRO（组内保持图层顺序），返回各SRO的摘要"""
+    group = pd.Index(sro_codes, dtype=object).get_indexer(pd.Index(roots, dtype=object))
+    order = np.argsort(group, kind="stable")
+    bounds = np.searchsorted(group[order], np.arange(len(sro_codes) + 1))
+    ordered = hashes[order]
+    return [hashlib.sha256(ordered[bounds[i]:bounds[i + 1]].tobytes()).digest() for i in range(len(sro_codes))]
+
+
+def sro_hashes(graph: TopoGraph, salt: str = "") -> Dict[object, str]:
+    """
+    计算每个SRO工作簿的内容哈希
+    :param graph: 拓扑图
+    :param salt: 参与哈希的附加内容（如生成逻辑的版本号，版本变化时全部哈希失效）
+    :return: SRO编码 -> 十六进制哈希
+    """
+    sro_codes = graph.sros[BOX_CODE_FIELD_NAME].tolist()
+    box_hashes = row_hashes(graph.boxes, BOX_FIELD_NAMES)
+    segment_hashes = row_hashes(graph.segments, CABLE_FIELD_NAMES)
+    sro_rows = row_hashes(graph.sros, BOX_FIELD_NAMES)
+
+    box_mask, segment_mask = fiber_table_masks(graph)
+    shared = hashlib.sha256(box_hashes[box_mask].tobytes() + segment_hashes[segment_mask].tobytes()).digest()
+    box_digests = _grouped_digests(graph.box_root, box_hashes, sro_codes)
+    segment_digests = _grouped_digests(graph.segment_root, segment_hashes, sro_codes)
+
+    fields = "|".join(BOX_FIELD_NAMES + CABLE_FIELD_NAMES)
+    result = {}
+    for pos, code in enumerate(sro_codes):
+        digest = hashlib.sha256()
+        for part in (salt.encode("utf-8"), fields.encode("utf-8"), sro_rows[pos:pos + 1].tobytes(),
+                     box_digests[pos], segment_digests[pos], shared):
+            digest.update(part)
+        result[code] = digest.hexdigest()
+    return result
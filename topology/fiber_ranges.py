@@ -0,0 +1,72 @@
+"""
+纤芯范围索引：
+- 每条SECTION上各掏芯箱体占用的[in_start, in_end]
+- 每个起点（SRO/箱体）上分出的各SECTION占用的[port_start, port_end]
+纤芯分配表按data_1st_row + skip_count逐行写入，范围重叠时后写的单元格会静默覆盖先写的，
+这里用区间索引一次找出全部重叠与空闲纤芯
+"""
+from typing import Dict, List
+
+import pandas as pd
+
+from constraints.field_name_mapper import BOX_CABLE_IN_FIELD_NAME, BOX_IN_START_FIELD_NAME, BOX_IN_END_FIELD_NAME, \
+    BOX_CODE_FIELD_NAME, BOX_TYPE_FIELD_NAME, CABLE_SECTION_FIELD_NAME, CABLE_ORIGIN_FIELD_NAME, \
+    CABLE_ORIGIN_BOX_FIELD_NAME, CABLE_PORT_START_FIELD_NAME, CABLE_PORT_END_FIELD_NAME, CABLE_TYPE_FIELD_NAME
+from topology.topo_graph import TopoGraph
+from utils.interval_index import IntervalIndex
+
+
+def capacity(values: pd.Series) -> pd.Series:
+    """CAPACITE（如“48FO”）-> 纤芯数，无法解析时为NaN"""
+    return pd.to_numeric(values.astype(str).str.extract(r"(\d+)", expand=False), errors="coerce")
+
+
+def section_ranges(graph: TopoGraph) -> IntervalIndex:
+    """SECTION -> 掏芯箱体占用的[in_start, in_end]（区间id为箱体编码）"""
+    boxes = graph.boxes
+    return IntervalIndex(boxes[BOX_CABLE_IN_FIELD_NAME].tolist(), boxes[BOX_IN_START_FIELD_NAME],
+                         boxes[BOX_IN_END_FIELD_NAME], boxes[BOX_CODE_FIELD_NAME].tolist())
+
+
+def port_ranges(graph: TopoGraph) -> IntervalIndex:
+    """起点 -> 分出的各SECTION第一段占用的[port_start, port_end]（区间id为SECTION）"""
+    segments = graph.segments
+    heads = segments[(segments[CABLE_ORIGIN_FIELD_NAME] == segments[CABLE_ORIGIN_BOX_FIELD_NAME]).to_numpy(
+        dtype=bool, na_value=False)]
+    return IntervalIndex(heads[CABLE_ORIGIN_FIELD_NAME].tolist(), heads[CABLE_PORT_START_FIELD_NAME],
+                         heads[CABLE_PORT_END_FIELD_NAME], heads[CABLE_SECTION_FIELD_NAME].tolist())
+
+
+def section_capacities(graph: TopoGraph) -> Dict[object, int]:
+    """SECTION -> 线缆纤芯数（取该SECTION第一条线段的CAPACITE）"""
+    segments = graph.segments
+    capacities = capacity(segments[CABLE_TYPE_FIELD_NAME]).groupby(
+        segments[CABLE_SECTION_FIELD_NAME].to_numpy(dtype=object)).first().dropna()
+    return {section: int(value) for section, value in capacities.items()}
+
+
+def origin_capacities(graph: TopoGraph) -> Dict[object, int]:
+    """起点 -> 可分出的纤芯数（SRO取CAPACITE，箱体取其在上级线缆上占用的纤芯数in_end - in_start + 1）"""
+    boxes, sros = graph.boxes, graph.sros
+    in_use = (pd.to_numeric(boxes[BOX_IN_END_FIELD_NAME], errors="coerce")
+              - pd.to_numeric(boxes[BOX_IN_START_FIELD_NAME], errors="coerce") + 1)
+    capacities = pd.concat([
+        pd.Series(in_use.to_numpy(), index=boxes[BOX_CODE_FIELD_NAME].to_numpy(dtype=object)),
+        pd.Series(capacity(sros[BOX_TYPE_FIELD_NAME]).to_numpy(),
+                  index=sros[BOX_CODE_FIELD_NAME].to_numpy(dtype=object))])
+    capacities = capacities[~capacities.index.duplicated(keep="last")].dropna()
+    return {code: int(value) for code, value in capacities.items()}
+
+
+def free_ranges(index: IntervalIndex, capacities: Dict[object, int]) -> Dict[object, List[tuple]]:
+    """
+    各分组在[1, 纤芯数]内的空闲纤芯（纤芯数未知时只算区间之间的空隙）
+    :return: 分组 -> [(start, end), ...]（只含有空闲的分组）
+    """
+    result = {}
+    for group in index.groups():
+        high = capacities.get(group)
+        gaps = index.gaps(group, low=1, high=high)
+        if gaps:
+            result[group] = gaps
+    return result
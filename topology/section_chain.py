@@ -0,0 +1,117 @@
+"""
+SECTION链：把每条SECTION上的线段按ORIGINE/EXTREMITE首尾相接的顺序排好，并得到沿途的箱体顺序
+基于拓扑图的“下一段”指针数组，用指针倍增（list ranking）一次性求出每条线段所在链的链头与链内序号，
+全部为数组运算，不逐段追踪；链断开（一条SECTION被分成多截）、分叉、成环时记录为问题，不会无限追踪
+"""
+from typing import Dict, List
+
+import numpy as np
+
+NO_POSITION = -1
+
+CHAIN_BROKEN = "broken"  # 同一SECTION上有多个链头（链在中间断开）
+CHAIN_FORK = "fork"  # 同一SECTION上有多条线段指向同一下一段
+CHAIN_CYCLIC = "cyclic"  # 线段首尾相接成环，没有链头
+
+
+class SectionChains:
+    """按SECTION排好顺序的线段链与箱体链（位置均指向拓扑图的segments/boxes）"""
+    problems: List[dict]  # 链问题列表：{"section": SECTION, "kind": 问题类型, "segments": 涉及的线段位置}
+
+    def __init__(self, sections: np.ndarray, origin_is_start: np.ndarray, next_segment: np.ndarray,
+                 extremity_box: np.ndarray):
+        """
+        :param sections: 线段位置 -> SECTION
+        :param origin_is_start: 线段位置 -> 是否为线缆起点段（ORIGINE == origin_box）
+        :param next_segment: 线段位置 -> 同一SECTION上下一段的位置
+        :param extremity_box: 线段位置 -> 终点箱体位置
+        """
+        n = len(next_segment)
+        positions = np.arange(n, dtype=np.intp)
+        has_next = next_segment != NO_POSITION
+
+        # 前驱：每段最多一个前驱，多个前驱即为分叉
+        predecessor_count = np.bincount(next_segment[has_next], minlength=n)
+        predecessor = np.full(n, NO_POSITION, dtype=np.intp)
+        predecessor[next_segment[has_next]] = positions[has_next]
+
+        # 指针倍增：root逐轮跳到前驱的前驱，rank累加跳过的段数，log2(n)轮后root收敛到链头
+        root = np.where(predecessor != NO_POSITION, predecessor, positions)
+        rank = (predecessor != NO_POSITION).astype(np.intp)
+        for _ in range(max(n, 1).bit_length() + 1):
+            rank = rank + rank[root]
+            root = root[root]
+        # 收敛到的root仍有前驱：线段在环上
+        cyclic = predecessor[root] != NO_POSITION if n else np.zeros(0, dtype=bool)
+
+        # 按(链头, 链内序号)排序，每个链头对应连续的一截
+        chained = np.flatnonzero(~cyclic)
+        order = chained[np.lexsort((rank[chained], root[chained]))]
+        order_roots = root[order]
+        piece_starts = np.flatnonzero(np.r_[True, order_roots[1:] != order_roots[:-1]]) if len(order) else order
+        piece_ends = np.r_[piece_starts[1:], len(order)] if len(order) else order
+
+        self._order = order
+        self._boxes = extremity_box[order]
+        self._root = root
+        self._rank = rank
+        self._piece_end = np.zeros(n, dtype=np.intp)
+        self._piece_start = np.zeros(n, dtype=np.intp)
+        heads = order[piece_starts]
+        self._piece_start[heads] = piece_starts
+        self._piece_end[heads] = piece_ends
+        self._cyclic = cyclic
+
+        # SECTION -> 主链（优先取以线缆起点段开头的一截，否则取最长的一截）
+        self._section_piece: Dict[object, int] = {}
+        pieces_by_section: Dict[object, List[int]] = {}
+        for head in heads.tolist():
+            pieces_by_section.setdefault(sections[head], []).append(head)
+        for section, section_heads in pieces_by_section.items():
+            starts = [head for head in section_heads if origin_is_start[head]]
+            self._section_piece[section] = starts[0] if starts else max(
+                section_heads, key=lambda head: self._piece_end[head] - self._piece_start[head])
+
+        self.problems = []
+        fork_sections = set(sections[next_segment[has_next & (predecessor_count[np.maximum(next_segment, 0)] > 1)]])
+        for section, section_heads in pieces_by_section.items():
+            if len(section_heads) > 1:
+                kind = CHAIN_FORK if section in fork_sections else CHAIN_BROKEN
+                self.problems.append({"section": section, "kind": kind, "segments": sorted(section_heads)})
+        cyclic_positions = np.flatnonzero(cyclic)
+        cyclic_by_section: Dict[object, List[int]] = {}
+        for pos in cyclic_positions.tolist():
+            cyclic_by_section.setdefault(sections[pos], []).append(pos)
+        for section, section_positions in cyclic_by_section.items():
+            self.problems.append({"section": section, "kind": CHAIN_CYCLIC, "segments": section_positions})
+        for problem in self.problems:
+            print(f"SECTION链异常：{problem['section']}，类型：{problem['kind']}，涉及线段数：{len(problem['segments'])}")
+
+    def _piece(self, segment_pos: int) -> tuple[int, int]:
+        """线段所在一截在排序数组中的[当前段, 截尾)区间；环上的线段返回空区间"""
+        if segment_pos == NO_POSITION or self._cyclic[segment_pos]:
+            return 0, 0
+        head = self._root[segment_pos]
+        return self._piece_start[head] + self._rank[segment_pos], self._piece_end[head]
+
+    def segments_from(self, segment_pos: int) -> np.ndarray:
+        """从该段开始（含）沿SECTION向后的所有线段位置"""
+        start, end = self._piece(segment_pos)
+        return self._order[start:end]
+
+    def boxes_from(self, segment_pos: int) -> np.ndarray:
+        """从该段开始沿SECTION向后依次经过的终点箱体位置，遇到终点箱体不存在时截止"""
+        start, end = self._piece(segment_pos)
+        boxes = self._boxes[start:end]
+        missing = np.flatnonzero(boxes == NO_POSITION)
+        return boxes[:missing[0]] if len(missing) else boxes
+
+    def segments_of(self, section) -> np.ndarray:
+        """SECTION上按顺序排列的线段位置（链断开时为主链）"""
+        head = self._section_piece.get(section, NO_POSITION)
+        return self.segments_from(head)
+
+    def boxes_of(self, section) -> np.ndarray:
+        """SECTION上按顺序经过的箱体位置（链断开时为主链）"""
+        head = self._section_piece.get(section, NO_POSITION)
+        return self.boxes_from(head)
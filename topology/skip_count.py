@@ -0,0 +1,258 @@
+"""
+全网skip_count的向量化计算：不再逐点递归、逐点更新图层，而是按拓扑层级一次算一层
+- 线缆（SECTION第一段）skip_count = 起点skip_count + port_start - 1
+- 箱体skip_count = 所在SECTION的skip_count + in_start - 1
+从SRO出发，每一轮把当前一层点的skip_count推到其分出的SECTION及SECTION上的掏芯箱体，掏芯箱体构成下一层；
+轮数等于网络深度（SRO -> d1 -> d2 -> d3），每一轮都是对整层的数组运算。结果与逐点递归的写入一致
+（同一点/同一SECTION被多次写入时同样以最后一次为准）
+增量计算：每次计算（逐点递归方式除外）后保存参与计算的字段快照，下次只从变化处所在的SECTION起点重算其下游子树
+"""
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from constraints.field_name_mapper import BOX_CODE_FIELD_NAME, BOX_CABLE_IN_FIELD_NAME, BOX_IN_START_FIELD_NAME, \
+    BOX_SKIP_COUNT_FIELD_NAME, CABLE_SECTION_FIELD_NAME, CABLE_ORIGIN_FIELD_NAME, CABLE_ORIGIN_BOX_FIELD_NAME, \
+    CABLE_PORT_START_FIELD_NAME, CABLE_SKIP_COUNT_FIELD_NAME
+from topology.topo_graph import TopoGraph, NO_POSITION
+from utils import gpkg_utils
+
+
+class SkipCounts:
+    """向量化计算出的skip_count（位置均指向拓扑图的boxes/segments，未被写入的位置为NaN）"""
+    box_skip: np.ndarray  # 箱体位置 -> skip_count
+    box_assigned: np.ndarray  # 箱体位置 -> 是否被写入（从某个SRO可达）
+    segment_skip: np.ndarray  # 线段位置 -> skip_count（只有SECTION第一段会被写入）
+    segment_assigned: np.ndarray  # 线段位置 -> 是否被写入
+    passes: int  # 实际计算的层数
+    cyclic: bool  # 是否因拓扑成环而在达到层数上限时中止
+
+    def __init__(self, box_count: int, segment_count: int):
+        self.box_skip = np.full(box_count, np.nan)
+        self.box_assigned = np.zeros(box_count, dtype=bool)
+        self.segment_skip = np.full(segment_count, np.nan)
+        self.segment_assigned = np.zeros(segment_count, dtype=bool)
+        self.passes = 0
+        self.cyclic = False
+
+
+def compute_skip_counts(graph: TopoGraph, sro_skip_counts: Dict[object, object],
+                        section_skip_counts: Optional[Dict[object, object]] = None) -> SkipCounts:
+    """
+    按拓扑层级计算全网skip_count（只计算，不写图层）
+    :param graph: 拓扑图
+    :param sro_skip_counts: 起点编码 -> 起点的skip_count（全网计算时为全部SRO，按逐点递归时遍历SRO的顺序排列）
+    :param section_skip_counts: 额外的起始SECTION -> 该SECTION的skip_count（增量计算时使用，从SECTION上的箱体开始）
+    :return: 计算结果
+    """
+    boxes, segments = graph.boxes, graph.segments
+    result = SkipCounts(len(boxes), len(segments))
+
+    # 点编码、SECTION统一编号，之后每一轮只做整数数组的索引运算（缺失值编号为-1）
+    box_codes = boxes[BOX_CODE_FIELD_NAME].to_numpy(dtype=object)
+    origins = segments[CABLE_ORIGIN_FIELD_NAME].to_numpy(dtype=object)
+    origin_boxes = segments[CABLE_ORIGIN_BOX_FIELD_NAME].to_numpy(dtype=object)
+    sro_codes = np.array(list(sro_skip_counts.keys()), dtype=object)
+    code_ids, code_uniques = pd.factorize(np.concatenate([box_codes, origins, sro_codes]))
+    box_code_id = code_ids[:len(boxes)]
+    origin_id = code_ids[len(boxes):len(boxes) + len(segments)]
+    sro_code_id = code_ids[len(boxes) + len(segments):]
+    section_ids, section_uniques = pd.factorize(np.concatenate([
+        segments[CABLE_SECTION_FIELD_NAME].to_numpy(dtype=object),
+        boxes[BOX_CABLE_IN_FIELD_NAME].to_numpy(dtype=object)]))
+    segment_section_id = section_ids[:len(segments)]
+    box_section_id = section_ids[len(segments):]
+
+    # SECTION第一段：ORIGINE == origin_box（与逐点更新的条件一致）
+    heads = np.flatnonzero((origins == origin_boxes) & (origin_id >= 0))
+    head_origin_id = origin_id[heads]
+    head_section_id = segment_section_id[heads]
+    head_port_start = segments[CABLE_PORT_START_FIELD_NAME].to_numpy(dtype=float, na_value=np.nan)[heads]
+    box_in_start = boxes[BOX_IN_START_FIELD_NAME].to_numpy(dtype=float, na_value=np.nan)
+    box_on_section = np.flatnonzero(box_section_id >= 0)
+
+    node_skip = np.full(len(code_uniques), np.nan)
+    section_skip = np.full(len(section_uniques), np.nan)
+    frontier_id = sro_code_id[sro_code_id >= 0]
+    frontier_skip = np.array(list(sro_skip_counts.values()), dtype=float)[sro_code_id >= 0]
+    # 起始SECTION：其第一段在第一层中与起点分出的SECTION一起写入
+    seed_selected, seed_skip = _seed_sections(section_uniques, head_section_id, section_skip_counts)
+    # 无环时层数不超过SECTION数，超过即说明拓扑成环（逐点递归在这种数据上不会结束）
+    for _ in range(len(section_uniques) + 1):
+        if len(frontier_id) == 0 and len(seed_selected) == 0:
+            break
+        result.passes += 1
+        node_active = np.zeros(len(code_uniques), dtype=bool)
+        node_active[frontier_id] = True
+        node_skip[frontier_id] = frontier_skip
+
+        # 当前一层点分出的SECTION第一段
+        selected = np.flatnonzero(node_active[head_origin_id])
+        cable_skip = head_port_start[selected] + node_skip[head_origin_id[selected]] - 1
+        selected, cable_skip = np.r_[selected, seed_selected], np.r_[cable_skip, seed_skip]
+        seed_selected, seed_skip = seed_selected[:0], seed_skip[:0]
+        result.segment_skip[heads[selected]] = cable_skip
+        result.segment_assigned[heads[selected]] = True
+
+        # 这些SECTION上的掏芯箱体
+        section_active = np.zeros(len(section_uniques), dtype=bool)
+        section_active[head_section_id[selected]] = True
+        section_skip[head_section_id[selected]] = cable_skip
+        reached = box_on_section[section_active[box_section_id[box_on_section]]]
+        box_skip = box_in_start[reached] + section_skip[box_section_id[reached]] - 1
+        result.box_skip[reached] = box_skip
+        result.box_assigned[reached] = True
+
+        # 掏芯箱体作为下一层的起点
+        has_code = box_code_id[reached] >= 0
+        frontier_id = box_code_id[reached][has_code]
+        frontier_skip = box_skip[has_code]
+    else:
+        result.cyclic = len(frontier_id) > 0
+    if result.cyclic:
+        print(f"拓扑成环，skip_count计算在第 {result.passes} 层中止，仍有 {len(frontier_id)} 个点未展开")
+    print(f"skip_count向量化计算完成：{result.passes} 层，"
+          f"箱体 {int(result.box_assigned.sum())} 个，线段 {int(result.segment_assigned.sum())} 条")
+    return result
+
+
+def _seed_sections(section_uniques, head_section_id: np.ndarray,
+                   section_skip_counts: Optional[Dict[object, object]]) -> tuple[np.ndarray, np.ndarray]:
+    """起始SECTION -> (其第一段在heads中的下标, 对应的skip_count)"""
+    if not section_skip_counts:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+    section_ids = pd.Index(section_uniques).get_indexer(list(section_skip_counts.keys()))
+    found = section_ids >= 0
+    seeded = np.zeros(len(section_uniques), dtype=bool)
+    seeded[section_ids[found]] = True
+    skip = np.full(len(section_uniques), np.nan)
+    skip[section_ids[found]] = np.array(list(section_skip_counts.values()), dtype=float)[found]
+    selected = np.flatnonzero(seeded[head_section_id])
+    return selected, skip[head_section_id[selected]]
+
+
+def expected_columns(graph: TopoGraph, result: SkipCounts) -> tuple[pd.Series, pd.Series]:
+    """
+    计算结果覆盖到图层原值上之后的完整skip_count列（未被写入的行保持原值），用于与逐点递归的结果比对
+    :return: (箱体skip_count列, 线段skip_count列)，索引为fid
+    """
+    box_column = graph.boxes[BOX_SKIP_COUNT_FIELD_NAME].astype(float).to_numpy(copy=True)
+    box_column[result.box_assigned] = result.box_skip[result.box_assigned]
+    segment_column = graph.segments[CABLE_SKIP_COUNT_FIELD_NAME].astype(float).to_numpy(copy=True)
+    segment_column[result.segment_assigned] = result.segment_skip[result.segment_assigned]
+    return pd.Series(box_column, index=graph.boxes.index), pd.Series(segment_column, index=graph.segments.index)
+
+
+# --------------------------
+# 增量计算：与上次计算后的快照比对，只重算受影响的子树
+# --------------------------
+REACHED_COLUMN = "reached"  # 快照中记录箱体是否从某个SRO可达（只有可达的箱体才会作为重算起点）
+SNAPSHOT_FIELDS = {
+    "SRO": [BOX_CODE_FIELD_NAME, BOX_SKIP_COUNT_FIELD_NAME],
+    "BOX": [BOX_CODE_FIELD_NAME, BOX_CABLE_IN_FIELD_NAME, BOX_IN_START_FIELD_NAME, BOX_SKIP_COUNT_FIELD_NAME],
+    "CABLE": [CABLE_SECTION_FIELD_NAME, CABLE_ORIGIN_FIELD_NAME, CABLE_ORIGIN_BOX_FIELD_NAME,
+              CABLE_PORT_START_FIELD_NAME, CABLE_SKIP_COUNT_FIELD_NAME],
+}
+
+
+def _snapshot_path(layer: str) -> str:
+    return gpkg_utils.get_gpkg_path(f"skip_count_snapshot_{layer}.parquet")
+
+
+def take_snapshot(graph: TopoGraph, reached: np.ndarray) -> Dict[str, pd.DataFrame]:
+    """
+    记录参与skip_count计算的字段（索引为fid）
+    :param graph: 计算完成后的拓扑图
+    :param reached: 箱体位置 -> 是否从某个SRO可达
+    :return: 图层名 -> 快照
+    """
+    snapshot = {"SRO": graph.sros[SNAPSHOT_FIELDS["SRO"]].copy(),
+                "BOX": graph.boxes[SNAPSHOT_FIELDS["BOX"]].copy(),
+                "CABLE": graph.segments[SNAPSHOT_FIELDS["CABLE"]].copy()}
+    snapshot["BOX"][REACHED_COLUMN] = reached
+    return snapshot
+
+
+def save_snapshot(snapshot: Dict[str, pd.DataFrame]) -> None:
+    """快照写到gpkg目录下（每个图层一个parquet文件）"""
+    try:
+        for layer, frame in snapshot.items():
+            frame.to_parquet(_snapshot_path(layer))
+        print("skip_count快照已保存")
+    except Exception as e:
+        print(f"skip_count快照保存失败：{e}")
+
+
+def load_snapshot() -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    读取上次计算后保存的快照
+    :return: 图层名 -> 快照；不存在或读取失败时返回None
+    """
+    snapshot = {}
+    for layer in SNAPSHOT_FIELDS:
+        path = _snapshot_path(layer)
+        if not os.path.exists(path):
+            return None
+        try:
+            snapshot[layer] = pd.read_parquet(path)
+        except Exception as e:
+            print(f"skip_count快照读取失败：{e}")
+            return None
+    return snapshot
+
+
+def _changed_rows(old: pd.DataFrame, new: pd.DataFrame, fields: List[str]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    比对快照与当前图层（按fid对齐，NaN与NaN视为相同）
+    :return: (快照中有变化/被删除的行, 当前图层中有变化/新增的行)
+    """
+    common = old.index.intersection(new.index)
+    before = old.loc[common, fields]
+    after = new.loc[common, fields]
+    differ = ((before != after) & ~(before.isna() & after.isna())).any(axis=1).to_numpy()
+    changed = common[differ]
+    removed = old.index.difference(new.index)
+    added = new.index.difference(old.index)
+    return old.loc[changed.append(removed)], new.loc[changed.append(added)]
+
+
+def find_seeds(graph: TopoGraph, snapshot: Dict[str, pd.DataFrame]) -> tuple[dict, dict]:
+    """
+    找出自快照以来需要重算的子树起点：
+    - SRO的CODE或skip_count变化：从该SRO重算
+    - 箱体的CODE/cable_in/in_start/skip_count变化、新增或删除：所在SECTION（变化前后）受影响
+    - 线段的SECTION/ORIGINE/origin_box/port_start/skip_count变化、新增或删除：所在SECTION（变化前后）受影响
+    受影响的SECTION按其第一段的port_start与起点当前的skip_count重算，再向下游展开（起点本身在另一棵
+    受影响的子树中时，正确的值会在之后更深的层中到达并覆盖）
+    :return: (起始SRO编码 -> skip_count, 起始SECTION -> skip_count)
+    """
+    sros, boxes, segments = graph.sros, graph.boxes, graph.segments
+    _, changed_sros = _changed_rows(snapshot["SRO"], sros, SNAPSHOT_FIELDS["SRO"])
+    old_boxes, new_boxes = _changed_rows(snapshot["BOX"], boxes, SNAPSHOT_FIELDS["BOX"])
+    old_segments, new_segments = _changed_rows(snapshot["CABLE"], segments, SNAPSHOT_FIELDS["CABLE"])
+    sections = set(old_boxes[BOX_CABLE_IN_FIELD_NAME].dropna().tolist())
+    sections.update(new_boxes[BOX_CABLE_IN_FIELD_NAME].dropna().tolist())
+    sections.update(old_segments[CABLE_SECTION_FIELD_NAME].dropna().tolist())
+    sections.update(new_segments[CABLE_SECTION_FIELD_NAME].dropna().tolist())
+    print(f"自上次计算以来的变化：SRO {len(changed_sros)} 个，箱体 {len(old_boxes) + len(new_boxes)} 行，"
+          f"线段 {len(old_segments) + len(new_segments)} 行，受影响的SECTION {len(sections)} 条")
+
+    sro_skip = dict(zip(sros[BOX_CODE_FIELD_NAME].tolist(), sros[BOX_SKIP_COUNT_FIELD_NAME].tolist()))
+    reached = snapshot["BOX"][REACHED_COLUMN].reindex(boxes.index, fill_value=False).to_numpy(dtype=bool)
+    start_sros = {code: sro_skip[code] for code in changed_sros[BOX_CODE_FIELD_NAME].dropna().tolist()}
+    start_sections = {}
+    heads = segments[(segments[CABLE_ORIGIN_FIELD_NAME] == segments[CABLE_ORIGIN_BOX_FIELD_NAME])
+                     & segments[CABLE_SECTION_FIELD_NAME].isin(sections)]
+    for section, origin, port_start in zip(heads[CABLE_SECTION_FIELD_NAME].tolist(),
+                                           heads[CABLE_ORIGIN_FIELD_NAME].tolist(),
+                                           heads[CABLE_PORT_START_FIELD_NAME].tolist()):
+        if origin in sro_skip:
+            start_sections[section] = port_start + sro_skip[origin] - 1
+            continue
+        box_pos = graph.box_position(origin)
+        # 从SRO不可达的点，全网计算时也不会更新其下游，这里同样跳过
+        if box_pos != NO_POSITION and reached[box_pos]:
+            start_sections[section] = port_start + graph.box(box_pos)[BOX_SKIP_COUNT_FIELD_NAME] - 1
+    return start_sros, start_sections
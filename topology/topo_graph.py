@@ -0,0 +1,303 @@
+"""
+拓扑图：一次性读取SRO、BOX、CABLE图层，构建紧凑的邻接结构，供拓扑图绘制、纤芯分配表与init_data遍历
+- 点 -> 以该点为起点（ORIGINE）的所有线段，按CODE升序
+- 线段 -> 同一SECTION上的下一段（下一段的ORIGINE为本段的EXTREMITE）
+- 线段 -> 终点箱体（EXTREMITE对应的BOX）
+- SECTION -> 在该SECTION上掏芯的箱体（cable_in）
+构建时只对各图层做一次线性遍历（按CODE排序一次），遍历时每一步都是数组/字典的O(1)访问；
+结构中保存的是行位置，需要字段值时再按位置取行
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from constraints.field_name_mapper import BOX_CODE_FIELD_NAME, BOX_CABLE_IN_FIELD_NAME, CABLE_CODE_FIELD_NAME, \
+    CABLE_SECTION_FIELD_NAME, CABLE_ORIGIN_FIELD_NAME, CABLE_EXTREMITY_FIELD_NAME, CABLE_ORIGIN_BOX_FIELD_NAME, \
+    CABLE_LEVEL_FIELD_NAME
+from data_service import data_service_sro, data_service_box, data_service_cable
+from topology.section_chain import SectionChains
+
+NO_POSITION = -1  # 数组中表示“不存在”的行位置
+_EMPTY = np.empty(0, dtype=np.intp)
+
+
+class TopoGraph:
+    """拓扑邻接结构（行位置均指向构建时的sros/boxes/segments）"""
+    sros: pd.DataFrame  # SRO节点，按CODE升序
+    boxes: pd.DataFrame  # BOX图层全部要素（图层原有顺序）
+    segments: pd.DataFrame  # CABLE图层全部线段（图层原有顺序）
+    next_segment: np.ndarray  # 线段位置 -> 同一SECTION上下一段的位置（NO_POSITION表示线缆结束）
+    extremity_box: np.ndarray  # 线段位置 -> 终点箱体位置（NO_POSITION表示箱体不存在）
+    chains: SectionChains  # 每条SECTION按顺序排好的线段链与箱体链
+    # 构建时一次算好的节点聚合值，描绘时直接读取，不再逐个去图层计数
+    sub_segment_count: Dict[object, int]  # 点编码 -> origin_box为该点的线段数
+    section_segment_count: Dict[object, int]  # SECTION -> 线段数
+    child_section_count: Dict[object, int]  # 点编码 -> 从该点分离出去的SECTION数
+    subtree_box_count: Dict[object, int]  # 点编码 -> 下游（子孙）箱体数
+    has_next_segment: np.ndarray  # 线段位置 -> 同一SECTION上是否还有下一段
+    box_root: np.ndarray  # 箱体位置 -> 最上游的点编码（SRO下游的箱体即该SRO）
+    segment_root: np.ndarray  # 线段位置 -> 所在SECTION的起点的最上游点编码（SECTION没有第一段时为None）
+    cyclic_nodes: List[object]  # 上级点关系成环、没有最上游点的点编码（box_root/segment_root为None）
+
+    def __init__(self, sros: pd.DataFrame, boxes: pd.DataFrame, segments: pd.DataFrame):
+        self.sros = sros
+        self.boxes = boxes
+        self.segments = segments
+        self._box_rows: Dict[int, pd.Series] = {}
+        self._segment_rows: Dict[int, pd.Series] = {}
+        self._segment_by_fid: Dict[object, int] = {fid: pos for pos, fid in enumerate(segments.index.tolist())}
+
+        sections = segments[CABLE_SECTION_FIELD_NAME].tolist()
+        origins = segments[CABLE_ORIGIN_FIELD_NAME].tolist()
+        extremities = segments[CABLE_EXTREMITY_FIELD_NAME].tolist()
+        origin_boxes = segments[CABLE_ORIGIN_BOX_FIELD_NAME].tolist()
+        self._sections = np.array(sections, dtype=object)
+
+        # (SECTION, ORIGINE) -> 第一条线段（与按复合索引取下一段的结果一致）
+        self._segment_by_section_origin: Dict[tuple, int] = {}
+        for pos, key in enumerate(zip(sections, origins)):
+            self._segment_by_section_origin.setdefault(key, pos)
+        self.next_segment = np.array(
+            [self._segment_by_section_origin.get(key, NO_POSITION) for key in zip(sections, extremities)],
+            dtype=np.intp)
+
+        # 箱体编码 -> 第一个箱体位置；线段 -> 终点箱体
+        self._box_by_code: Dict[object, int] = {}
+        for pos, code in enumerate(boxes[BOX_CODE_FIELD_NAME].tolist()):
+            self._box_by_code.setdefault(code, pos)
+        self.extremity_box = np.array([self._box_by_code.get(code, NO_POSITION) for code in extremities],
+                                      dtype=np.intp)
+
+        # SECTION -> 按顺序排好的线段链与箱体链（断链、分叉、成环记录在chains.problems中）
+        self.chains = SectionChains(self._sections,
+                                    np.array([o == b for o, b in zip(origins, origin_boxes)], dtype=bool),
+                                    self.next_segment, self.extremity_box)
+
+        # 点 -> 以该点为起点的线段（按CODE升序，同CODE保持图层顺序）
+        outgoing: Dict[object, List[int]] = {}
+        code_order = segments[CABLE_CODE_FIELD_NAME].reset_index(drop=True).sort_values(
+            kind="stable", na_position="last").index
+        for pos in code_order.tolist():
+            outgoing.setdefault(origins[pos], []).append(pos)
+        self._outgoing = {code: np.array(positions, dtype=np.intp) for code, positions in outgoing.items()}
+
+        # 点 -> 从该点分离出去的各SECTION的第一段（origin_box与ORIGINE均为该点，图层顺序）
+        heads: Dict[object, List[int]] = {}
+        for pos, (origin, origin_box) in enumerate(zip(origins, origin_boxes)):
+            if origin == origin_box:
+                heads.setdefault(origin, []).append(pos)
+        self._section_heads = {code: np.array(positions, dtype=np.intp) for code, positions in heads.items()}
+
+        # SECTION -> 在该SECTION上掏芯的箱体（图层顺序）
+        boxes_on_section: Dict[object, List[int]] = {}
+        for pos, section in enumerate(boxes[BOX_CABLE_IN_FIELD_NAME].tolist()):
+            boxes_on_section.setdefault(section, []).append(pos)
+        self._boxes_on_section = {section: np.array(positions, dtype=np.intp)
+                                  for section, positions in boxes_on_section.items()}
+
+        self._build_aggregates(sections)
+
+        print(f"拓扑图构建完成：SRO {len(sros)} 个，BOX {len(boxes)} 个，线段 {len(segments)} 条")
+
+    def _build_aggregates(self, sections: list) -> None:
+        """按点、按SECTION分组计数，自底向上累加每个点的下游箱体数，并自顶向下求每个箱体、线段的最上游点"""
+        segments = self.segments
+        self.sub_segment_count = segments.groupby(CABLE_ORIGIN_BOX_FIELD_NAME, sort=False).size().to_dict()
+        self.section_segment_count = segments.groupby(CABLE_SECTION_FIELD_NAME, sort=False).size().to_dict()
+        self.child_section_count = {code: len(positions) for code, positions in self._section_heads.items()}
+        self.has_next_segment = self.next_segment != NO_POSITION
+
+        # 箱体的上级点：所在SECTION第一段的起点
+        section_origin: Dict[object, object] = {}
+        for code, positions in self._section_heads.items():
+            for pos in positions.tolist():
+                section_origin.setdefault(sections[pos], code)
+        box_codes = self.boxes[BOX_CODE_FIELD_NAME].to_numpy(dtype=object)
+        parent_codes = np.array([section_origin.get(section)
+                                 for section in self.boxes[BOX_CABLE_IN_FIELD_NAME].tolist()], dtype=object)
+        # SECTION起点也作为节点（没有箱体掏芯的SECTION，其起点也要有最上游点）
+        origin_codes = np.array(list(section_origin.values()), dtype=object)
+        node_ids, nodes = pd.factorize(np.concatenate([box_codes, parent_codes, origin_codes]))
+        box_node, parent_node = node_ids[:len(box_codes)], node_ids[len(box_codes):len(box_codes) * 2]
+        linked = (box_node >= 0) & (parent_node >= 0) & (box_node != parent_node)
+        parent = np.full(len(nodes), NO_POSITION, dtype=np.intp)
+        parent[box_node[linked]] = parent_node[linked]
+
+        # 从没有上级点的节点出发逐层向下（每个节点只访问一次）；成环（或挂在环下）的节点永远到达不了
+        has_parent = parent != NO_POSITION
+        levels = _levels_from_roots(parent, has_parent)
+        cyclic = np.ones(len(nodes), dtype=bool)
+        for level_nodes in levels:
+            cyclic[level_nodes] = False
+        self.cyclic_nodes = np.asarray(nodes, dtype=object)[cyclic].tolist()
+        if self.cyclic_nodes:
+            print(f"拓扑成环，{len(self.cyclic_nodes)} 个点没有最上游点，不参与下游箱体计数：{self.cyclic_nodes[:10]}")
+
+        # 从最深一层向上累加
+        subtree = np.zeros(len(nodes), dtype=np.int64)
+        for children in reversed(levels[1:]):
+            np.add.at(subtree, parent[children], subtree[children] + 1)
+        self.subtree_box_count = dict(zip(nodes.tolist(), subtree.tolist()))
+
+        # 从最浅一层向下传递最上游点：子节点的最上游点即其上级点的最上游点（成环的点没有最上游点）
+        root = np.arange(len(nodes), dtype=np.intp)
+        root[cyclic] = NO_POSITION
+        for children in levels[1:]:
+            root[children] = root[parent[children]]
+        root_codes = _take_codes(np.asarray(nodes, dtype=object), root)
+        self.box_root = _take_codes(root_codes, box_node)
+        origin_node = pd.Index(nodes, dtype=object).get_indexer(
+            pd.Index([section_origin.get(section) for section in sections], dtype=object))
+        self.segment_root = _take_codes(root_codes, origin_node)
+
+    # --------------------------
+    # 按位置取行
+    # --------------------------
+    def box(self, pos: int) -> pd.Series:
+        """按位置取箱体行（同一位置只构造一次）"""
+        row = self._box_rows.get(pos)
+        if row is None:
+            row = self._box_rows[pos] = self.boxes.iloc[pos]
+        return row
+
+    def segment(self, pos: int) -> pd.Series:
+        """按位置取线段行（同一位置只构造一次）"""
+        row = self._segment_rows.get(pos)
+        if row is None:
+            row = self._segment_rows[pos] = self.segments.iloc[pos]
+        return row
+
+    def segment_position(self, segment: Optional[pd.Series]) -> int:
+        """线段行（由segments取出，name为fid）-> 线段位置（NO_POSITION表示不存在）"""
+        if segment is None or segment.empty:
+            return NO_POSITION
+        return self._segment_by_fid.get(segment.name, NO_POSITION)
+
+    def box_position(self, box_code) -> int:
+        """箱体编码 -> 箱体位置（NO_POSITION表示不存在）"""
+        return self._box_by_code.get(box_code, NO_POSITION)
+
+    # --------------------------
+    # 邻接查询
+    # --------------------------
+    def sub_segments(self, box_code, upper_section) -> np.ndarray:
+        """
+        以该点为起点、且不在上级SECTION上的所有线段（即从该点分出去的子线缆的第一段），按CODE升序
+        :param box_code: 点编码
+        :param upper_section: 该点所在的上级SECTION（SRO传"N/A"）
+        :return: 线段位置数组
+        """
+        positions = self._outgoing.get(box_code, _EMPTY)
+        if len(positions) == 0:
+            return positions
+        return positions[self._sections[positions] != upper_section]
+
+    def next_segment_from(self, section, box_code) -> int:
+        """同一SECTION上以该点为起点的线段位置（NO_POSITION表示不存在）"""
+        return self._segment_by_section_origin.get((section, box_code), NO_POSITION)
+
+    def section_heads_from_point(self, box_code) -> np.ndarray:
+        """从该点分离出去的所有SECTION的第一段（origin_box与ORIGINE均为该点）"""
+        return self._section_heads.get(box_code, _EMPTY)
+
+    def boxes_on_section(self, section) -> np.ndarray:
+        """在该SECTION上掏芯的所有箱体位置（图层顺序）"""
+        return self._boxes_on_section.get(section, _EMPTY)
+
+    def boxes_along(self, segment_pos: int) -> np.ndarray:
+        """
+        从某一段开始沿SECTION向后，依次经过的各段终点箱体（取自预先排好的SECTION链），遇到终点箱体不存在时截止
+        :param segment_pos: 起始线段位置
+        :return: 箱体位置数组
+        """
+        return self.chains.boxes_from(segment_pos)
+
+    def sorted_boxes(self, positions: np.ndarray, sort_by: List[str]) -> np.ndarray:
+        """按字段对箱体位置排序（排序方式与图层查询的sort_by一致）"""
+        return _sort_positions(self.boxes, positions, sort_by)
+
+    def first_segments_on_level(self, level: int, sort_by: List[str]) -> np.ndarray:
+        """
+        指定level的所有SECTION的第一段（ORIGINE == origin_box），排序方式与图层查询的sort_by一致
+        :param level: 线缆等级（1/2/3）
+        :param sort_by: 排序字段列表
+        :return: 线段位置数组
+        """
+        segments = self.segments
+        mask = (segments[CABLE_LEVEL_FIELD_NAME] == level) & (
+                segments[CABLE_ORIGIN_FIELD_NAME] == segments[CABLE_ORIGIN_BOX_FIELD_NAME])
+        positions = np.flatnonzero(mask.to_numpy(dtype=bool, na_value=False))
+        return _sort_positions(segments, positions, sort_by)
+
+
+def _levels_from_roots(parent: np.ndarray, has_parent: np.ndarray) -> List[np.ndarray]:
+    """
+    按层列出从根（没有上级点的节点）可达的节点：第0层为根，第k层为第k-1层节点的子节点
+    :param parent: 节点 -> 上级节点（NO_POSITION表示没有）
+    :param has_parent: 节点是否有上级节点
+    :return: 各层的节点数组（成环的节点不在任何一层中）
+    """
+    child_nodes = np.flatnonzero(has_parent)
+    child_parents = parent[child_nodes]
+    order = np.argsort(child_parents, kind="stable")
+    children = child_nodes[order]
+    counts = np.bincount(child_parents, minlength=len(parent))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    levels = []
+    frontier = np.flatnonzero(~has_parent)
+    while len(frontier):
+        levels.append(frontier)
+        frontier_counts = counts[frontier]
+        total = int(frontier_counts.sum())
+        # 各节点的子节点在children中是连续的一段：[offsets[node], offsets[node] + counts[node])
+        starts = np.repeat(offsets[frontier] - (np.cumsum(frontier_counts) - frontier_counts), frontier_counts)
+        frontier = children[starts + np.arange(total)]
+    return levels
+
+
+def _take_codes(codes: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """按节点id取编码，id为-1时为None"""
+    result = np.full(len(ids), None, dtype=object)
+    valid = ids >= 0
+    result[valid] = codes[ids[valid]]
+    return result
+
+
+def _sort_positions(frame: pd.DataFrame, positions: np.ndarray, sort_by: List[str]) -> np.ndarray:
+    """对frame中的若干行位置按字段排序，返回排序后的行位置"""
+    if len(positions) == 0:
+        return positions
+    ordered = frame.iloc[positions][sort_by].reset_index(drop=True).sort_values(by=sort_by, na_position="last")
+    return positions[ordered.index.to_numpy()]
+
+
+_graph: Optional[TopoGraph] = None
+_graph_generations: Optional[tuple] = None
+
+
+def load_graph() -> TopoGraph:
+    """
+    获取拓扑图：三个图层自上次构建以来都没有变化时直接复用，否则重新构建
+    :return: 拓扑图
+    """
+    global _graph, _graph_generations
+    generations = (data_service_sro.get_generation(), data_service_box.get_generation(),
+                   data_service_cable.get_generation())
+    if _graph is None or generations != _graph_generations:
+        _graph = build_graph()
+        # 构建过程本身可能触发图层加载，以构建后的版本号为准
+        _graph_generations = (data_service_sro.get_generation(), data_service_box.get_generation(),
+                              data_service_cable.get_generation())
+    return _graph
+
+
+def build_graph() -> TopoGraph:
+    """读取SRO、BOX、CABLE图层，构建拓扑图"""
+    sros = data_service_sro.get_all_sro_order_by_code_asc()
+    boxes = data_service_box.get_all_boxs()
+    segments = data_service_cable.get_all_segments()
+    if sros is None or boxes is None or segments is None:
+        raise Exception("图层加载失败，无法构建拓扑图")
+    return TopoGraph(sros, boxes, segments)
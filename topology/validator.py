@@ -0,0 +1,203 @@
+"""
+拓扑数据完整性校验：在拓扑图与已加载的图层上用集合/数组运算一次性检查，不逐条追踪
+- 编码重复（SRO、BOX、CABLE）
+- SECTION链断开、分叉、成环（取自拓扑图的SECTION链）
+- 箱体的cable_in指向不存在的SECTION
+- d3线段的终点箱体不存在（纤芯分配表填充d3线缆时需要终点箱体的in_start/in_end）
+- 箱体的in_start/in_end为空、顺序颠倒或超出所在线缆的容量（CAPACITE）
+- 同一SECTION上箱体的[in_start, in_end]重叠、同一起点分出的SECTION的[port_start, port_end]重叠，以及空闲纤芯
+致命错误会导致生成中途失败或陷入死循环，生成前校验到致命错误时拒绝开始
+"""
+import json
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from constraints.field_name_mapper import BOX_CODE_FIELD_NAME, BOX_CABLE_IN_FIELD_NAME, BOX_IN_START_FIELD_NAME, \
+    BOX_IN_END_FIELD_NAME, CABLE_CODE_FIELD_NAME, CABLE_SECTION_FIELD_NAME, CABLE_LEVEL_FIELD_NAME, \
+    CABLE_ORIGIN_FIELD_NAME, CABLE_ORIGIN_BOX_FIELD_NAME
+from topology import fiber_ranges
+from topology.section_chain import CHAIN_CYCLIC
+from topology.topo_graph import TopoGraph, NO_POSITION
+
+SEVERITY_FATAL = "fatal"  # 生成会失败或不会结束
+SEVERITY_WARNING = "warning"  # 生成能完成，但结果可能不完整或不正确
+SEVERITY_INFO = "info"  # 仅供参考（如空闲纤芯）
+
+REPORT_SAMPLE_SIZE = 10  # 控制台每项问题最多打印的编码数（报告文件中记录全部）
+
+
+def _issue(check: str, severity: str, layer: str, message: str, codes, details=None) -> dict:
+    issue = {"check": check, "severity": severity, "layer": layer, "message": message,
+             "count": len(codes), "codes": [_json_value(code) for code in codes]}
+    if details is not None:
+        issue["details"] = details
+    return issue
+
+
+def _json_value(value):
+    """numpy标量与缺失值转换为JSON可表示的值"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def check_duplicate_codes(graph: TopoGraph) -> List[dict]:
+    """SRO、BOX、CABLE各图层内的编码重复；SRO与BOX编码相同"""
+    issues = []
+    for layer, frame, field, severity in (("SRO", graph.sros, BOX_CODE_FIELD_NAME, SEVERITY_FATAL),
+                                          ("BOX", graph.boxes, BOX_CODE_FIELD_NAME, SEVERITY_FATAL),
+                                          ("CABLE", graph.segments, CABLE_CODE_FIELD_NAME, SEVERITY_WARNING)):
+        codes = frame[field].dropna()
+        duplicated = codes[codes.duplicated()].unique().tolist()
+        if duplicated:
+            issues.append(_issue("duplicate_code", severity, layer, f"{layer}图层编码重复", duplicated))
+    shared = np.intersect1d(graph.sros[BOX_CODE_FIELD_NAME].dropna().to_numpy(dtype=object),
+                            graph.boxes[BOX_CODE_FIELD_NAME].dropna().to_numpy(dtype=object)).tolist()
+    if shared:
+        issues.append(_issue("duplicate_code", SEVERITY_WARNING, "BOX", "BOX编码与SRO编码相同", shared))
+    return issues
+
+
+def check_section_chains(graph: TopoGraph) -> List[dict]:
+    """SECTION链断开、分叉（按SECTION汇总），成环为致命错误"""
+    issues = []
+    for kind in sorted({problem["kind"] for problem in graph.chains.problems}):
+        sections = [problem["section"] for problem in graph.chains.problems if problem["kind"] == kind]
+        severity = SEVERITY_FATAL if kind == CHAIN_CYCLIC else SEVERITY_WARNING
+        issues.append(_issue(f"section_chain_{kind}", severity, "CABLE", f"SECTION链异常：{kind}", sections))
+    return issues
+
+
+def check_box_cable_in(graph: TopoGraph) -> List[dict]:
+    """箱体的cable_in不为空，但没有任何线段属于该SECTION"""
+    boxes = graph.boxes
+    cable_in = boxes[BOX_CABLE_IN_FIELD_NAME]
+    orphan = cable_in.notna() & ~cable_in.isin(graph.segments[CABLE_SECTION_FIELD_NAME].dropna().unique())
+    codes = boxes.loc[orphan.to_numpy(dtype=bool), BOX_CODE_FIELD_NAME].tolist()
+    if not codes:
+        return []
+    return [_issue("box_cable_in_missing", SEVERITY_WARNING, "BOX", "箱体的cable_in指向不存在的SECTION", codes)]
+
+
+def check_section_heads(graph: TopoGraph) -> List[dict]:
+    """SECTION没有第一段（ORIGINE == origin_box），从起点无法到达该SECTION"""
+    segments = graph.segments
+    sections = segments[CABLE_SECTION_FIELD_NAME]
+    is_head = (segments[CABLE_ORIGIN_FIELD_NAME] == segments[CABLE_ORIGIN_BOX_FIELD_NAME]).to_numpy(dtype=bool,
+                                                                                                     na_value=False)
+    headless = np.setdiff1d(sections.dropna().unique().astype(object),
+                            sections[is_head].dropna().unique().astype(object)).tolist()
+    if not headless:
+        return []
+    return [_issue("section_head_missing", SEVERITY_WARNING, "CABLE", "SECTION没有以origin_box为起点的第一段",
+                   headless)]
+
+
+def check_d3_extremities(graph: TopoGraph) -> List[dict]:
+    """d3线段的终点箱体不存在（填充d3线缆时需要终点箱体的纤芯范围）"""
+    segments = graph.segments
+    is_d3 = (segments[CABLE_LEVEL_FIELD_NAME] == 3).to_numpy(dtype=bool, na_value=False)
+    missing = is_d3 & (graph.extremity_box == NO_POSITION)
+    codes = segments.loc[missing, CABLE_CODE_FIELD_NAME].tolist()
+    if not codes:
+        return []
+    return [_issue("d3_extremity_missing", SEVERITY_FATAL, "CABLE", "d3线段的终点箱体（EXTREMITE）不存在", codes)]
+
+
+def check_fiber_ranges(graph: TopoGraph) -> List[dict]:
+    """箱体纤芯范围：in_start/in_end为空为致命错误；顺序颠倒、小于1或超出所在线缆容量为警告"""
+    boxes = graph.boxes
+    issues = []
+    in_start = pd.to_numeric(boxes[BOX_IN_START_FIELD_NAME], errors="coerce")
+    in_end = pd.to_numeric(boxes[BOX_IN_END_FIELD_NAME], errors="coerce")
+    on_section = boxes[BOX_CABLE_IN_FIELD_NAME].notna()
+    empty = (on_section & (in_start.isna() | in_end.isna())).to_numpy(dtype=bool)
+    if empty.any():
+        issues.append(_issue("fiber_range_empty", SEVERITY_FATAL, "BOX", "箱体的in_start/in_end为空",
+                             boxes.loc[empty, BOX_CODE_FIELD_NAME].tolist()))
+
+    # 线缆容量取SECTION第一条线段的CAPACITE
+    capacity = boxes[BOX_CABLE_IN_FIELD_NAME].map(pd.Series(fiber_ranges.section_capacities(graph), dtype=float))
+    invalid = ((in_start < 1) | (in_end < in_start)).to_numpy(dtype=bool, na_value=False)
+    if invalid.any():
+        issues.append(_issue("fiber_range_invalid", SEVERITY_WARNING, "BOX", "箱体的in_start小于1或大于in_end",
+                             boxes.loc[invalid, BOX_CODE_FIELD_NAME].tolist()))
+    overflow = (in_end > capacity).to_numpy(dtype=bool, na_value=False)
+    if overflow.any():
+        issues.append(_issue("fiber_range_over_capacity", SEVERITY_WARNING, "BOX",
+                             "箱体的in_end超出所在线缆的容量（CAPACITE）",
+                             boxes.loc[overflow, BOX_CODE_FIELD_NAME].tolist()))
+    return issues
+
+
+def check_fiber_overlaps(graph: TopoGraph) -> List[dict]:
+    """同一SECTION上箱体纤芯范围重叠、同一起点分出的SECTION端口范围重叠（写纤芯分配表时会互相覆盖）"""
+    issues = []
+    for check, layer, index, message in (
+            ("fiber_range_overlap", "BOX", fiber_ranges.section_ranges(graph), "同一SECTION上箱体的纤芯范围重叠"),
+            ("port_range_overlap", "CABLE", fiber_ranges.port_ranges(graph), "同一起点分出的SECTION端口范围重叠")):
+        overlaps = index.overlaps()
+        if overlaps:
+            details = [{"group": _json_value(group), "first": _json_value(first), "second": _json_value(second)}
+                       for group, first, second in overlaps]
+            issues.append(_issue(check, SEVERITY_WARNING, layer, message,
+                                 [second for _, _, second in overlaps], details))
+    return issues
+
+
+def check_fiber_gaps(graph: TopoGraph) -> List[dict]:
+    """空闲纤芯：SECTION上未分配给箱体的纤芯、起点上未分出的端口"""
+    issues = []
+    for check, layer, index, capacities, message in (
+            ("fiber_range_free", "BOX", fiber_ranges.section_ranges(graph), fiber_ranges.section_capacities(graph),
+             "SECTION上有未分配的纤芯"),
+            ("port_range_free", "CABLE", fiber_ranges.port_ranges(graph), fiber_ranges.origin_capacities(graph),
+             "起点上有未分出的端口")):
+        free = fiber_ranges.free_ranges(index, capacities)
+        if free:
+            details = [{"group": _json_value(group), "free": [list(gap) for gap in gaps]}
+                       for group, gaps in free.items()]
+            issues.append(_issue(check, SEVERITY_INFO, layer, message, list(free.keys()), details))
+    return issues
+
+
+CHECKS = [check_duplicate_codes, check_section_chains, check_section_heads, check_box_cable_in,
+          check_d3_extremities, check_fiber_ranges, check_fiber_overlaps, check_fiber_gaps]
+
+
+def validate(graph: TopoGraph) -> dict:
+    """
+    执行全部校验
+    :param graph: 拓扑图
+    :return: 校验报告 {"summary": {...}, "issues": [...]}
+    """
+    issues = []
+    for check in CHECKS:
+        issues.extend(check(graph))
+    summary = {
+        "sro": len(graph.sros), "box": len(graph.boxes), "segment": len(graph.segments),
+        SEVERITY_FATAL: sum(issue["count"] for issue in issues if issue["severity"] == SEVERITY_FATAL),
+        SEVERITY_WARNING: sum(issue["count"] for issue in issues if issue["severity"] == SEVERITY_WARNING),
+        SEVERITY_INFO: sum(issue["count"] for issue in issues if issue["severity"] == SEVERITY_INFO),
+    }
+    for issue in issues:
+        sample = ", ".join(str(code) for code in issue["codes"][:REPORT_SAMPLE_SIZE])
+        more = " ..." if issue["count"] > REPORT_SAMPLE_SIZE else ""
+        print(f"[{issue['severity']}] {issue['message']}：{issue['count']} 个（{sample}{more}）")
+    print(f"拓扑数据校验完成：致命错误 {summary[SEVERITY_FATAL]} 个，警告 {summary[SEVERITY_WARNING]} 个，"
+          f"提示 {summary[SEVERITY_INFO]} 个")
+    return {"summary": summary, "issues": issues}
+
+
+def has_fatal(report: dict) -> bool:
+    """报告中是否有致命错误"""
+    return report["summary"][SEVERITY_FATAL] > 0
+
+
+def write_report(report: dict, report_path: str) -> None:
+    """校验报告写为JSON文件"""
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"校验报告已生成：{report_path}")
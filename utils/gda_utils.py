@@ -1,11 +1,24 @@
+import importlib.util
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager, closing
+from datetime import date, datetime
+
 import geopandas as gpd
-from typing import Optional, Dict, Callable, List
+import pyogrio
+from typing import Optional, Dict, Callable, List, Union, Hashable
 
 import numpy as np
+import shapely
 from geopandas import GeoDataFrame
 from shapely.geometry import base
 import pandas as pd
 
+from utils.query_expr import Expr, compile_plan, execute_plan, from_attribute
+
+# 哈希索引的键：单个字段名，或复合索引的字段名元组
+IndexKey = Union[str, tuple[str, ...]]
+
 
 class LayerDGA:
     """按图层标识创建单例的GeoPackage图层操作类"""
@@ -13,6 +26,19 @@ class LayerDGA:
     gpkg_path: str
     layer_name: str
     _gdf: Optional[gpd.GeoDataFrame]
+    _indexes: Dict[IndexKey, Optional[Dict[object, np.ndarray]]]  # {索引字段: {字段值: 行位置数组}}，None表示待重建
+    _attribute_columns: Optional[List[str]]  # 仅属性加载模式下读取的字段，None表示完整加载
+    _geometry_loaded: bool  # 缓存中是否已包含几何及全部字段
+    _batch_depth: int  # 批量写入的嵌套层数，大于0时save_changes只登记不写文件
+    _pending_save: bool  # 批量写入期间是否有待同步的修改
+    _pending_full_rewrite: bool  # 待同步的保存中是否有要求整层重写的（如直接修改过gdf）
+    _pending_overwrite: bool  # 待同步的保存最后一次要求的覆盖方式
+    _fid_column: str  # 图层在GeoPackage中的FID字段名（为空时不支持按行增量写回）
+    _dirty_cells: Dict[str, set]  # {字段名: 被修改要素的fid集合}，保存时只写回这些单元格
+    _structure_dirty: bool  # 是否增删过要素（需要整层重写）
+    _generation: int  # 数据版本号：加载、补齐几何及任何增删改都会递增，查询缓存据此失效
+    _query_cache: "OrderedDict[tuple, tuple[int, object]]"  # {查询描述: (版本号, 查询结果)}，按LRU淘汰
+    query_cache_size: int = 512  # 查询缓存的最大条目数，0表示不缓存
 
     def __new__(cls, gpkg_path: str, layer_name: str):
         """
@@ -29,18 +55,93 @@ class LayerDGA:
             cls._instances[instance_key].gpkg_path = gpkg_path
             cls._instances[instance_key].layer_name = layer_name
             cls._instances[instance_key]._gdf = None  # 缓存当前图层的GeoDataFrame
-            # 加载图层数据
-            cls._instances[instance_key]._load_layer()
+            cls._instances[instance_key]._indexes = {}  # 已声明的哈希索引
+            cls._instances[instance_key]._attribute_columns = None
+            cls._instances[instance_key]._geometry_loaded = False
+            cls._instances[instance_key]._batch_depth = 0
+            cls._instances[instance_key]._pending_save = False
+            cls._instances[instance_key]._pending_full_rewrite = False
+            cls._instances[instance_key]._pending_overwrite = True
+            cls._instances[instance_key]._fid_column = ""
+            cls._instances[instance_key]._dirty_cells = {}
+            cls._instances[instance_key]._structure_dirty = False
+            cls._instances[instance_key]._generation = 0
+            cls._instances[instance_key]._query_cache = OrderedDict()
+            # 延迟加载：创建实例时不读取文件，首次访问gdf时才加载图层数据
         return cls._instances[instance_key]
 
+    def set_attribute_only(self, columns: Optional[List[str]]) -> None:
+        """
+        设置仅属性加载模式：只读取指定字段、不读取几何（有pyarrow时走Arrow读取路径），
+        调用空间方法或保存时再按需补齐几何与其余字段；需在首次访问gdf前调用
+        :param columns: 需要读取的字段（图层中不存在的字段会被忽略），None表示恢复完整加载
+        """
+        self._attribute_columns = list(columns) if columns is not None else None
+        if self._gdf is not None:
+            print(f"图层已加载，加载模式将在下次刷新时生效：{self.layer_name}@{self.gpkg_path}")
+
     def _load_layer(self):
         """加载当前图层数据到缓存"""
         try:
-            self._gdf = gpd.read_file(self.gpkg_path, layer=self.layer_name)
+            layer_info = pyogrio.read_info(self.gpkg_path, layer=self.layer_name)
+            self._fid_column = layer_info["fid_column"]
+            if self._attribute_columns is None:
+                # 以fid为索引：保存时按fid增量写回，整层重写时fid保持不变
+                self._gdf = gpd.read_file(self.gpkg_path, layer=self.layer_name, fid_as_index=True)
+                self._geometry_loaded = True
+            else:
+                self._gdf = self._read_attributes(layer_info["fields"])
+                self._geometry_loaded = False
             print(f"图层加载成功：{self.layer_name}@{self.gpkg_path}，要素数：{len(self._gdf)}")
         except Exception as e:
             print(f"图层加载失败：{self.layer_name}@{self.gpkg_path}，错误：{str(e)}")
             self._gdf = None
+        self._dirty_cells = {}
+        self._structure_dirty = False
+        self._invalidate_indexes()
+        self._bump_generation()
+
+    def _read_attributes(self, layer_fields) -> pd.DataFrame:
+        """仅读取属性字段（不含几何），以fid为索引，便于之后按fid补齐几何"""
+        columns = [f for f in self._attribute_columns if f in layer_fields]
+        return pyogrio.read_dataframe(
+            self.gpkg_path,
+            layer=self.layer_name,
+            columns=columns,
+            read_geometry=False,
+            fid_as_index=True,
+            use_arrow=importlib.util.find_spec("pyarrow") is not None
+        )
+
+    def _ensure_geometry(self) -> bool:
+        """
+        仅属性加载模式下，按fid补齐几何与未读取的字段，得到完整的GeoDataFrame
+        （已修改的字段值、已删除的要素以缓存为准，行顺序不变，索引无需重建）
+        :return: 缓存中已包含几何时返回True
+        """
+        if self.gdf is None:
+            return False
+        if self._geometry_loaded:
+            return True
+        try:
+            layer_fields = list(pyogrio.read_info(self.gpkg_path, layer=self.layer_name)["fields"])
+            rest_columns = [f for f in layer_fields if f not in self._gdf.columns]
+            rest_gdf = gpd.read_file(self.gpkg_path, layer=self.layer_name, columns=rest_columns, fid_as_index=True)
+        except Exception as e:
+            print(f"几何加载失败：{self.layer_name}@{self.gpkg_path}，错误：{str(e)}")
+            return False
+        full_gdf = rest_gdf.loc[self._gdf.index]
+        for column in self._gdf.columns:
+            full_gdf[column] = self._gdf[column]
+        # 恢复图层原有的字段顺序
+        ordered_columns = [f for f in layer_fields if f in full_gdf.columns]
+        ordered_columns += [f for f in full_gdf.columns if f not in ordered_columns]
+        self._gdf = full_gdf[ordered_columns]
+        self._geometry_loaded = True
+        # 缓存的查询结果不含几何，需重新查询
+        self._bump_generation()
+        print(f"已补齐几何：{self.layer_name}@{self.gpkg_path}，要素数：{len(self._gdf)}")
+        return True
 
     @property
     def gdf(self) -> Optional[gpd.GeoDataFrame]:
@@ -49,6 +150,175 @@ class LayerDGA:
             self._load_layer()
         return self._gdf
 
+    @property
+    def is_loaded(self) -> bool:
+        """图层数据是否已加载到缓存"""
+        return self._gdf is not None
+
+    def warm_up(self) -> bool:
+        """
+        预热：立即加载图层数据并构建所有已声明的索引（批量任务开始前调用，避免首次查询时才读取文件）
+        :return: 加载成功返回True
+        """
+        if self.gdf is None:
+            return False
+        for key in self._indexes:
+            self._get_index(key)
+        return True
+
+    @classmethod
+    def warm_up_all(cls) -> bool:
+        """
+        预热所有已创建的图层实例
+        :return: 全部加载成功返回True
+        """
+        results = [instance.warm_up() for instance in cls._instances.values()]
+        return all(results)
+
+    # --------------------------
+    # 哈希索引：字段值 -> 行位置
+    # --------------------------
+    @property
+    def generation(self) -> int:
+        """当前数据版本号（每次变更递增），可用于判断基于本图层构建的派生结果是否过期"""
+        return self._generation
+
+    def _bump_generation(self) -> None:
+        """数据发生变更：版本号递增，旧版本的查询缓存全部失效"""
+        self._generation += 1
+        self._query_cache.clear()
+
+    def _cached_query(self, key: Optional[tuple], compute: Callable[[], object], copy: bool = True):
+        """
+        按查询描述缓存查询结果（同一版本内相同描述的查询只计算一次，超出容量时淘汰最久未用的条目）
+        :param key: 查询描述（需可哈希；None或不可哈希时不缓存）
+        :param compute: 未命中时执行的查询
+        :param copy: 结果为DataFrame时是否返回独立副本；False时返回与缓存共享列数据的浅拷贝，只能读取：
+            原地修改（如result.loc[...] = ...）会改动缓存中的结果，本版本内之后的相同查询都会读到修改后的值
+        :return: 查询结果
+        """
+        try:
+            hash(key)
+        except TypeError:
+            key = None
+        if key is None or self.query_cache_size <= 0:
+            return compute()
+        entry = self._query_cache.get(key)
+        if entry is not None and entry[0] == self._generation:
+            self._query_cache.move_to_end(key)
+            result = entry[1]
+        else:
+            generation = self._generation
+            result = compute()
+            if generation == self._generation and result is not None:
+                self._query_cache[key] = (generation, result)
+                if len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        if isinstance(result, pd.DataFrame):
+            return result.copy(deep=copy)
+        return result
+
+    def clear_query_cache(self) -> None:
+        """清空查询缓存（不影响数据版本号）"""
+        self._query_cache.clear()
+
+    def create_index(self, fields: IndexKey) -> None:
+        """
+        声明哈希索引（字段值 -> 行位置数组），等值查询时直接命中，无需扫描全表
+        索引在首次使用时构建，update_attributes/add_features/delete_features/refresh后自动重建或修补
+        :param fields: 索引字段名；传入字段元组时建立复合索引（如：("SECTION", "ORIGINE")），键为值元组
+        """
+        if fields not in self._indexes:
+            self._indexes[fields] = None
+
+    def has_index(self, fields: IndexKey) -> bool:
+        """字段（或字段元组）是否已声明哈希索引"""
+        return fields in self._indexes
+
+    @staticmethod
+    def _index_fields(fields: IndexKey) -> tuple[str, ...]:
+        """索引键对应的字段元组"""
+        return fields if isinstance(fields, tuple) else (fields,)
+
+    @staticmethod
+    def _group_positions(gdf: gpd.GeoDataFrame, fields: IndexKey) -> Dict[object, np.ndarray]:
+        """按索引字段分组，得到{字段值(复合索引为值元组): 行位置数组}（含空值的行不入索引）"""
+        by = list(fields) if isinstance(fields, tuple) else fields
+        return gdf.groupby(by, sort=False).indices
+
+    def _build_index(self, fields: IndexKey) -> Dict[object, np.ndarray]:
+        """按字段分组构建哈希索引"""
+        if self.gdf is None or any(f not in self.gdf.columns for f in self._index_fields(fields)):
+            index = {}
+        else:
+            index = self._group_positions(self.gdf, fields)
+        self._indexes[fields] = index
+        return index
+
+    def _get_index(self, fields: IndexKey) -> Dict[object, np.ndarray]:
+        """获取哈希索引（待重建时先重建）"""
+        index = self._indexes[fields]
+        if index is None:
+            index = self._build_index(fields)
+        return index
+
+    def _invalidate_indexes(self, fields=None) -> None:
+        """
+        标记索引待重建
+        :param fields: 发生变化的字段（None表示全部索引）；复合索引只要包含其中任一字段即重建
+        """
+        for key in self._indexes:
+            if fields is None or any(f in fields for f in self._index_fields(key)):
+                self._indexes[key] = None
+
+    def _patch_indexes_on_append(self, start_pos: int) -> None:
+        """追加要素后修补已构建的索引：仅对新增行（行位置>=start_pos）分组并合并到原索引"""
+        appended = self._gdf.iloc[start_pos:]
+        for key, index in self._indexes.items():
+            if index is None:
+                continue
+            if any(f not in appended.columns for f in self._index_fields(key)):
+                self._indexes[key] = None
+                continue
+            for value, positions in self._group_positions(appended, key).items():
+                positions = positions + start_pos
+                if value in index:
+                    index[value] = np.concatenate([index[value], positions])
+                else:
+                    index[value] = positions
+
+    def get_positions_by_index(self, fields: IndexKey, value) -> np.ndarray:
+        """
+        通过哈希索引做等值查询
+        :param fields: 已声明索引的字段名（或复合索引的字段元组）
+        :param value: 查询值（复合索引传入与字段一一对应的值元组）
+        :return: 命中要素的行位置数组（升序，无命中时为空数组）
+        """
+        if isinstance(value, pd.Series):
+            # 与gen_condition一致：Series取第一个值作为标量
+            if value.empty:
+                return np.empty(0, dtype=np.intp)
+            value = value.iloc[0]
+        try:
+            return self._get_index(fields).get(value, np.empty(0, dtype=np.intp))
+        except TypeError:
+            # 不可哈希的查询值不会命中任何要素
+            return np.empty(0, dtype=np.intp)
+
+    def get_first_by_index(self, fields: IndexKey, value) -> Optional[pd.Series]:
+        """
+        通过哈希索引取第一个命中的要素（如按(SECTION, ORIGINE)取线缆上的下一段）
+        :param fields: 已声明索引的字段名（或复合索引的字段元组）
+        :param value: 查询值
+        :return: 要素行（pd.Series），无命中时返回None
+        """
+        if self.gdf is None:
+            return None
+        positions = self.get_positions_by_index(fields, value)
+        if len(positions) == 0:
+            return None
+        return self.gdf.iloc[positions[0]]
+
     # --------------------------
     # 新增：数据更新方法
     # --------------------------
@@ -127,7 +397,7 @@ class LayerDGA:
     ) -> bool:
         """
         按条件更新指定字段的值（支持condition为空、多字段更新、处理无效值）
-        :param condition: 筛选条件（可为None，此时更新全部要素）
+        :param condition: 筛选条件（可为None，此时更新全部要素；也可传入查询表达式）
         :param field_values: 多字段更新字典（如：{"A": gdf["B"]+10, "C": 0}）
         :param value_processor: 值处理器（可选），支持两种形式：
                                 1. 单个函数：对所有字段的新值统一处理
@@ -141,7 +411,9 @@ class LayerDGA:
         if field_values is None or not isinstance(field_values, dict):
             print("field_values必须是非空字典（键=字段名，值=新值）")
             return False
-        # 校验所有字段是否存在
+        # 校验所有字段是否存在（仅属性加载模式下更新未读取的字段时，先补齐全部字段）
+        if any(field not in self.gdf.columns for field in field_values.keys()):
+            self._ensure_geometry()
         invalid_fields = [field for field in field_values.keys() if field not in self.gdf.columns]
         if invalid_fields:
             print(f"以下字段不存在：{invalid_fields}，无法更新")
@@ -154,7 +426,7 @@ class LayerDGA:
         else:
             # 执行条件函数并校验结果
             try:
-                mask = condition(self.gdf)
+                mask = self._evaluate_condition(condition) if isinstance(condition, Expr) else condition(self.gdf)
                 if mask is None:
                     raise ValueError("条件函数返回None，预期为布尔类型Series")
                 if not isinstance(mask, pd.Series) or mask.dtype != bool:
@@ -196,6 +468,8 @@ class LayerDGA:
             except Exception as e:
                 print(f"字段 {field} 更新失败：{str(e)}，跳过该字段更新")
                 continue
+            # 登记被修改的单元格，保存时只写回这些行的该字段
+            self._dirty_cells.setdefault(field, set()).update(self._gdf.index[mask.to_numpy()])
 
             # 4.5 统计当前字段的有效更新数量
             if isinstance(processed_new_value, (pd.Series, np.ndarray, gpd.GeoSeries)):
@@ -209,6 +483,10 @@ class LayerDGA:
             print(
                 f"已更新 {self.layer_name} 图层 {field_valid_count} 个要素的 {field} 字段（该字段符合条件 {mask.sum()} 个）")
 
+        # 被更新字段上的索引需要重建，查询缓存失效
+        self._invalidate_indexes(field_values.keys())
+        self._bump_generation()
+
         # 5. 最终结果提示
         if total_valid == 0:
             print("所有字段均未完成有效更新")
@@ -216,13 +494,30 @@ class LayerDGA:
             print(f"多字段更新完成，累计有效更新 {total_valid} 次（含多个字段叠加）")
         return True
 
+    def update_values_by_fids(self, field: str, values: pd.Series) -> bool:
+        """
+        按fid逐行写入字段值（各行的值不同，如整层计算出的结果），只登记这些行的该字段为已修改
+        :param field: 字段名
+        :param values: fid -> 新值
+        :return: 更新成功返回True
+        """
+        if self.gdf is None:
+            print("图层为空，无法更新")
+            return False
+        # 值全部有效时沿用图层原字段类型，避免整数字段被写成浮点
+        if field in self.gdf.columns and not values.isna().any():
+            values = values.astype(self.gdf[field].dtype)
+        fids = values.index
+        return self.update_attributes(condition=lambda gdf: pd.Series(gdf.index.isin(fids), index=gdf.index),
+                                      field_values={field: values.reindex(self.gdf.index)})
+
     def add_features(self, new_features: gpd.GeoDataFrame) -> bool:
         """
         向图层添加新要素
         :param new_features: 包含新要素的GeoDataFrame（需与原图层字段和CRS一致）
         :return: 添加成功返回True
         """
-        if self.gdf is None:
+        if self.gdf is None or not self._ensure_geometry():
             print("图层未加载，无法添加要素")
             return False
 
@@ -237,15 +532,22 @@ class LayerDGA:
             print(f"坐标系不一致，自动转换为图层坐标系：{self.gdf.crs}")
             new_features = new_features.to_crs(self.gdf.crs)
 
-        # 拼接新要素到原图层
-        self._gdf = pd.concat([self._gdf, new_features], ignore_index=True)
+        # 拼接新要素到原图层（新要素按现有最大fid顺延编号，整层重写时沿用）
+        start_pos = len(self._gdf)
+        next_fid = int(self._gdf.index.max()) + 1 if start_pos else 1
+        new_features = new_features.set_axis(
+            pd.RangeIndex(next_fid, next_fid + len(new_features), name=self._gdf.index.name))
+        self._gdf = pd.concat([self._gdf, new_features])
+        self._structure_dirty = True
+        self._patch_indexes_on_append(start_pos)
+        self._bump_generation()
         print(f"已添加 {len(new_features)} 个新要素，当前总要素数：{len(self._gdf)}")
         return True
 
     def delete_features(self, condition: Callable) -> bool:
         """
         按条件删除要素
-        :param condition: 筛选条件（如：lambda gdf: gdf["status"] == "废弃"）
+        :param condition: 筛选条件（如：lambda gdf: gdf["status"] == "废弃"），也可传入查询表达式
         :return: 删除成功返回True
         """
         if self.gdf is None:
@@ -253,26 +555,85 @@ class LayerDGA:
             return False
 
         # 筛选符合条件的行
-        mask = condition(self.gdf)
+        mask = self._evaluate_condition(condition) if isinstance(condition, Expr) else condition(self.gdf)
         if not mask.any():
             print("无符合条件的要素可删除")
             return True
 
         # 删除要素（保留不满足条件的要素）
         self._gdf = self._gdf[~mask].copy()
+        self._structure_dirty = True
+        # 删除后行位置整体变化，全部索引重建
+        self._invalidate_indexes()
+        self._bump_generation()
         print(f"已删除 {mask.sum()} 个要素，当前总要素数：{len(self._gdf)}")
         return True
 
-    def save_changes(self, overwrite: bool = True) -> bool:
+    @contextmanager
+    def batch(self):
         """
-        将内存中的修改同步到GeoPackage文件
+        批量写入（工作单元）：with块内的save_changes只在内存中登记，退出with块时统一同步一次文件
+        支持嵌套，最外层退出时才写文件；块内发生异常时不写文件，修改仍保留在内存中；
+        退出时写文件失败则抛出异常，待同步的状态保留，之后调用save_changes可重试
+        用法：
+            with gda.batch():
+                gda.update_attributes(...)
+                gda.save_changes()
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except Exception:
+            print(f"批量写入中断，修改未同步到文件：{self.gpkg_path}（图层：{self.layer_name}）")
+            raise
+        else:
+            if self._batch_depth == 1 and self._pending_save:
+                self._pending_save = False
+                full_rewrite, self._pending_full_rewrite = self._pending_full_rewrite, False
+                if not self._write_layer(self._pending_overwrite, full_rewrite):
+                    self._pending_save = True
+                    self._pending_full_rewrite = full_rewrite
+                    raise Exception(f"批量写入失败，修改未同步到文件：{self.gpkg_path}（图层：{self.layer_name}）")
+        finally:
+            self._batch_depth -= 1
+
+    def save_changes(self, overwrite: bool = True, full_rewrite: bool = False) -> bool:
+        """
+        将内存中的修改同步到GeoPackage文件（批量写入期间只登记，退出batch时统一写入）
+        只修改过属性值时，按fid对被修改的单元格执行UPDATE，不重写几何；增删过要素时整层重写
         :param overwrite: 是否覆盖原图层
+        :param full_rewrite: 是否强制整层重写（如直接修改过gdf而未经update_attributes）
+        :return: 保存成功返回True
+        """
+        if self._batch_depth > 0:
+            # 只登记：整层重写的要求在块内任意一次提出即保留，退出时按最强的要求写入
+            self._pending_save = True
+            self._pending_full_rewrite |= full_rewrite
+            self._pending_overwrite = overwrite
+            return True
+        # 之前批量写入失败时留下的整层重写要求一并执行
+        if not self._write_layer(overwrite, full_rewrite or self._pending_full_rewrite):
+            return False
+        self._pending_save = False
+        self._pending_full_rewrite = False
+        return True
+
+    def _write_layer(self, overwrite: bool = True, full_rewrite: bool = False) -> bool:
+        """
+        将缓存中的图层写入GeoPackage文件
+        :param overwrite: 是否覆盖原图层
+        :param full_rewrite: 是否强制整层重写
         :return: 保存成功返回True
         """
         if self.gdf is None:
             print("无数据可保存")
             return False
+        if not full_rewrite and not self._structure_dirty and self._fid_column:
+            return self._write_dirty_cells()
 
+        if not self._ensure_geometry():
+            print("无数据可保存")
+            return False
         try:
             # 保存图层（覆盖模式）
             self._gdf.to_file(
@@ -282,53 +643,152 @@ class LayerDGA:
                 mode="w",
                 append=not overwrite
             )
+            self._dirty_cells = {}
+            self._structure_dirty = False
             print(f"修改已同步到文件：{self.gpkg_path}（图层：{self.layer_name}）")
             return True
         except Exception as e:
             print(f"保存失败：{e}")
             return False
 
+    def _write_dirty_cells(self) -> bool:
+        """
+        增量写回：对被修改的单元格按字段批量执行 UPDATE <图层表> SET <字段>=? WHERE <fid>=?
+        （GeoPackage要素表名即图层名，几何不参与写入）
+        :return: 保存成功返回True
+        """
+        if not self._dirty_cells:
+            print(f"无修改需要同步：{self.gpkg_path}（图层：{self.layer_name}）")
+            return True
+
+        def quote(name):
+            return '"' + str(name).replace('"', '""') + '"'
+
+        try:
+            # 先把全部值转换为SQLite可绑定的类型，转换失败时一行也不写
+            updates = []
+            for field, fids in self._dirty_cells.items():
+                fids = sorted(fids)
+                values = self._gdf.loc[fids, field].tolist()
+                updates.append((field, [(_sqlite_value(value), int(fid)) for value, fid in zip(values, fids)]))
+            cell_count = 0
+            # 全部UPDATE在同一个事务中执行，中途失败时整体回滚，不留下写了一半的图层
+            with closing(_connect_gpkg(self.gpkg_path)) as conn, conn:
+                conn.execute("BEGIN")
+                for field, params in updates:
+                    conn.executemany(
+                        f"UPDATE {quote(self.layer_name)} SET {quote(field)} = ? WHERE {quote(self._fid_column)} = ?",
+                        params)
+                    cell_count += len(params)
+                # 按GeoPackage规范更新图层的最后修改时间
+                conn.execute("UPDATE gpkg_contents SET last_change = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') "
+                             "WHERE lower(table_name) = lower(?)", (self.layer_name,))
+            self._dirty_cells = {}
+            print(f"修改已增量同步到文件：{self.gpkg_path}（图层：{self.layer_name}，单元格数：{cell_count}）")
+            return True
+        except Exception as e:
+            print(f"保存失败：{e}")
+            return False
+
     # --------------------------
     # 新增：按条件查询要素集合
     # --------------------------
+    def _evaluate_condition(
+            self,
+            condition: Optional[Callable[[gpd.GeoDataFrame], bool]] = None
+    ) -> pd.Series:
+        """
+        执行条件函数得到布尔掩码（condition为None时全为True），并校验返回值
+        :param condition: 筛选条件（如：lambda gdf: gdf["level"] == 1），也可传入查询表达式
+        :return: 与图层行对齐的布尔掩码
+        """
+        # 1. 处理condition为None的情况：返回全部要素（布尔掩码全为True）
+        if condition is None:
+            return pd.Series(np.ones(len(self.gdf), dtype=bool), index=self.gdf.index)
+        if isinstance(condition, Expr):
+            # 查询表达式：按查询计划得到行位置，再还原为布尔掩码
+            mask = np.zeros(len(self.gdf), dtype=bool)
+            positions = self.get_positions_by_expr(condition)
+            if positions is None:
+                raise ValueError(f"查询表达式无法执行：{condition}")
+            mask[positions] = True
+            return pd.Series(mask, index=self.gdf.index)
+        # 执行条件函数
+        condition_result = condition(self.gdf)
+
+        # 2. 检查返回值是否为None
+        if condition_result is None:
+            raise ValueError("条件函数返回了None，预期应为布尔类型的Series（布尔掩码）")
+
+        # 3. 检查返回值是否为有效的布尔掩码（pandas.Series且dtype为bool）
+        if not isinstance(condition_result, pd.Series):
+            raise TypeError(f"条件函数返回值类型错误，预期为pd.Series，实际为{type(condition_result)}")
+        if condition_result.dtype != bool:
+            raise TypeError(f"条件函数返回值应为布尔类型（bool），实际为{condition_result.dtype}")
+        return condition_result
+
+    def get_positions_by_condition(
+            self,
+            condition: Optional[Callable[[gpd.GeoDataFrame], bool]] = None
+    ) -> Optional[np.ndarray]:
+        """
+        根据条件查询要素的行位置（只读场景：不复制任何数据，可再用gdf.iloc按需取行）
+        :param condition: 筛选条件（如：lambda gdf: gdf["level"] == 1）
+        :return: 符合条件的行位置数组（升序）
+        """
+        if self.gdf is None:
+            print("图层数据为空，无法查询")
+            return None
+        return np.flatnonzero(self._evaluate_condition(condition).to_numpy())
+
     def get_features_by_condition(
             self,
             condition: Optional[Callable[[gpd.GeoDataFrame], bool]] = None,  # 允许为None
             sort_by: Optional[list[str]] = None,  # 改为列表：支持多个字段（如["level", "voltage"]）
-            ascending: bool | list[bool] = True  # 改为列表/单个布尔值：对应每个字段的排序方向
+            ascending: bool | list[bool] = True,  # 改为列表/单个布尔值：对应每个字段的排序方向
+            copy: bool = True,
+            cache_key: Optional[Hashable] = None
     ) -> Optional[gpd.GeoDataFrame]:
         """
         根据条件查询要素集合，支持按多个字段排序
-        :param condition: 筛选条件（如：lambda gdf: gdf["level"] == 1）
+        :param condition: 筛选条件（如：lambda gdf: gdf["level"] == 1），也可传入查询表达式
         :param sort_by: 排序字段列表（如：["level", "voltage"]，None表示不排序）
         :param ascending: 排序方向（单个布尔值或列表）：
                           - 若为单个值：所有字段使用同一方向（True=升序，False=降序）
                           - 若为列表：需与sort_by长度一致，分别指定每个字段的方向
+        :param copy: 是否返回独立副本；只读场景传False，直接返回筛选结果，不再额外复制
+        :param cache_key: 条件的描述（需包含条件用到的全部参数）；传入时按描述缓存查询结果，数据变更后自动失效
         :return: 筛选并排序后的GeoDataFrame
         """
+        if isinstance(condition, Expr):
+            return self.get_features_by_expr(condition, sort_by, ascending, copy)
         if self.gdf is None:
             print("图层数据为空，无法查询")
             return None
-        # try:
-        # 1. 处理condition为None的情况：返回全部要素（布尔掩码全为True）
-        if condition is None:
-            condition_result = pd.Series([True] * len(self.gdf), index=self.gdf.index, dtype=bool)
-        else:
-            # 执行条件函数
-            condition_result = condition(self.gdf)
 
-            # 2. 检查返回值是否为None
-            if condition_result is None:
-                raise ValueError("条件函数返回了None，预期应为布尔类型的Series（布尔掩码）")
+        def query():
+            # try:
+            condition_result = self._evaluate_condition(condition)
+
+            # 4. 筛选符合条件的要素
+            return self._sort_features(self.gdf[condition_result], sort_by, ascending)
 
-            # 3. 检查返回值是否为有效的布尔掩码（pandas.Series且dtype为bool）
-            if not isinstance(condition_result, pd.Series):
-                raise TypeError(f"条件函数返回值类型错误，预期为pd.Series，实际为{type(condition_result)}")
-            if condition_result.dtype != bool:
-                raise TypeError(f"条件函数返回值应为布尔类型（bool），实际为{condition_result.dtype}")
+        key = None if cache_key is None else ("condition", cache_key) + _sort_key(sort_by, ascending)
+        return self._cached_query(key, query, copy)
 
-        # 4. 筛选符合条件的要素
-        filtered_gdf = self.gdf[condition_result].copy()
+    def _sort_features(
+            self,
+            filtered_gdf: gpd.GeoDataFrame,
+            sort_by: Optional[list[str]] = None,
+            ascending: bool | list[bool] = True
+    ) -> gpd.GeoDataFrame:
+        """
+        对查询结果按多个字段排序（get_features_by_condition与索引查询共用）
+        :param filtered_gdf: 筛选后的要素集合
+        :param sort_by: 排序字段列表（None表示不排序）
+        :param ascending: 排序方向（单个布尔值或列表）
+        :return: 排序后的GeoDataFrame
+        """
         if filtered_gdf.empty:
             print("无符合条件的要素")
             return filtered_gdf
@@ -380,7 +840,8 @@ class LayerDGA:
             op: str,
             value,
             sort_by: Optional[list[str]] = None,  # 多字段排序
-            ascending: bool | list[bool] = True
+            ascending: bool | list[bool] = True,
+            copy: bool = True
     ) -> Optional[gpd.GeoDataFrame]:
         """
         按属性条件查询（如：field="voltage", op=">", value=10）
@@ -391,50 +852,229 @@ class LayerDGA:
         :param ascending: 排序方向（单个布尔值或列表）：
                           - 若为单个值：所有字段使用同一方向（True=升序，False=降序）
                           - 若为列表：需与sort_by长度一致，分别指定每个字段的方向
+        :param copy: 是否返回独立副本；只读场景传False
         :return: 符合条件的要素集合
         """
+        if self.gdf is not None and field not in self.gdf.columns:
+            # 仅属性加载模式下查询未读取的字段：补齐全部字段后再查询
+            self._ensure_geometry()
         if self.gdf is None or field not in self.gdf.columns:
             print(f"字段不存在或图层为空：{field}")
             return None
 
+        expr = None if isinstance(value, pd.Series) else from_attribute(field, op, value)
+        if expr is not None:
+            # 可表示为查询表达式的运算符交给查询计划（等值/IN命中索引时不扫描全表）
+            return self.get_features_by_expr(expr, sort_by, ascending, copy)
+
         def custom_condition(gdf):
             return gen_condition(gdf, field, op, value)
 
-        return self.get_features_by_condition(custom_condition, sort_by, ascending)
+        return self.get_features_by_condition(custom_condition, sort_by, ascending, copy,
+                                              cache_key=("attribute", field, op, value))
 
-    def get_count_by_condition(
+    def get_features_by_index(
             self,
-            condition: Optional[Callable[[gpd.GeoDataFrame], bool]] = None,  # 允许为None
+            field: IndexKey,
+            value,
+            condition: Optional[Callable[[gpd.GeoDataFrame], pd.Series]] = None,
+            sort_by: Optional[list[str]] = None,
+            ascending: bool | list[bool] = True,
+            copy: bool = True,
+            cache_key: Optional[Hashable] = None
     ) -> Optional[gpd.GeoDataFrame]:
         """
-        根据条件查询要素集合，支持按多个字段排序
-        :param condition: 筛选条件（如：lambda gdf: gdf["level"] == 1）
+        通过哈希索引做等值查询（field == value），可再用condition在命中的子集上继续过滤
+        :param field: 已声明索引的字段名（或复合索引的字段元组）
+        :param value: 查询值（复合索引传入值元组）
+        :param condition: 作用于命中子集的附加条件（如：lambda gdf: gdf["SECTION"] != "S1"）
+        :param sort_by: 排序字段列表（None表示不排序）
+        :param ascending: 排序方向（单个布尔值或列表）
+        :param copy: 是否返回独立副本；只读场景传False
+        :param cache_key: 附加条件的描述；无附加条件时自动按(field, value)缓存，有附加条件时传入才缓存
         :return: 筛选并排序后的GeoDataFrame
         """
         if self.gdf is None:
             print("图层数据为空，无法查询")
             return None
-        # try:
-        # 1. 处理condition为None的情况：返回全部要素（布尔掩码全为True）
-        if condition is None:
-            condition_result = pd.Series([True] * len(self.gdf), index=self.gdf.index, dtype=bool)
-        else:
-            # 执行条件函数
-            condition_result = condition(self.gdf)
 
-            # 2. 检查返回值是否为None
-            if condition_result is None:
-                raise ValueError("条件函数返回了None，预期应为布尔类型的Series（布尔掩码）")
+        def query():
+            filtered_gdf = self.gdf.iloc[self.get_positions_by_index(field, value)]
+            if condition is not None and not filtered_gdf.empty:
+                filtered_gdf = filtered_gdf[condition(filtered_gdf)]
+            return self._sort_features(filtered_gdf, sort_by, ascending)
 
-            # 3. 检查返回值是否为有效的布尔掩码（pandas.Series且dtype为bool）
-            if not isinstance(condition_result, pd.Series):
-                raise TypeError(f"条件函数返回值类型错误，预期为pd.Series，实际为{type(condition_result)}")
-            if condition_result.dtype != bool:
-                raise TypeError(f"条件函数返回值应为布尔类型（bool），实际为{condition_result.dtype}")
+        key = None
+        if condition is None or cache_key is not None:
+            key = ("index", field, value, cache_key) + _sort_key(sort_by, ascending)
+        return self._cached_query(key, query, copy)
 
-        # 4. 筛选符合条件的要素
-        filtered_gdf = self.gdf[condition_result].copy()
-        return condition_result.sum()
+    def get_features_grouped_by_keys(
+            self,
+            field: str,
+            values,
+            sort_by: Optional[list[str]] = None,
+            ascending: bool | list[bool] = True,
+            copy: bool = True
+    ) -> Dict[object, gpd.GeoDataFrame]:
+        """
+        批量等值查询：一次向量化筛选取出field取值在values中的全部要素，再按字段值分组
+        （替代循环中逐个get_features_by_attribute(field, "==", value)）
+        :param field: 分组字段名
+        :param values: 查询值集合
+        :param sort_by: 组内排序字段列表（None表示不排序，组内保持图层原有顺序）
+        :param ascending: 排序方向（单个布尔值或列表）
+        :param copy: 是否返回独立副本；只读场景传False
+        :return: {字段值: 要素集合}，无命中的值不出现在结果中
+        """
+        if self.gdf is not None and field not in self.gdf.columns:
+            self._ensure_geometry()
+        if self.gdf is None or field not in self.gdf.columns:
+            print(f"字段不存在或图层为空：{field}")
+            return {}
+        values = list(dict.fromkeys(values))
+        if not values:
+            return {}
+        matched = self._sort_features(self.gdf[self.gdf[field].isin(values)], sort_by, ascending)
+        if matched.empty:
+            return {}
+        groups = {}
+        for value, positions in self._group_positions(matched, field).items():
+            group = matched.iloc[positions]
+            groups[value] = group.copy() if copy else group
+        return groups
+
+    def get_first_by_keys(self, field: str, values) -> Dict[object, pd.Series]:
+        """
+        批量取每个字段值对应的第一个要素（如按编码批量取箱体）
+        :param field: 字段名
+        :param values: 查询值集合
+        :return: {字段值: 要素行}，无命中的值不出现在结果中
+        """
+        groups = self.get_features_grouped_by_keys(field, values, copy=False)
+        return {value: group.iloc[0] for value, group in groups.items()}
+
+    def plan_query(self, expr: Expr):
+        """
+        把查询表达式编译成查询计划：有索引的等值/IN条件走索引探测（复合索引优先），其余条件在候选行上求值
+        :param expr: 查询表达式（见utils.query_expr）
+        :return: 查询计划
+        """
+        return compile_plan(expr, self._indexes.keys())
+
+    def _prepare_expr(self, expr: Expr) -> bool:
+        """校验表达式涉及的字段（仅属性加载模式下涉及未读取的字段时先补齐全部字段）"""
+        if self.gdf is None:
+            print("图层数据为空，无法查询")
+            return False
+        if any(f not in self.gdf.columns for f in expr.fields()):
+            self._ensure_geometry()
+        missing_fields = [f for f in expr.fields() if f not in self.gdf.columns]
+        if missing_fields:
+            print(f"查询字段不存在：{missing_fields}")
+            return False
+        return True
+
+    def get_positions_by_expr(self, expr: Expr, stats: Optional[dict] = None) -> Optional[np.ndarray]:
+        """
+        按查询表达式取命中要素的行位置
+        :param expr: 查询表达式
+        :param stats: 可选，执行统计（"probed"：索引探测命中行数，"scanned"：逐行求值行数）
+        :return: 行位置数组（升序）
+        """
+        if not self._prepare_expr(expr):
+            return None
+        return execute_plan(self.plan_query(expr), self, {} if stats is None else stats)
+
+    def get_features_by_expr(
+            self,
+            expr: Expr,
+            sort_by: Optional[list[str]] = None,
+            ascending: bool | list[bool] = True,
+            copy: bool = True
+    ) -> Optional[gpd.GeoDataFrame]:
+        """
+        按查询表达式查询要素集合（表达式本身即缓存键，同一版本内重复查询直接命中缓存）
+        :param expr: 查询表达式（如：eq("ORIGINE", "B1") & ne("SECTION", "S1")）
+        :param sort_by: 排序字段列表（None表示不排序）
+        :param ascending: 排序方向（单个布尔值或列表）
+        :param copy: 是否返回独立副本；只读场景传False
+        :return: 筛选并排序后的GeoDataFrame
+        """
+        if not self._prepare_expr(expr):
+            return None
+
+        def query():
+            return self._sort_features(self.gdf.iloc[self.get_positions_by_expr(expr)], sort_by, ascending)
+
+        return self._cached_query(("expr", expr) + _sort_key(sort_by, ascending), query, copy)
+
+    def get_count_by_expr(self, expr: Expr) -> int:
+        """
+        按查询表达式统计要素数量
+        :param expr: 查询表达式
+        :return: 符合条件的要素数（字段不存在或图层为空时为-1）
+        """
+        if not self._prepare_expr(expr):
+            return -1
+        return self._cached_query(("count", expr), lambda: len(self.get_positions_by_expr(expr)))
+
+    def explain(self, expr: Expr) -> str:
+        """
+        输出查询表达式的查询计划及执行统计（索引探测行数 vs 逐行求值行数）
+        :param expr: 查询表达式
+        :return: 计划说明文本
+        """
+        if not self._prepare_expr(expr):
+            return f"无法执行：{expr}"
+        plan = self.plan_query(expr)
+        stats = {}
+        positions = execute_plan(plan, self, stats)
+        lines = [f"查询：{expr}", "计划："] + plan.describe(1)
+        lines.append(f"总行数 {len(self.gdf)}，索引探测 {stats.get('probed', 0)} 行，"
+                     f"逐行求值 {stats.get('scanned', 0)} 行，命中 {len(positions)} 行")
+        return "\n".join(lines)
+
+    def get_count_by_index(
+            self,
+            field: IndexKey,
+            value,
+            condition: Optional[Callable[[gpd.GeoDataFrame], pd.Series]] = None
+    ) -> int:
+        """
+        通过哈希索引统计等值要素数量，可再用condition在命中的子集上继续过滤
+        :param field: 已声明索引的字段名（或复合索引的字段元组）
+        :param value: 查询值（复合索引传入值元组）
+        :param condition: 作用于命中子集的附加条件
+        :return: 符合条件的要素数
+        """
+        if self.gdf is None:
+            print("图层数据为空，计数为0")
+            return 0
+        positions = self.get_positions_by_index(field, value)
+        if condition is None or len(positions) == 0:
+            return len(positions)
+        return int(condition(self.gdf.iloc[positions]).sum())
+
+    def get_count_by_condition(
+            self,
+            condition: Optional[Callable[[gpd.GeoDataFrame], bool]] = None,  # 允许为None
+            cache_key: Optional[Hashable] = None
+    ) -> Optional[int]:
+        """
+        根据条件统计要素数量（直接对布尔掩码计数，不生成筛选结果）
+        :param condition: 筛选条件（如：lambda gdf: gdf["level"] == 1），也可传入查询表达式
+        :param cache_key: 条件的描述；传入时按描述缓存计数结果，数据变更后自动失效
+        :return: 符合条件的要素数
+        """
+        if isinstance(condition, Expr):
+            return self.get_count_by_expr(condition)
+        if self.gdf is None:
+            print("图层数据为空，无法查询")
+            return None
+        key = None if cache_key is None else ("count", cache_key)
+        return self._cached_query(
+            key, lambda: int(np.count_nonzero(self._evaluate_condition(condition).to_numpy())))
 
 
 
@@ -452,10 +1092,17 @@ class LayerDGA:
         :param value: 比较值
         :return: 符合条件的要素数
         """
+        if self.gdf is not None and field not in self.gdf.columns:
+            self._ensure_geometry()
         if self.gdf is None or field not in self.gdf.columns:
             print(f"图层为空或字段不存在：{field}，计数为0")
             return -1
 
+        expr = None if isinstance(value, pd.Series) else from_attribute(field, op, value)
+        if expr is not None:
+            # 等值/IN计数命中索引时，行位置数组长度即为要素数
+            return self.get_count_by_expr(expr)
+
         # 构建属性条件（复用查询方法的逻辑）
 
         try:
@@ -465,7 +1112,7 @@ class LayerDGA:
             if custom_condition is None:
                 return -1
             else:
-                return self.get_count_by_condition(custom_condition)
+                return self.get_count_by_condition(custom_condition, cache_key=("attribute", field, op, value))
 
 
         except Exception as e:
@@ -473,14 +1120,15 @@ class LayerDGA:
             return -1
 
     # 便捷方法：空间查询（简化常用场景）
-    def get_features_by_spatial(self, spatial_op: str, geometry) -> Optional[gpd.GeoDataFrame]:
+    def get_features_by_spatial(self, spatial_op: str, geometry, copy: bool = True) -> Optional[gpd.GeoDataFrame]:
         """
         按空间条件查询（如：包含、相交、距离小于等）
         :param spatial_op: 空间运算符（"contains", "intersects", "distance_lt"等）
         :param geometry: 参考几何对象（如Point, Polygon）
+        :param copy: 是否返回独立副本；只读场景传False
         :return: 符合条件的要素集合
         """
-        if self.gdf is None:
+        if self.gdf is None or not self._ensure_geometry():
             print("图层数据为空，无法查询")
             return None
 
@@ -503,7 +1151,9 @@ class LayerDGA:
             print(f"不支持的空间运算符：{spatial_op}")
             return None
 
-        filtered_gdf = self.gdf[condition].copy()
+        filtered_gdf = self.gdf[condition]
+        if copy:
+            filtered_gdf = filtered_gdf.copy()
         print(f"空间查询到 {len(filtered_gdf)} 个要素")
         return filtered_gdf
 
@@ -521,7 +1171,7 @@ class LayerDGA:
     # --------------------------
     def query_by_spatial(self, spatial_func) -> Optional[gpd.GeoDataFrame]:
         """空间查询（返回符合空间条件的子集）"""
-        if self.gdf is None:
+        if self.gdf is None or not self._ensure_geometry():
             return None
         return self.gdf[spatial_func(self.gdf)].copy()
 
@@ -530,7 +1180,7 @@ class LayerDGA:
     # --------------------------
     def save(self, overwrite: bool = True):
         """保存当前图层（覆盖原图层）"""
-        if self.gdf is None:
+        if self.gdf is None or not self._ensure_geometry():
             print("无数据可保存")
             return
         # 保存图层（覆盖模式）
@@ -548,6 +1198,68 @@ class LayerDGA:
         self._load_layer()
 
 
+def _gpkg_blob_to_geometry(blob) -> Optional[base.BaseGeometry]:
+    """解析GeoPackage几何二进制（'GP'头 + 包络框 + WKB）"""
+    if blob is None:
+        return None
+    flags = blob[3]
+    envelope_size = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}.get((flags >> 1) & 0x07, 0)
+    return shapely.from_wkb(bytes(blob[8 + envelope_size:]))
+
+
+def _gpkg_bound(blob, i: int):
+    geometry = _gpkg_blob_to_geometry(blob)
+    if geometry is None or geometry.is_empty:
+        return None
+    return geometry.bounds[i]
+
+
+def _connect_gpkg(gpkg_path: str) -> sqlite3.Connection:
+    """
+    打开GeoPackage的SQLite连接，并注册R树触发器用到的ST_*函数
+    （GDAL创建的要素表带有空间索引触发器，任何UPDATE都会编译这些触发器，缺少函数会报错）
+    """
+    conn = sqlite3.connect(gpkg_path)
+    conn.create_function("ST_IsEmpty", 1, lambda blob: None if blob is None else int(
+        bool(blob[3] & 0x10) or _gpkg_blob_to_geometry(blob).is_empty), deterministic=True)
+    for i, name in enumerate(("ST_MinX", "ST_MinY", "ST_MaxX", "ST_MaxY")):
+        conn.create_function(name, 1, lambda blob, i=i: _gpkg_bound(blob, i), deterministic=True)
+    return conn
+
+
+def _sqlite_value(value):
+    """
+    把单元格的值转换为SQLite可绑定的类型：
+    空值（None/NaN/NaT）-> None，numpy标量 -> Python标量，时间 -> ISO 8601字符串（GeoPackage的DATETIME/DATE格式），
+    其他SQLite不支持的对象 -> 字符串
+    """
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, datetime):
+        value = pd.Timestamp(value)
+        if value.tzinfo is not None:
+            return value.tz_convert("UTC").strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        return value.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    return str(value)
+
+
+def _sort_key(sort_by, ascending) -> tuple:
+    """把排序参数规整为可哈希的查询描述（字符串与单元素列表等价）"""
+    if sort_by is None:
+        return None, None
+    if isinstance(sort_by, str):
+        sort_by = [sort_by]
+    if not isinstance(ascending, bool):
+        ascending = tuple(ascending)
+    return tuple(sort_by), ascending
+
+
 def gen_condition(gdf, field, op, value):
     """生成条件表达式，确保value为标量"""
     # 关键：如果value是Series，尝试提取第一个值（或根据业务逻辑取标量）
@@ -0,0 +1,106 @@
+"""
+分组的整数闭区间索引：每个区间属于一个分组（如SECTION、起点箱体），区间为[start, end]
+构建时按(分组, start, end)排序一次，并沿排序顺序求每个分组内截至当前区间的最大end（覆盖前沿），
+重叠检测、空闲区间都只需与覆盖前沿比较，整体O(n log n)；单个区间查询在分组内二分定位
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class IntervalIndex:
+    """分组闭区间索引（start/end为空的区间不参与索引）"""
+
+    def __init__(self, groups: Sequence, starts: Sequence, ends: Sequence, ids: Optional[Sequence] = None):
+        """
+        :param groups: 每个区间所属的分组
+        :param starts: 区间起点
+        :param ends: 区间终点（含）
+        :param ids: 区间标识（默认为输入中的位置），查询结果中返回
+        """
+        starts = pd.to_numeric(pd.Series(starts), errors="coerce").to_numpy(dtype=float)
+        ends = pd.to_numeric(pd.Series(ends), errors="coerce").to_numpy(dtype=float)
+        ids = np.arange(len(starts)) if ids is None else np.asarray(ids, dtype=object)
+        group_ids, self._group_values = pd.factorize(pd.Series(groups, dtype=object))
+        valid = (group_ids >= 0) & ~np.isnan(starts) & ~np.isnan(ends)
+
+        order = np.flatnonzero(valid)
+        order = order[np.lexsort((ends[order], starts[order], group_ids[order]))]
+        self._group = group_ids[order]
+        self._start = starts[order].astype(np.int64)
+        self._end = ends[order].astype(np.int64)
+        self._id = ids[order]
+        # 分组 -> 排序数组中的[起, 止)
+        self._bounds = np.searchsorted(self._group, np.arange(len(self._group_values) + 1))
+        self._group_pos: Dict[object, int] = {value: pos for pos, value in enumerate(self._group_values.tolist())}
+
+        # 覆盖前沿：分组内截至当前区间（含）的最大end，以及取得该end的区间（相同时取靠后的）；
+        # 分组内累计最大值后，end达到前沿的区间成为新的取得者，其位置向后填充（分组第一个区间必然达到）
+        n = len(self._end)
+        if n:
+            reach = pd.Series(self._end).groupby(self._group).cummax().to_numpy()
+            self._reach_pos = np.maximum.accumulate(np.where(self._end == reach, np.arange(n), 0))
+        else:
+            self._reach_pos = np.zeros(0, dtype=np.int64)
+        self._reach = self._end[self._reach_pos]
+        self._first_in_group = np.r_[True, self._group[1:] != self._group[:-1]] if n else np.zeros(0, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self._id)
+
+    def groups(self) -> list:
+        """全部分组"""
+        return self._group_values.tolist()
+
+    def intervals(self, group) -> List[tuple]:
+        """分组内的区间（按start升序）：[(start, end, id), ...]"""
+        start, end = self._slice(group)
+        return list(zip(self._start[start:end].tolist(), self._end[start:end].tolist(), self._id[start:end].tolist()))
+
+    def _slice(self, group) -> tuple[int, int]:
+        pos = self._group_pos.get(group)
+        if pos is None:
+            return 0, 0
+        return int(self._bounds[pos]), int(self._bounds[pos + 1])
+
+    def overlaps(self) -> List[tuple]:
+        """
+        全部重叠：每个与分组内前面的区间有重叠的区间，与其前面覆盖最远的那个区间配对
+        :return: [(分组, 前面的区间id, 重叠的区间id), ...]，按分组、start排序
+        """
+        if len(self) == 0:
+            return []
+        previous = np.r_[0, self._reach_pos[:-1]]
+        overlapping = np.flatnonzero(~self._first_in_group & (self._start <= self._end[previous]))
+        return list(zip(self._group_values[self._group[overlapping]].tolist(),
+                        self._id[previous[overlapping]].tolist(), self._id[overlapping].tolist()))
+
+    def gaps(self, group, low: int = 1, high: Optional[int] = None) -> List[tuple]:
+        """
+        分组在[low, high]内未被任何区间覆盖的空闲区间
+        :param group: 分组
+        :param low: 可用范围起点
+        :param high: 可用范围终点（None表示到最后一个区间为止）
+        :return: [(start, end), ...]
+        """
+        start, end = self._slice(group)
+        starts, ends = self._start[start:end], self._reach[start:end]
+        # 第i个区间之前覆盖到的位置：low-1或前一区间的覆盖前沿
+        covered = np.r_[low - 1, ends[:-1]] if len(starts) else np.array([low - 1])
+        gap_start = np.maximum(covered[:len(starts)] + 1, low)
+        gap_end = starts - 1 if high is None else np.minimum(starts - 1, high)
+        result = [(int(a), int(b)) for a, b in zip(gap_start, gap_end) if a <= b]
+        if high is not None:
+            tail_start = max(int(ends[-1]) + 1 if len(ends) else low, low)
+            if tail_start <= high:
+                result.append((tail_start, int(high)))
+        return result
+
+    def find(self, group, start: int, end: int) -> list:
+        """分组内与[start, end]重叠的区间id"""
+        lo, hi = self._slice(group)
+        # 按start排序：start大于end的区间都不会重叠
+        hi = lo + int(np.searchsorted(self._start[lo:hi], end, side="right"))
+        hits = np.flatnonzero(self._end[lo:hi] >= start)
+        return self._id[lo + hits].tolist()
@@ -0,0 +1,405 @@
+"""
+声明式查询表达式：用不可变数据类描述筛选条件（可哈希，可直接作为查询缓存的键），
+由LayerDGA编译成查询计划：有哈希索引的等值/IN条件走索引探测，
+其余条件在候选行上做向量化掩码
+用法：
+    expr = eq("level", 1) & col_eq("ORIGINE", "origin_box")
+    gda.get_features_by_expr(expr, sort_by=["skip_count"])
+    print(gda.explain(expr))
+"""
+import operator
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# 哈希索引的键：单个字段名，或复合索引的字段名元组（与gda_utils.IndexKey一致）
+IndexKey = Union[str, tuple[str, ...]]
+
+_COMPARE_OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+def _to_mask(result) -> np.ndarray:
+    """比较结果转为布尔数组（可空布尔类型中的空值视为False）"""
+    if isinstance(result, pd.Series):
+        return result.to_numpy(dtype=bool, na_value=False)
+    return np.asarray(result, dtype=bool)
+
+
+class Expr:
+    """查询表达式基类：支持 & 与 | 组合"""
+
+    def __and__(self, other: "Expr") -> "Expr":
+        return and_(self, other)
+
+    def __or__(self, other: "Expr") -> "Expr":
+        return or_(self, other)
+
+    def fields(self) -> frozenset:
+        """表达式涉及的字段"""
+        raise NotImplementedError
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        """在df上向量化求值，得到与df行对齐的布尔数组"""
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class Eq(Expr):
+    """字段 == 值"""
+    field: str
+    value: Hashable
+
+    def fields(self) -> frozenset:
+        return frozenset((self.field,))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return _to_mask(df[self.field] == self.value)
+
+    def __str__(self):
+        return f"{self.field} == {self.value!r}"
+
+
+@dataclass(frozen=True)
+class Ne(Expr):
+    """字段 != 值"""
+    field: str
+    value: Hashable
+
+    def fields(self) -> frozenset:
+        return frozenset((self.field,))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return _to_mask(df[self.field] != self.value)
+
+    def __str__(self):
+        return f"{self.field} != {self.value!r}"
+
+
+@dataclass(frozen=True)
+class In(Expr):
+    """字段 IN (值1, 值2, ...)"""
+    field: str
+    values: tuple
+
+    def fields(self) -> frozenset:
+        return frozenset((self.field,))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return _to_mask(df[self.field].isin(list(self.values)))
+
+    def __str__(self):
+        return f"{self.field} IN {self.values!r}"
+
+
+@dataclass(frozen=True)
+class Range(Expr):
+    """字段在区间内（low/high为None表示该侧不限）"""
+    field: str
+    low: Optional[Hashable] = None
+    high: Optional[Hashable] = None
+    include_low: bool = True
+    include_high: bool = True
+
+    def fields(self) -> frozenset:
+        return frozenset((self.field,))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        column = df[self.field]
+        result = np.ones(len(df), dtype=bool)
+        if self.low is not None:
+            result &= _to_mask(column >= self.low if self.include_low else column > self.low)
+        if self.high is not None:
+            result &= _to_mask(column <= self.high if self.include_high else column < self.high)
+        return result
+
+    def __str__(self):
+        left = "[" if self.include_low else "("
+        right = "]" if self.include_high else ")"
+        low = "-inf" if self.low is None else repr(self.low)
+        high = "+inf" if self.high is None else repr(self.high)
+        return f"{self.field} IN {left}{low}, {high}{right}"
+
+
+@dataclass(frozen=True)
+class ColumnCompare(Expr):
+    """字段与字段比较（如：ORIGINE == origin_box）"""
+    left: str
+    op: str
+    right: str
+
+    def fields(self) -> frozenset:
+        return frozenset((self.left, self.right))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return _to_mask(_COMPARE_OPS[self.op](df[self.left], df[self.right]))
+
+    def __str__(self):
+        return f"{self.left} {self.op} {self.right}"
+
+
+@dataclass(frozen=True)
+class And(Expr):
+    """全部子条件同时成立"""
+    terms: tuple
+
+    def fields(self) -> frozenset:
+        return frozenset().union(*(term.fields() for term in self.terms))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        result = np.ones(len(df), dtype=bool)
+        for term in self.terms:
+            result &= term.mask(df)
+        return result
+
+    def __str__(self):
+        return "(" + " AND ".join(str(term) for term in self.terms) + ")"
+
+
+@dataclass(frozen=True)
+class Or(Expr):
+    """任一子条件成立"""
+    terms: tuple
+
+    def fields(self) -> frozenset:
+        return frozenset().union(*(term.fields() for term in self.terms))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        result = np.zeros(len(df), dtype=bool)
+        for term in self.terms:
+            result |= term.mask(df)
+        return result
+
+    def __str__(self):
+        return "(" + " OR ".join(str(term) for term in self.terms) + ")"
+
+
+# --------------------------
+# 构造函数
+# --------------------------
+def eq(field: str, value) -> Eq:
+    return Eq(field, value)
+
+
+def ne(field: str, value) -> Ne:
+    return Ne(field, value)
+
+
+def is_in(field: str, values: Iterable) -> In:
+    return In(field, tuple(values))
+
+
+def between(field: str, low=None, high=None, include_low: bool = True, include_high: bool = True) -> Range:
+    return Range(field, low, high, include_low, include_high)
+
+
+def gt(field: str, value) -> Range:
+    return Range(field, low=value, include_low=False)
+
+
+def ge(field: str, value) -> Range:
+    return Range(field, low=value)
+
+
+def lt(field: str, value) -> Range:
+    return Range(field, high=value, include_high=False)
+
+
+def le(field: str, value) -> Range:
+    return Range(field, high=value)
+
+
+def col_eq(left: str, right: str) -> ColumnCompare:
+    return ColumnCompare(left, "==", right)
+
+
+def col_ne(left: str, right: str) -> ColumnCompare:
+    return ColumnCompare(left, "!=", right)
+
+
+def and_(*terms: Expr) -> Expr:
+    """AND组合（嵌套的AND展开为一层，便于规划时整体挑选索引）"""
+    return _combine(And, terms)
+
+
+def or_(*terms: Expr) -> Expr:
+    """OR组合（嵌套的OR展开为一层）"""
+    return _combine(Or, terms)
+
+
+def _combine(kind, terms) -> Expr:
+    flat = []
+    for term in terms:
+        flat.extend(term.terms if isinstance(term, kind) else (term,))
+    return flat[0] if len(flat) == 1 else kind(tuple(flat))
+
+
+def from_attribute(field: str, op: str, value) -> Optional[Expr]:
+    """把(field, op, value)形式的属性条件转成表达式，无法表示的运算符（如contains）返回None"""
+    if op == "==":
+        return Eq(field, value)
+    if op == "!=":
+        return Ne(field, value)
+    if op == "in":
+        return In(field, tuple(value))
+    if op == ">":
+        return gt(field, value)
+    if op == ">=":
+        return ge(field, value)
+    if op == "<":
+        return lt(field, value)
+    if op == "<=":
+        return le(field, value)
+    return None
+
+
+# --------------------------
+# 查询计划
+# --------------------------
+@dataclass(frozen=True)
+class ProbePlan:
+    """在哈希索引上探测一个或多个值，合并命中的行位置"""
+    index: IndexKey
+    values: tuple
+
+    def describe(self, depth: int = 0) -> list[str]:
+        fields = ", ".join(self.index) if isinstance(self.index, tuple) else self.index
+        values = repr(self.values[0]) if len(self.values) == 1 else f"{len(self.values)} 个值"
+        return ["  " * depth + f"索引探测 [{fields}] = {values}"]
+
+
+@dataclass(frozen=True)
+class IntersectPlan:
+    """多个子计划的行位置取交集"""
+    children: tuple
+
+    def describe(self, depth: int = 0) -> list[str]:
+        lines = ["  " * depth + "交集"]
+        for child in self.children:
+            lines += child.describe(depth + 1)
+        return lines
+
+
+@dataclass(frozen=True)
+class UnionPlan:
+    """多个子计划的行位置取并集"""
+    children: tuple
+
+    def describe(self, depth: int = 0) -> list[str]:
+        lines = ["  " * depth + "并集"]
+        for child in self.children:
+            lines += child.describe(depth + 1)
+        return lines
+
+
+@dataclass(frozen=True)
+class FilterPlan:
+    """在候选行上向量化求值剩余条件；source为None表示全表扫描"""
+    source: Optional[object]
+    residual: Expr
+
+    def describe(self, depth: int = 0) -> list[str]:
+        if self.source is None:
+            return ["  " * depth + f"全表扫描 {self.residual}"]
+        return ["  " * depth + f"过滤 {self.residual}"] + self.source.describe(depth + 1)
+
+
+def compile_plan(expr: Expr, index_keys: Iterable[IndexKey]) -> object:
+    """
+    把表达式编译成查询计划
+    :param expr: 查询表达式
+    :param index_keys: 图层已声明的索引键
+    :return: 计划节点（ProbePlan / IntersectPlan / UnionPlan / FilterPlan）
+    """
+    index_keys = list(index_keys)
+    probe = _probe(expr, index_keys)
+    if probe is not None:
+        return probe
+    if isinstance(expr, And):
+        probes, residual = [], []
+        eq_terms: Dict[str, List[Eq]] = {}
+        for term in expr.terms:
+            if isinstance(term, Eq):
+                eq_terms.setdefault(term.field, []).append(term)
+        # 同一字段有多个等值条件时不用复合索引（各条件单独求交，值不同时结果为空）
+        eq_values = {field: terms[0].value for field, terms in eq_terms.items() if len(terms) == 1}
+        used = set()
+        # 优先用字段最多的复合索引覆盖等值条件
+        for key in sorted((k for k in index_keys if isinstance(k, tuple)), key=len, reverse=True):
+            if all(f in eq_values and f not in used for f in key):
+                probes.append(ProbePlan(key, (tuple(eq_values[f] for f in key),)))
+                used.update(key)
+        for term in expr.terms:
+            if isinstance(term, Eq) and term.field in used:
+                continue
+            term_plan = compile_plan(term, index_keys)
+            if is_full_scan(term_plan):
+                residual.append(term)
+            else:
+                probes.append(term_plan)
+        if probes:
+            source = probes[0] if len(probes) == 1 else IntersectPlan(tuple(probes))
+            return FilterPlan(source, _combine(And, residual)) if residual else source
+    if isinstance(expr, Or):
+        children = tuple(compile_plan(term, index_keys) for term in expr.terms)
+        if not any(is_full_scan(child) for child in children):
+            return UnionPlan(children)
+    return FilterPlan(None, expr)
+
+
+def _probe(expr: Expr, index_keys: list) -> Optional[ProbePlan]:
+    """单字段等值/IN条件且字段有索引时，直接生成索引探测"""
+    if isinstance(expr, Eq) and expr.field in index_keys:
+        return ProbePlan(expr.field, (expr.value,))
+    if isinstance(expr, In) and expr.field in index_keys:
+        return ProbePlan(expr.field, expr.values)
+    return None
+
+
+def is_full_scan(plan) -> bool:
+    """计划是否需要扫描全表"""
+    return isinstance(plan, FilterPlan) and plan.source is None
+
+
+def execute_plan(plan, layer, stats: dict) -> np.ndarray:
+    """
+    执行查询计划
+    :param plan: compile_plan生成的计划
+    :param layer: 提供gdf与get_positions_by_index的图层（LayerDGA）
+    :param stats: 统计信息，累计"probed"（索引探测命中的行数）与"scanned"（逐行求值的行数）
+    :return: 命中要素的行位置数组（升序，与全表扫描的结果顺序一致）
+    """
+    if isinstance(plan, ProbePlan):
+        if not plan.values:
+            # 空的IN条件不命中任何要素
+            return np.empty(0, dtype=np.intp)
+        parts = [layer.get_positions_by_index(plan.index, value) for value in plan.values]
+        positions = parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+        stats["probed"] = stats.get("probed", 0) + len(positions)
+        return positions
+    if isinstance(plan, IntersectPlan):
+        positions = execute_plan(plan.children[0], layer, stats)
+        for child in plan.children[1:]:
+            positions = np.intersect1d(positions, execute_plan(child, layer, stats), assume_unique=True)
+        return positions
+    if isinstance(plan, UnionPlan):
+        positions = execute_plan(plan.children[0], layer, stats)
+        for child in plan.children[1:]:
+            positions = np.union1d(positions, execute_plan(child, layer, stats))
+        return positions
+    if plan.source is None:
+        stats["scanned"] = stats.get("scanned", 0) + len(layer.gdf)
+        return np.flatnonzero(plan.residual.mask(layer.gdf))
+    candidates = execute_plan(plan.source, layer, stats)
+    if len(candidates) == 0:
+        return candidates
+    stats["scanned"] = stats.get("scanned", 0) + len(candidates)
+    return candidates[plan.residual.mask(layer.gdf.iloc[candidates])]
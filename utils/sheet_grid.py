@@ -0,0 +1,110 @@
+"""
+表格数据区的稠密网格：从first_row开始的若干行 × 固定列数，每格保存值、样式id与链接目标
+与SheetLayout（按写入顺序记录的元素列表）不同，网格中每格只保留最终结果，可以按行顺序输出、按行切片，
+也可以整列读取做数组运算；同一格被多次写入时与逐格写工作表一致：值被覆盖，样式只覆盖本次设置了的部分
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from utils.style_registry import STYLES, CellStyle, NO_STYLE, StyleRegistry
+
+
+class SheetGrid:
+    """数据区网格（行号为工作表中的行号，列号从1开始）"""
+
+    def __init__(self, first_row: int, n_cols: int, capacity: int = 256, registry: StyleRegistry = STYLES):
+        self.first_row = first_row
+        self.n_cols = n_cols
+        self.n_rows = 0  # 已写到的行数（最后一行为first_row + n_rows - 1）
+        self._values = np.full((capacity, n_cols), None, dtype=object)
+        self._style_ids = np.zeros((capacity, n_cols), dtype=np.int32)
+        self.links: Dict[Tuple[int, int], str] = {}  # (行, 列) -> 链接目标
+        self.formula_results: Dict[Tuple[int, int], object] = {}  # (行, 列) -> 公式预先算出的结果（保存时写为缓存值）
+        self.registry = registry
+
+    @property
+    def last_row(self) -> int:
+        return self.first_row + self.n_rows - 1
+
+    @property
+    def styles(self) -> List[Optional[CellStyle]]:
+        """样式id -> CellStyle"""
+        return self.registry.styles
+
+    def style_id(self, style: CellStyle) -> int:
+        """样式登记：相同的样式共用一个id"""
+        return self.registry.register(style)
+
+    def _ensure_rows(self, n_rows: int) -> None:
+        capacity = len(self._values)
+        if n_rows <= capacity:
+            return
+        capacity = max(n_rows, capacity * 2)
+        values = np.full((capacity, self.n_cols), None, dtype=object)
+        values[:self.n_rows] = self._values[:self.n_rows]
+        style_ids = np.zeros((capacity, self.n_cols), dtype=np.int32)
+        style_ids[:self.n_rows] = self._style_ids[:self.n_rows]
+        self._values, self._style_ids = values, style_ids
+
+    def put(self, row: int, col: int, value, style_id: int = NO_STYLE, link: Optional[str] = None) -> None:
+        """
+        写入一格
+        :param row: 行号（不小于first_row）
+        :param col: 列号（1 ~ n_cols）
+        :param value: 值
+        :param style_id: 样式登记表中的样式id（NO_STYLE表示不改变样式）
+        :param link: 链接目标（None表示不改变链接）
+        """
+        index = row - self.first_row
+        if index >= self.n_rows:
+            self._ensure_rows(index + 1)
+            self.n_rows = index + 1
+        self._values[index, col - 1] = value
+        if style_id != NO_STYLE:
+            old_id = self._style_ids[index, col - 1]
+            if old_id != NO_STYLE and old_id != style_id:
+                style_id = self.registry.merge(old_id, style_id)
+            self._style_ids[index, col - 1] = style_id
+        if link:
+            self.links[(row, col)] = link
+
+    def put_values(self, row: int, col: int, values) -> None:
+        """
+        从row开始向下整列写入值（样式、链接不变）
+        :param row: 第一个值的行号（不小于first_row）
+        :param col: 列号
+        :param values: 按行顺序的值
+        """
+        index = row - self.first_row
+        stop = index + len(values)
+        if stop > self.n_rows:
+            self._ensure_rows(stop)
+            self.n_rows = stop
+        self._values[index:stop, col - 1] = values
+
+    def value(self, row: int, col: int):
+        """读取一格的值（超出已写范围为None）"""
+        index = row - self.first_row
+        if index < 0 or index >= self.n_rows:
+            return None
+        return self._values[index, col - 1]
+
+    def values(self, col: int) -> np.ndarray:
+        """整列的值（按行顺序）"""
+        return self._values[:self.n_rows, col - 1]
+
+    def style_ids(self, col: int) -> np.ndarray:
+        """整列的样式id（按行顺序）"""
+        return self._style_ids[:self.n_rows, col - 1]
+
+    def rows(self, first_row: Optional[int] = None, last_row: Optional[int] = None) \
+            -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        按行顺序遍历[first_row, last_row]（默认全部已写的行）
+        :return: (行号, 该行的值, 该行的样式id)
+        """
+        start = 0 if first_row is None else max(first_row - self.first_row, 0)
+        stop = self.n_rows if last_row is None else min(last_row - self.first_row + 1, self.n_rows)
+        for index in range(start, stop):
+            yield self.first_row + index, self._values[index], self._style_ids[index]
@@ -0,0 +1,58 @@
+"""
+表格布局：描绘阶段只计算“在哪个单元格写什么、用哪种样式、链接到哪里”，按写入顺序记为扁平的定位元素列表
+（行、列、值、样式id、链接目标），不依赖工作表；渲染阶段再把元素依次输出到具体格式（见xlsx_renderer）
+同一单元格可以被写入多次，渲染时按顺序后写覆盖先写，与直接逐格写工作表的结果一致
+"""
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.style_registry import STYLES, CellStyle, StyleRegistry
+
+
+class SheetLayout:
+    """单个工作表的布局（行、列从1开始）"""
+
+    def __init__(self, registry: StyleRegistry = STYLES):
+        self.rows = array("i")
+        self.cols = array("i")
+        self.style_ids = array("i")
+        self.values: list = []
+        self.links: Dict[int, str] = {}  # 元素下标 -> 链接目标
+        self.registry = registry
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def styles(self) -> List[Optional[CellStyle]]:
+        """样式id -> CellStyle"""
+        return self.registry.styles
+
+    def style_id(self, style: CellStyle) -> int:
+        """样式登记：相同的样式共用一个id（描绘时通常直接使用样式登记表中预先构建的id）"""
+        return self.registry.register(style)
+
+    def put(self, row: int, col: int, value, style_id: int, link: Optional[str] = None) -> int:
+        """
+        追加一个定位元素
+        :param row: 行号
+        :param col: 列号（数字）
+        :param value: 单元格内容
+        :param style_id: 样式登记表中的样式id
+        :param link: 链接目标（如"#'SHEET'!A1"），None表示无链接
+        :return: 元素下标
+        """
+        index = len(self.values)
+        self.rows.append(row)
+        self.cols.append(col)
+        self.style_ids.append(style_id)
+        self.values.append(value)
+        if link:
+            self.links[index] = link
+        return index
+
+    def elements(self) -> Iterator[Tuple[int, int, object, int, Optional[str]]]:
+        """按写入顺序遍历元素：(行, 列, 值, 样式id, 链接目标)"""
+        links = self.links
+        for index, (row, col, style_id, value) in enumerate(zip(self.rows, self.cols, self.style_ids, self.values)):
+            yield row, col, value, style_id, links.get(index)
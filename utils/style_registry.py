@@ -0,0 +1,165 @@
+"""
+样式登记表：拓扑总览与纤芯分配表用到的样式在导入时一次性构建并编号，描绘阶段只按样式id写入，
+不再逐格创建Font、Border等对象（openpyxl也不必逐格对它们做哈希去重）
+- 拓扑总览：箱体边框、线缆走线边框、字体与对齐的组合，每个样式完整设置边框、字体、对齐
+- 纤芯分配表：12种纤芯颜色 × 普通/加粗、居中、PBO链接
+样式id在进程内固定，SheetLayout与SheetGrid共用同一张表（STYLES）；样式对象不可修改
+"""
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+# 单元格样式：各部分为None表示不设置（保持默认或保持之前写入的）
+CellStyle = namedtuple("CellStyle", ["font", "fill", "border", "alignment"], defaults=[None, None, None, None])
+
+NO_STYLE = 0  # 样式id：未设置任何样式
+
+
+class StyleRegistry:
+    """样式id -> CellStyle（相同的样式共用一个id）"""
+
+    def __init__(self):
+        self.styles: List[Optional[CellStyle]] = [None]
+        self._ids: Dict[CellStyle, int] = {}
+        self._merged: Dict[Tuple[int, int], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.styles)
+
+    def register(self, style: CellStyle) -> int:
+        """登记样式，返回样式id"""
+        style_id = self._ids.get(style)
+        if style_id is None:
+            style_id = len(self.styles)
+            self.styles.append(style)
+            self._ids[style] = style_id
+        return style_id
+
+    def merge(self, old_id: int, new_id: int) -> int:
+        """同一格先后写入两种样式的结果：后写的覆盖先写的中设置了的部分"""
+        style_id = self._merged.get((old_id, new_id))
+        if style_id is None:
+            old, new = self.styles[old_id], self.styles[new_id]
+            style_id = self.register(CellStyle(*(n if n is not None else o for o, n in zip(old, new))))
+            self._merged[(old_id, new_id)] = style_id
+        return style_id
+
+
+STYLES = StyleRegistry()
+
+# ==================基础样式对象==================
+THIN_WIDTH = 'thin'
+THICKER_WIDTH = 'medium'
+
+NO_BORDER = Border()
+# 箱体（4行的粗外框）
+BOX_1ST_ROW_BORDER = Border(
+    left=Side(style=THICKER_WIDTH),
+    right=Side(style=THICKER_WIDTH),
+    top=Side(style=THICKER_WIDTH),
+    bottom=Side(style=THIN_WIDTH)
+)
+BOX_MIDDLE_ROW_BORDER = Border(
+    left=Side(style=THICKER_WIDTH),
+    right=Side(style=THICKER_WIDTH),
+)
+BOX_LAST_ROW_BORDER = Border(
+    left=Side(style=THICKER_WIDTH),
+    right=Side(style=THICKER_WIDTH),
+    bottom=Side(style=THICKER_WIDTH)
+)
+# 线缆第一行下边框加粗（其他边框默认）
+CABLE_FIRST_ROW_BORDER = Border(
+    bottom=Side(style=THICKER_WIDTH)
+)
+# 竖向走线（线缆路由线、点的分支线）
+CABLE_ROUTE_BORDER = Border(
+    right=Side(style=THICKER_WIDTH)
+)
+POINT_BRANCHES_BORDER = CABLE_ROUTE_BORDER
+# 分支线穿过的同SECTION下一段
+BRANCH_SEGMENT_BORDER = Border(
+    right=Side(style=THICKER_WIDTH),
+    left=Side(style=THICKER_WIDTH)
+)
+
+TOPO_FONT_NAME = 'Calibri'
+TABLE_FONT_NAME = '宋体'
+
+TOPO_FONT = Font(name=TOPO_FONT_NAME)
+BOLD_FONT = Font(name=TOPO_FONT_NAME, bold=True)
+LINK_FONT = Font(name=TOPO_FONT_NAME, color="0000FF", underline="single")
+BOLD_LINK_FONT = Font(name=TOPO_FONT_NAME, bold=True, italic=True, color="0000FF", underline="single")
+TABLE_LINK_FONT = Font(name=TABLE_FONT_NAME, color="0000FF", size=11, underline="single")
+
+NO_ALIGN = Alignment()
+CENTER_ALIGN = Alignment(horizontal='center', vertical='center', wrap_text=True)
+LEFT_ALIGN = Alignment(horizontal='left', vertical='center', wrap_text=True)
+
+FIBER_COLOR = {
+    0: {"bgc": "FF0000", "fc": "FFFFFF"},  # idx=1 红
+    1: {"bgc": "0066FF", "fc": "FFFFFF"},  # idx=2 蓝
+    2: {"bgc": "00B050", "fc": "FFFFFF"},  # idx=3 绿
+    3: {"bgc": "FFFF00", "fc": "000000"},  # idx=4 黄
+    4: {"bgc": "7030A0", "fc": "FFFFFF"},  # idx=5 紫
+    5: {"bgc": None, "fc": "000000"},  # idx=6 白
+    6: {"bgc": "FFCC00", "fc": "000000"},  # idx=7 金
+    7: {"bgc": "D9D9D9", "fc": "000000"},  # idx=8 灰
+    8: {"bgc": "963634", "fc": "FFFFFF"},  # idx=9 赭
+    9: {"bgc": "FDE9D9", "fc": "000000"},  # idx=10 米
+    10: {"bgc": "66FFFF", "fc": "000000"},  # idx=11 青
+    11: {"bgc": "FFCCFF", "fc": "000000"}  # idx=12 粉
+}
+
+
+def get_fiber_bg_color(no: int):
+    return FIBER_COLOR[no % 12]['bgc']
+
+
+def get_fiber_font_color(no: int):
+    return FIBER_COLOR[no % 12]['fc']
+
+
+# ==================拓扑总览==================
+def topo_style(border=NO_BORDER, font=TOPO_FONT, align=NO_ALIGN) -> int:
+    """拓扑总览的样式：边框、字体、对齐都完整设置（未指定的取无边框、默认字体、默认对齐）"""
+    return STYLES.register(CellStyle(font=font, border=border, alignment=align))
+
+
+BLANK_STYLE = topo_style()
+CENTER_STYLE = topo_style(align=CENTER_ALIGN)
+BOX_TITLE_STYLE = topo_style(BOX_1ST_ROW_BORDER, BOLD_FONT, CENTER_ALIGN)
+BOX_MIDDLE_STYLE = topo_style(BOX_MIDDLE_ROW_BORDER, align=CENTER_ALIGN)
+BOX_MIDDLE_LINK_STYLE = topo_style(BOX_MIDDLE_ROW_BORDER, LINK_FONT, CENTER_ALIGN)
+BOX_MIDDLE_BLANK_STYLE = topo_style(BOX_MIDDLE_ROW_BORDER)
+BOX_LAST_STYLE = topo_style(BOX_LAST_ROW_BORDER, align=CENTER_ALIGN)
+BOX_LAST_BLANK_STYLE = topo_style(BOX_LAST_ROW_BORDER)
+CABLE_TITLE_STYLE = topo_style(CABLE_FIRST_ROW_BORDER, BOLD_FONT, CENTER_ALIGN)
+CABLE_FIRST_ROW_STYLE = topo_style(CABLE_FIRST_ROW_BORDER)
+ROUTE_STYLE = topo_style(CABLE_ROUTE_BORDER)
+ROUTE_CENTER_STYLE = topo_style(CABLE_ROUTE_BORDER, align=CENTER_ALIGN)
+SEGMENT_TITLE_STYLE = topo_style(font=BOLD_FONT, align=LEFT_ALIGN)
+SEGMENT_STYLE = topo_style(align=LEFT_ALIGN)
+BRANCH_SEGMENT_TITLE_STYLE = topo_style(BRANCH_SEGMENT_BORDER, BOLD_FONT, LEFT_ALIGN)
+BRANCH_SEGMENT_STYLE = topo_style(BRANCH_SEGMENT_BORDER, align=LEFT_ALIGN)
+
+# ==================纤芯分配表==================
+TABLE_CENTER_STYLE = STYLES.register(CellStyle(alignment=CENTER_ALIGN))
+TABLE_LINK_STYLE = STYLES.register(CellStyle(font=TABLE_LINK_FONT, alignment=CENTER_ALIGN))
+
+
+def _fiber_style(no: int, bold: bool) -> CellStyle:
+    bg_color = get_fiber_bg_color(no)
+    return CellStyle(font=Font(color=get_fiber_font_color(no), bold=bold),
+                     fill=PatternFill(fill_type="solid", start_color=bg_color) if bg_color else None,
+                     alignment=CENTER_ALIGN)
+
+
+FIBER_STYLES = tuple((STYLES.register(_fiber_style(no, False)), STYLES.register(_fiber_style(no, True)))
+                     for no in range(len(FIBER_COLOR)))
+
+
+def fiber_style_id(no: int, bold=False) -> int:
+    """纤芯序号（从0开始）的颜色样式：字体颜色，有背景色时加背景填充"""
+    return FIBER_STYLES[no % 12][bold]
@@ -0,0 +1,90 @@
+"""
+显式栈深度优先遍历：替代递归，树再深也不会触发RecursionError
+expand(node)返回子节点：
+- 普通可迭代对象：依次遍历每个子节点
+- 生成器：每yield一个子节点就先完成该子节点的整棵子树，子树的结果（子节点生成器的return值）
+  作为yield表达式的值送回，父节点再继续执行；因此递归函数只需把“result = 递归调用(参数)”改写为
+  “result = yield 参数”即可改为由本引擎驱动
+用法：
+    def expand(node):
+        for child in node.children:
+            total = yield child
+        return ...
+    results = walk([root], expand, on_enter=..., on_exit=...)
+传入key时检查环：子节点的key与当前路径（根到该节点）上某个节点相同时抛出CycleError，
+数据成环时遍历不会无限进行下去（同一节点经不同路径到达不算环，照常遍历）
+"""
+from types import GeneratorType
+from typing import Any, Callable, Hashable, Iterable, List, Optional
+
+
+class CycleError(ValueError):
+    """遍历路径成环"""
+
+    def __init__(self, path: List[Hashable]):
+        self.path = path  # 成环的路径（从重复的节点开始，到再次到达它为止）
+        super().__init__(f"遍历路径成环：{' -> '.join(str(k) for k in path)}")
+
+
+def walk(roots: Iterable[Any],
+         expand: Callable[[Any], Optional[Iterable[Any]]],
+         on_enter: Optional[Callable[[Any], None]] = None,
+         on_exit: Optional[Callable[[Any], None]] = None,
+         key: Optional[Callable[[Any], Hashable]] = None) -> List[Any]:
+    """
+    从每个根节点开始做深度优先遍历
+    :param roots: 根节点序列（依次遍历）
+    :param expand: 节点 -> 子节点（可迭代对象或生成器，None表示叶子）
+    :param on_enter: 先序回调，在expand之前调用
+    :param on_exit: 后序回调，在该节点的全部子树完成后调用
+    :param key: 节点 -> 用于判断成环的标识（None表示不检查）
+    :return: 每个根节点的结果（expand为生成器时是其return值，否则为None）
+    :raises CycleError: 传入key且某个子节点的key已在当前路径上
+    """
+    return [_walk_one(root, expand, on_enter, on_exit, key) for root in roots]
+
+
+def _walk_one(root, expand, on_enter, on_exit, key):
+    stack = [_enter(root, expand, on_enter)]
+    # 当前路径上各节点的key（与stack一一对应）
+    path = [key(root)] if key is not None else []
+    on_path = set(path)
+    send_value = None
+    result = None
+    while stack:
+        node, children = stack[-1]
+        try:
+            if isinstance(children, GeneratorType):
+                child = children.send(send_value)
+            else:
+                child = next(children)
+        except StopIteration as stop:
+            stack.pop()
+            if key is not None:
+                on_path.discard(path.pop())
+            if on_exit is not None:
+                on_exit(node)
+            # 子树完成：结果送回父节点的生成器
+            result = send_value = stop.value if isinstance(children, GeneratorType) else None
+            continue
+        send_value = None
+        if key is not None:
+            child_key = key(child)
+            if child_key in on_path:
+                raise CycleError(path[path.index(child_key):] + [child_key])
+            path.append(child_key)
+            on_path.add(child_key)
+        stack.append(_enter(child, expand, on_enter))
+    return result
+
+
+def _enter(node, expand, on_enter) -> tuple:
+    """进入节点：先序回调后展开子节点"""
+    if on_enter is not None:
+        on_enter(node)
+    children = expand(node)
+    if children is None:
+        children = ()
+    if not isinstance(children, GeneratorType):
+        children = iter(children)
+    return node, children
@@ -0,0 +1,262 @@
+"""
+openpyxl输出：
+- 把SheetLayout的定位元素、SheetGrid的数据区写入普通工作表（随机访问）
+- 按样式id写样式：同一工作表中每个样式只向openpyxl登记一次，之后的单元格直接复制其样式下标（StyleArray）
+- 流式输出：按行顺序追加到write-only工作表，单元格写完即落盘，内存占用不随行数增长
+- 确定性保存：不写入当前时间，内容相同的工作簿保存出的文件逐字节相同
+- 公式缓存值：openpyxl只写公式不写结果，预先算出的结果在保存时补写到公式单元格中，打开前也能读到
+"""
+import io
+import os
+import re
+import weakref
+from copy import copy
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from xml.sax.saxutils import escape
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+
+import numpy as np
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.hyperlink import Hyperlink
+from openpyxl.writer.excel import ExcelWriter
+
+from utils import excel_utils
+from utils.sheet_grid import SheetGrid
+from utils.sheet_layout import SheetLayout
+from utils.style_registry import CellStyle, NO_STYLE
+
+FIXED_DOC_TIME = datetime(2000, 1, 1)  # 文档属性中的创建/修改时间
+FIXED_ZIP_TIME = (1980, 1, 1, 0, 0, 0)  # zip条目的修改时间（zip格式可表示的最早时间）
+# openpyxl输出的公式单元格（无缓存值）：<c r="坐标" 其他属性><f>公式</f><v /></c>
+FORMULA_CELL_PATTERN = re.compile(rb'<c r="([A-Z]+[0-9]+)"([^>]*)><f>([^<]*)</f><v\s*/></c>')
+
+# 工作簿 -> {sheet名: {坐标: 公式结果}}，保存时写入
+_formula_results = weakref.WeakKeyDictionary()
+
+
+class StyleCache:
+    """
+    按样式id缓存单元格的StyleArray（工作簿字体、填充、边框、对齐表中的下标）：
+    每个样式第一次使用时按CellStyle设置并记下结果，之后的单元格直接复制，不再逐格对样式对象哈希去重
+    只用于同一工作簿中从默认样式开始设置的单元格
+    """
+
+    def __init__(self, styles):
+        self.styles = styles
+        self._arrays = {}
+
+    def apply(self, cell, style_id: int) -> None:
+        array = self._arrays.get(style_id)
+        if array is None:
+            apply_style(cell, self.styles[style_id])
+            self._arrays[style_id] = copy(cell._style)
+        else:
+            cell._style = copy(array)
+
+
+def render(layout: SheetLayout, ws) -> None:
+    """
+    按布局写入工作表（同一单元格后写覆盖先写）
+    :param layout: 布局
+    :param ws: openpyxl工作表
+    """
+    styles = StyleCache(layout.styles)
+    for row, col, value, style_id, link in layout.elements():
+        cell = ws.cell(row=row, column=col)
+        cell.value = value
+        styles.apply(cell, style_id)
+        if link:
+            cell.hyperlink = Hyperlink(ref=cell.coordinate, location=link)
+
+
+def stream(layout: SheetLayout, ws) -> None:
+    """
+    按布局向write-only工作表输出：先按单元格合并多次写入（值、样式后写覆盖先写，链接保留），再按行顺序追加
+    :param layout: 布局
+    :param ws: write-only工作表（列宽等须在此之前设置）
+    """
+    cells: Dict[Tuple[int, int], list] = {}
+    for row, col, value, style_id, link in layout.elements():
+        cell = cells.get((row, col))
+        if cell is None:
+            cells[(row, col)] = [value, style_id, link]
+        else:
+            cell[0], cell[1], cell[2] = value, style_id, link or cell[2]
+
+    styles = StyleCache(layout.styles)
+    next_row = 1
+    for row in sorted({row for row, _ in cells}):
+        while next_row < row:
+            ws.append([])
+            next_row += 1
+        cols = sorted(col for r, col in cells if r == row)
+        values = [None] * cols[-1]
+        for col in cols:
+            value, style_id, link = cells[(row, col)]
+            cell = WriteOnlyCell(ws, value)
+            styles.apply(cell, style_id)
+            if link:
+                cell.hyperlink = Hyperlink(ref="", location=link)
+            values[col - 1] = cell
+        ws.append(values)
+        next_row += 1
+
+
+def apply_style(cell, style: Optional[CellStyle]) -> None:
+    """把样式中设置了的部分应用到单元格"""
+    if style is None:
+        return
+    if style.font is not None:
+        cell.font = style.font
+    if style.fill is not None:
+        cell.fill = style.fill
+    if style.border is not None:
+        cell.border = style.border
+    if style.alignment is not None:
+        cell.alignment = style.alignment
+
+
+def render_grid(grid: SheetGrid, ws) -> None:
+    """网格写入普通工作表（只写有值或有样式的格）"""
+    styles = StyleCache(grid.styles)
+    for row, values, style_ids in grid.rows():
+        for index in np.flatnonzero(np.not_equal(values, None) | (style_ids != NO_STYLE)).tolist():
+            cell = ws.cell(row=row, column=index + 1)
+            cell.value = values[index]
+            styles.apply(cell, int(style_ids[index]))
+            link = grid.links.get((row, index + 1))
+            if link:
+                cell.hyperlink = Hyperlink(ref=cell.coordinate, location=link)
+
+
+def append_rows(ws, next_row: int, rows: Iterable[Tuple[int, np.ndarray, np.ndarray]],
+                styles: List[Optional[CellStyle]], links: Optional[Dict[Tuple[int, int], str]] = None) -> int:
+    """
+    按行顺序向write-only工作表追加行（只输出有值或有样式的格）
+    :param ws: write-only工作表
+    :param next_row: 工作表下一个要写的行号（与rows之间缺的行以空行补齐）
+    :param rows: 按行号升序的(行号, 该行的值, 该行的样式id)
+    :param styles: 样式id -> CellStyle
+    :param links: (行, 列) -> 链接目标
+    :return: 追加后下一个要写的行号
+    """
+    links = links or {}
+    styles = StyleCache(styles)
+    for row, values, style_ids in rows:
+        while next_row < row:
+            ws.append([])
+            next_row += 1
+        indexes = np.flatnonzero(np.not_equal(values, None) | (style_ids != NO_STYLE)).tolist()
+        cells = [None] * (indexes[-1] + 1 if indexes else 0)
+        for index in indexes:
+            cell = WriteOnlyCell(ws, values[index])
+            styles.apply(cell, int(style_ids[index]))
+            link = links.get((row, index + 1))
+            if link:
+                cell.hyperlink = Hyperlink(ref="", location=link)
+            cells[index] = cell
+        ws.append(cells)
+        next_row += 1
+    return next_row
+
+
+class RowBuffer:
+    """
+    write-only工作表开头若干行（如表头）的缓冲：提供与普通工作表相同的cell()、merge_cells()、列宽、行高接口，
+    表头绘制函数可以原样写入，flush()时再按行顺序输出
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.title = ws.title
+        self.column_dimensions = ws.column_dimensions
+        self.row_dimensions = ws.row_dimensions
+        self._cells: Dict[Tuple[int, int], WriteOnlyCell] = {}
+
+    def cell(self, row: int, column: int) -> WriteOnlyCell:
+        cell = self._cells.get((row, column))
+        if cell is None:
+            cell = self._cells[(row, column)] = WriteOnlyCell(self.ws)
+        return cell
+
+    def merge_cells(self, start_row: int, start_column: int, end_row: int, end_column: int) -> None:
+        self.ws.merged_cells.add(CellRange(min_col=start_column, min_row=start_row,
+                                           max_col=end_column, max_row=end_row).coord)
+
+    def flush(self) -> int:
+        """
+        按行顺序输出缓冲的单元格
+        :return: 下一个要写的行号
+        """
+        next_row = 1
+        for row in sorted({row for row, _ in self._cells}):
+            while next_row < row:
+                self.ws.append([])
+                next_row += 1
+            cols = sorted(col for r, col in self._cells if r == row)
+            cells = [None] * cols[-1]
+            for col in cols:
+                cells[col - 1] = self._cells[(row, col)]
+            self.ws.append(cells)
+            next_row += 1
+        self._cells.clear()
+        return next_row
+
+
+def cache_formula_results(ws, results: Dict[Tuple[int, int], object]) -> None:
+    """
+    登记工作表中公式单元格预先算出的结果，save_workbook保存时作为缓存值写入
+    :param ws: 工作表
+    :param results: (行, 列) -> 公式结果
+    """
+    if not results:
+        return
+    sheet_results = _formula_results.setdefault(ws.parent, {}).setdefault(ws.title, {})
+    for (row, col), value in results.items():
+        sheet_results[f"{excel_utils.num_to_col(col)}{row}"] = value
+
+
+def _fill_formula_results(xml: bytes, results: Dict[str, object]) -> bytes:
+    """在工作表XML中为登记过结果的公式单元格写入缓存值"""
+    def fill(match):
+        value = results.get(match.group(1).decode("ascii"))
+        if value is None:
+            return match.group(0)
+        if isinstance(value, str):
+            value_type, text = b' t="str"', escape(value).encode("utf-8")
+        else:
+            value_type, text = b'', str(value).encode("ascii")
+        return b'<c r="%s"%s%s><f>%s</f><v>%s</v></c>' % (match.group(1), match.group(2), value_type,
+                                                         match.group(3), text)
+    return FORMULA_CELL_PATTERN.sub(fill, xml)
+
+
+def save_workbook(wb, output_path: str) -> None:
+    """
+    确定性保存工作簿（wb.save会写入当前时间）：先写到内存，再以固定的条目时间重新打包（同时补写公式的缓存值），
+    写完后替换目标文件
+    :param wb: openpyxl工作簿
+    :param output_path: 输出路径
+    """
+    wb.properties.created = FIXED_DOC_TIME
+    wb.properties.modified = FIXED_DOC_TIME
+    buffer = io.BytesIO()
+    with ZipFile(buffer, "w", ZIP_DEFLATED, allowZip64=True) as archive:
+        ExcelWriter(wb, archive).write_data()
+    # 写出后各工作表才有确定的文件路径
+    results = _formula_results.pop(wb, {})
+    sheet_results = {ws.path.lstrip("/"): results[ws.title] for ws in wb.worksheets if ws.title in results}
+
+    temp_path = f"{output_path}.tmp"
+    with ZipFile(buffer) as source, ZipFile(temp_path, "w", ZIP_DEFLATED, allowZip64=True) as target:
+        for item in source.infolist():
+            info = ZipInfo(item.filename, date_time=FIXED_ZIP_TIME)
+            info.compress_type = ZIP_DEFLATED
+            info.external_attr = item.external_attr
+            data = source.read(item.filename)
+            if item.filename in sheet_results:
+                data = _fill_formula_results(data, sheet_results[item.filename])
+            target.writestr(info, data)
+    os.replace(temp_path, output_path)
@@ -0,0 +1,25 @@
+import sys
+
+from data_service import data_service_box, data_service_cable, data_service_sro
+from topology import topo_graph, validator
+
+DEFAULT_REPORT_PATH = "./validate_report.json"
+
+
+def main(report_path=DEFAULT_REPORT_PATH):
+    """
+    校验SRO、BOX、CABLE图层的拓扑完整性，写出JSON报告
+    :param report_path: 报告文件路径
+    :return: 有致命错误时返回False
+    """
+    data_service_sro.warm_up()
+    data_service_box.warm_up()
+    data_service_cable.warm_up()
+    report = validator.validate(topo_graph.load_graph())
+    validator.write_report(report, report_path)
+    return not validator.has_fatal(report)
+
+
+# 用法：python validate_data.py [报告文件路径]，有致命错误时退出码为1
+if __name__ == '__main__':
+    sys.exit(0 if main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_REPORT_PATH) else 1)